@@ -0,0 +1,395 @@
+#!/usr/bin/env python3
+"""
+WebHook処理のベンチマーク
+
+合成したWebHookのストリーム（issue・コメント・PRレビューなど）を実際のaiohttpの
+`/webhook/github` ルートに送信し、インメモリのDiscordクライアント（fake_discord.py）に
+通知が届くまでを計測します。結果は基準値（ベースライン）と比較し、劣化があれば
+終了コード1で終了します。
+
+計測する値:
+    - throughput: 1秒あたりに処理（Discordへ送信）したイベント数
+    - ack p50/p99: WebHookの応答時間
+    - e2e p50/p99: WebHookの送信からDiscordへの送信完了までの時間
+    - memory growth/peak: 計測中のメモリ増加量とピーク（tracemalloc）
+
+使用例:
+    python scripts/bench_webhooks.py
+    python scripts/bench_webhooks.py --scenario burst --events 2000 --latency-ms 80
+    python scripts/bench_webhooks.py --save-baseline   # 現在の結果を基準値として保存
+"""
+
+import sys
+import os
+import asyncio
+import argparse
+import json
+import logging
+import random
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Dict, List, Optional, Tuple
+
+# プロジェクトルートをPythonパスに追加
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+import aiohttp
+from aiohttp.test_utils import TestServer
+
+import config
+from fake_discord import FakeDiscordClient
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BASELINE_FILE = os.path.join(os.path.dirname(__file__), 'benchmarks', 'webhook_baseline.json')
+ORGANIZATION = "bench-org"
+
+# シナリオごとのイベントの比率と、同じPRへのレビューコメントの連続数
+SCENARIOS: Dict[str, Dict[str, Any]] = {
+    # 通常時の比率（コメントが中心）
+    'steady': {
+        'mix': {'issue_comment': 40, 'pull_request_review_comment': 25, 'pull_request_review': 10,
+                'issues': 10, 'pull_request': 10, 'issue_closed': 5},
+        'burst': (1, 1),
+    },
+    # インラインコメントを多数含むレビューの一括送信
+    'burst': {
+        'mix': {'issue_comment': 20, 'pull_request_review_comment': 60, 'pull_request_review': 10,
+                'issues': 5, 'pull_request': 5},
+        'burst': (5, 30),
+    },
+    # 新規issue/PRが多い（スレッド作成が中心）
+    'creation': {
+        'mix': {'issue_comment': 20, 'issues': 40, 'pull_request': 40},
+        'burst': (1, 1),
+    },
+}
+
+
+def timestamp() -> str:
+    return time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+
+
+class EventGenerator:
+    """シナリオに沿ったWebHookペイロードを生成"""
+
+    def __init__(self, scenario: str, repos: int, seed: int):
+        self.scenario = SCENARIOS[scenario]
+        self.random = random.Random(seed)
+        self.repos = [f"repo-{i}" for i in range(repos)]
+        self.next_number = 1
+        self.next_comment = 1
+        # 既存（スレッドあり）のissue/PRの (repo, number)
+        self.issues: List[Tuple[str, int]] = []
+        self.pulls: List[Tuple[str, int]] = []
+
+    def seed_existing(self, per_repo: int):
+        """スレッドが作成済みのissue/PRを用意"""
+        for repo in self.repos:
+            for _ in range(per_repo):
+                self.issues.append((repo, self._number()))
+                self.pulls.append((repo, self._number()))
+
+    def _number(self) -> int:
+        number = self.next_number
+        self.next_number += 1
+        return number
+
+    def _comment_id(self) -> int:
+        comment_id = self.next_comment
+        self.next_comment += 1
+        return comment_id
+
+    @staticmethod
+    def url(repo: str, kind: str, number: int) -> str:
+        return f"https://github.com/{ORGANIZATION}/{repo}/{kind}/{number}"
+
+    def _user(self) -> Dict[str, str]:
+        return {'login': f"user-{self.random.randint(1, 50)}"}
+
+    def _issue(self, repo: str, number: int, state: str = 'open') -> Dict[str, Any]:
+        return {'number': number, 'title': f"Issue {number}", 'body': "Steps to reproduce...",
+                'state': state, 'html_url': self.url(repo, 'issues', number), 'user': self._user(),
+                'updated_at': timestamp()}
+
+    def _pull(self, repo: str, number: int) -> Dict[str, Any]:
+        return {'number': number, 'title': f"PR {number}", 'body': "This change...", 'merged': False,
+                'state': 'open', 'html_url': self.url(repo, 'pull', number), 'user': self._user(),
+                'base': {'ref': 'main'}, 'head': {'ref': f"feature-{number}"}, 'updated_at': timestamp()}
+
+    def _event(self, kind: str, target: Optional[Tuple[str, int]] = None) -> Tuple[str, Dict[str, Any], str]:
+        """(event_type, payload, Discordに送信されるEmbedのURL) を生成"""
+        if kind == 'issues':
+            repo = self.random.choice(self.repos)
+            number = self._number()
+            self.issues.append((repo, number))
+            issue = self._issue(repo, number)
+            return 'issues', {'action': 'opened', 'issue': issue, 'repository': {'name': repo}}, issue['html_url']
+        if kind == 'issue_closed':
+            repo, number = self.issues.pop(self.random.randrange(len(self.issues)))
+            issue = self._issue(repo, number, state='closed')
+            return 'issues', {'action': 'closed', 'issue': issue, 'repository': {'name': repo}}, issue['html_url']
+        if kind == 'pull_request':
+            repo = self.random.choice(self.repos)
+            number = self._number()
+            self.pulls.append((repo, number))
+            pull = self._pull(repo, number)
+            return 'pull_request', {'action': 'opened', 'pull_request': pull, 'repository': {'name': repo}}, pull['html_url']
+        if kind == 'issue_comment':
+            repo, number = target or self.random.choice(self.issues)
+            issue = self._issue(repo, number)
+            comment = {'body': "Thanks, looking into it.", 'user': self._user(), 'updated_at': timestamp(),
+                       'html_url': f"{issue['html_url']}#issuecomment-{self._comment_id()}"}
+            payload = {'action': 'created', 'comment': comment, 'issue': issue, 'repository': {'name': repo}}
+            return 'issue_comment', payload, comment['html_url']
+
+        repo, number = target or self.random.choice(self.pulls)
+        pull = self._pull(repo, number)
+        if kind == 'pull_request_review':
+            review = {'state': 'approved', 'body': "LGTM", 'user': self._user(), 'submitted_at': timestamp(),
+                      'html_url': f"{pull['html_url']}#pullrequestreview-{self._comment_id()}"}
+            payload = {'action': 'submitted', 'review': review, 'pull_request': pull, 'repository': {'name': repo}}
+            return 'pull_request_review', payload, review['html_url']
+        comment = {'body': "nit: rename this", 'user': self._user(), 'updated_at': timestamp(),
+                   'html_url': f"{pull['html_url']}#discussion_r{self._comment_id()}"}
+        payload = {'action': 'created', 'comment': comment, 'pull_request': pull, 'repository': {'name': repo}}
+        return 'pull_request_review_comment', payload, comment['html_url']
+
+    def generate(self, count: int) -> List[Tuple[str, Dict[str, Any], str]]:
+        kinds, weights = zip(*self.scenario['mix'].items())
+        low, high = self.scenario['burst']
+        events = []
+        while len(events) < count:
+            kind = self.random.choices(kinds, weights)[0]
+            if kind == 'issue_closed' and len(self.issues) <= 1:
+                continue
+            if kind == 'pull_request_review_comment' and high > 1:
+                # 同じPRへのレビューコメントを連続して送信する
+                target = self.random.choice(self.pulls)
+                for _ in range(min(self.random.randint(low, high), count - len(events))):
+                    events.append(self._event(kind, target))
+            else:
+                events.append(self._event(kind))
+        return events
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """最近傍順位法によるパーセンタイル"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+async def run_benchmark(args) -> Dict[str, Any]:
+    """ベンチマークを1回実行し、計測結果を返す"""
+    from comment_connecter.comment_connecter import CommentConnector
+
+    # 実際のトークンやストレージを使わない
+    config.GITHUB_TOKEN = None
+    config.NOTIFY_COALESCE_MS = args.coalesce_ms
+    config.TRACE_SAMPLE_RATE = 0
+    config.WEBHOOK_QUEUE_SIZE = args.queue_size
+    config.WEBHOOK_WORKERS = args.workers
+
+    tracemalloc.start()
+    client = FakeDiscordClient(args.latency_ms, args.jitter_ms, seed=args.seed)
+    connector = CommentConnector(client)
+
+    generator = EventGenerator(args.scenario, args.repos, args.seed)
+    generator.seed_existing(args.existing)
+    for repo in generator.repos:
+        connector.link_channel(repo, client.add_text_channel(repo).id)
+    for repo, number in generator.issues:
+        connector.link_thread(generator.url(repo, 'issues', number), client.add_thread(f"Issue #{number}").id)
+    for repo, number in generator.pulls:
+        connector.link_thread(generator.url(repo, 'pull', number), client.add_thread(f"PR #{number}").id)
+    events = generator.generate(args.events)
+
+    server = TestServer(connector.create_webhook_app())
+    await server.start_server()
+    url = str(server.make_url('/webhook/github'))
+    connector.webhook_queue.start()
+
+    sent_at: Dict[str, float] = {}
+    ack_latencies: List[float] = []
+    statuses: Dict[int, int] = {}
+    semaphore = asyncio.Semaphore(args.concurrency)
+    interval = 1 / args.rate if args.rate > 0 else 0
+
+    async def post(session: aiohttp.ClientSession, index: int, event_type: str, payload: Dict, embed_url: str):
+        headers = {'X-GitHub-Event': event_type, 'X-GitHub-Delivery': f"bench-{index}"}
+        async with semaphore:
+            start = time.perf_counter()
+            sent_at[embed_url] = start
+            async with session.post(url, json=payload, headers=headers) as response:
+                await response.read()
+                statuses[response.status] = statuses.get(response.status, 0) + 1
+            ack_latencies.append(time.perf_counter() - start)
+
+    memory_before = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    started = time.perf_counter()
+    async with aiohttp.ClientSession() as session:
+        tasks = []
+        for index, (event_type, payload, embed_url) in enumerate(events):
+            tasks.append(asyncio.create_task(post(session, index, event_type, payload, embed_url)))
+            if interval:
+                await asyncio.sleep(interval)
+            elif index % args.concurrency == 0:
+                await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+
+    # キューの処理とまとめ送信の完了を待つ
+    await connector.webhook_queue.stop(timeout=600)
+    await connector.coalescer.flush_all()
+    finished = time.perf_counter()
+    memory_after, memory_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    await server.close()
+    await connector.shutdown()
+
+    e2e = [client.delivered_at[u] - t for u, t in sent_at.items() if u in client.delivered_at]
+    last_delivery = max(client.delivered_at.values(), default=finished)
+    elapsed = max(last_delivery, finished) - started
+
+    def ms(value: Optional[float]) -> Optional[float]:
+        return round(value * 1000, 2) if value is not None else None
+
+    return {
+        'scenario': args.scenario,
+        'params': {
+            'events': args.events, 'concurrency': args.concurrency, 'rate': args.rate,
+            'latency_ms': args.latency_ms, 'jitter_ms': args.jitter_ms, 'coalesce_ms': args.coalesce_ms,
+            'workers': args.workers, 'repos': args.repos, 'seed': args.seed,
+        },
+        'events_sent': len(events),
+        'events_delivered': len(e2e),
+        'statuses': {str(status): count for status, count in sorted(statuses.items())},
+        'elapsed_s': round(elapsed, 3),
+        'throughput_eps': round(len(e2e) / elapsed, 1) if elapsed > 0 else None,
+        'ack_p50_ms': ms(percentile(ack_latencies, 50)),
+        'ack_p99_ms': ms(percentile(ack_latencies, 99)),
+        'e2e_p50_ms': ms(percentile(e2e, 50)),
+        'e2e_p99_ms': ms(percentile(e2e, 99)),
+        'memory_growth_kb': round((memory_after - memory_before) / 1024, 1),
+        'memory_peak_kb': round((memory_peak - memory_before) / 1024, 1),
+        'discord_calls': dict(client.api.calls),
+        'discord_messages': client.messages_sent,
+    }
+
+
+# 劣化とみなす方向（値が大きいほど悪いものは1、小さいほど悪いものは-1）
+COMPARED_METRICS = {
+    'throughput_eps': -1,
+    'ack_p99_ms': 1,
+    'e2e_p50_ms': 1,
+    'e2e_p99_ms': 1,
+    'memory_growth_kb': 1,
+}
+
+
+def compare(result: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """基準値と比較し、許容範囲を超えて劣化した項目の説明を返す"""
+    regressions = []
+    for metric, direction in COMPARED_METRICS.items():
+        current, base = result.get(metric), baseline.get(metric)
+        if current is None or base is None:
+            continue
+        if direction > 0:
+            # メモリなど値が小さい項目は、誤差で判定しないよう最小の余裕を持たせる
+            limit = base * (1 + tolerance) + (256 if metric == 'memory_growth_kb' else 1)
+            if current > limit:
+                regressions.append(f"{metric}: {current} > {base} (+{tolerance:.0%})")
+        elif current < base * (1 - tolerance):
+            regressions.append(f"{metric}: {current} < {base} (-{tolerance:.0%})")
+    return regressions
+
+
+def load_baselines(path: str) -> Dict[str, Any]:
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_baseline(path: str, result: Dict[str, Any]):
+    baselines = load_baselines(path)
+    baselines[result['scenario']] = result
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(baselines, f, indent=2, ensure_ascii=False)
+        f.write('\n')
+
+
+def print_result(result: Dict[str, Any]):
+    print(f"=== {result['scenario']} ({result['events_sent']} events) ===")
+    for key in ('statuses', 'events_delivered', 'elapsed_s', 'throughput_eps', 'ack_p50_ms', 'ack_p99_ms',
+                'e2e_p50_ms', 'e2e_p99_ms', 'memory_growth_kb', 'memory_peak_kb', 'discord_messages', 'discord_calls'):
+        print(f"  {key:18} {result[key]}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='WebHook処理のベンチマーク')
+    parser.add_argument('--scenario', choices=sorted(SCENARIOS), default='steady', help='送信するイベントの構成')
+    parser.add_argument('--events', type=int, default=1000, help='送信するイベント数')
+    parser.add_argument('--concurrency', type=int, default=20, help='同時に送信するリクエスト数')
+    parser.add_argument('--rate', type=float, default=0, help='1秒あたりの送信数（0で上限なし）')
+    parser.add_argument('--latency-ms', type=float, default=50, help='Discord APIの平均遅延（ミリ秒）')
+    parser.add_argument('--jitter-ms', type=float, default=20, help='Discord APIの遅延のゆらぎ（ミリ秒）')
+    parser.add_argument('--coalesce-ms', type=float, default=config.NOTIFY_COALESCE_MS, help='通知をまとめる時間（ミリ秒）')
+    parser.add_argument('--workers', type=int, default=config.WEBHOOK_WORKERS, help='WebHookのワーカー数')
+    parser.add_argument('--queue-size', type=int, default=10000, help='WebHookキューの上限')
+    parser.add_argument('--repos', type=int, default=10, help='リポジトリ数')
+    parser.add_argument('--existing', type=int, default=20, help='リポジトリごとのスレッド作成済みのissue/PR数')
+    parser.add_argument('--seed', type=int, default=1, help='乱数のシード')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE_FILE, help='基準値のファイル')
+    parser.add_argument('--save-baseline', action='store_true', help='結果を基準値として保存')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='劣化とみなす基準値からの変化の割合')
+    parser.add_argument('--json', action='store_true', help='結果をJSONで出力')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    # ストレージなどのファイルは一時ディレクトリに作成する
+    with tempfile.TemporaryDirectory() as workdir:
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            result = asyncio.run(run_benchmark(args))
+        finally:
+            os.chdir(cwd)
+
+    if args.json:
+        print(json.dumps(result, indent=2, ensure_ascii=False))
+    else:
+        print_result(result)
+
+    if args.save_baseline:
+        save_baseline(args.baseline, result)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    baseline = load_baselines(args.baseline).get(args.scenario)
+    if baseline is None:
+        print("No baseline for this scenario (run with --save-baseline to create one)")
+        return 0
+    if baseline.get('params') != result['params']:
+        print("Baseline was recorded with different parameters; skipping comparison")
+        return 0
+    regressions = compare(result, baseline, args.tolerance)
+    if regressions:
+        print("REGRESSION detected:")
+        for line in regressions:
+            print(f"  - {line}")
+        return 1
+    print("No regression against baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+ベンチマーク用のインメモリなDiscordクライアント
+
+discord.Client の代わりに CommentConnector などに渡し、チャンネルへの送信や
+スレッドの作成を実際のDiscordに送らずにメモリ上で記録する。
+各API呼び出しには設定した遅延（平均とゆらぎ）が入る。
+
+    from fake_discord import FakeDiscordClient
+    client = FakeDiscordClient(latency_ms=50, jitter_ms=20)
+    channel = client.add_text_channel(name="repo")
+
+    # リポジトリ同期用のギルドとカテゴリ
+    guild = client.add_guild(1)
+    category = guild.create_category("repos")
+
+ギルド・カテゴリ・チャンネルは isinstance() で discord.Guild などとして判定される。
+"""
+
+import asyncio
+import itertools
+import random
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+import discord
+
+from common.discord_scheduler import route_key
+
+
+class FakeDiscordAPI:
+    """API呼び出しの遅延と呼び出し回数を管理"""
+
+    def __init__(self, latency_ms: float = 0, jitter_ms: float = 0, seed: Optional[int] = None):
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.random = random.Random(seed)
+        self.calls: Counter = Counter()
+        self.ids = itertools.count(10 ** 17)
+
+    def next_id(self) -> int:
+        return next(self.ids)
+
+    async def call(self, name: str, route: Optional[str] = None):
+        """
+        API呼び出しを記録し、遅延をシミュレート
+
+        Args:
+            name: 操作の名前（send, create_thread など）
+            route: レート制限のバケット（route_key() で作成）
+        """
+        self.calls[name] += 1
+        delay = self.latency + self.random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class FakeMessage:
+    def __init__(self, api: FakeDiscordAPI, client: "FakeDiscordClient", channel: "FakeChannel",
+                 content: Optional[str], embeds: List[Any]):
+        self.api = api
+        self.client = client
+        self.id = api.next_id()
+        self.channel = channel
+        self.content = content
+        self.embeds = embeds
+        self.reactions: List[str] = []
+
+    async def create_thread(self, *, name: str, **kwargs) -> "FakeChannel":
+        await self.api.call('create_thread', route_key('POST', 'channels', self.channel.id, '/messages/{id}/threads'))
+        return self.client.add_thread(name=name, parent=self.channel)
+
+    async def add_reaction(self, emoji: str):
+        await self.api.call('add_reaction', route_key('PUT', 'channels', self.channel.id, '/messages/{id}/reactions/{id}/@me'))
+        self.reactions.append(emoji)
+
+
+class FakeChannel:
+    """テキストチャンネル・スレッドの代わり（送信したメッセージを保持する）"""
+
+    def __init__(self, api: FakeDiscordAPI, client: "FakeDiscordClient", name: str,
+                 parent: Optional["FakeChannel"] = None, keep_messages: bool = False,
+                 topic: Optional[str] = None, category: Optional["FakeCategoryChannel"] = None):
+        self.api = api
+        self.client = client
+        self.id = api.next_id()
+        self.name = name
+        self.parent = parent
+        self.topic = topic
+        self.category = category
+        self.guild = category.guild if category else None
+        self.keep_messages = keep_messages
+        self.message_count = 0
+        self.messages: List[FakeMessage] = []
+
+    async def send(self, content: Optional[str] = None, *, embed: Any = None, embeds: Optional[List[Any]] = None,
+                   **kwargs) -> FakeMessage:
+        embeds = embeds or ([embed] if embed is not None else [])
+        await self.api.call('send', route_key('POST', 'channels', self.id, '/messages'))
+        message = FakeMessage(self.api, self.client, self, content, embeds)
+        self.message_count += 1
+        now = time.perf_counter()
+        for item in embeds:
+            self.client.record_delivery(self, getattr(item, 'url', None), now)
+        if self.keep_messages:
+            self.messages.append(message)
+        return message
+
+    async def edit(self, *, reason: Optional[str] = None, **fields) -> "FakeChannel":
+        await self.api.call('edit', route_key('PATCH', 'channels', self.id))
+        for key, value in fields.items():
+            setattr(self, key, value)
+        return self
+
+    @property
+    def __class__(self):
+        # isinstance(channel, discord.TextChannel / discord.Thread) の判定を通す
+        return discord.Thread if self.parent is not None else discord.TextChannel
+
+
+class FakeCategoryChannel:
+    """リポジトリ同期で使うカテゴリ（配下のテキストチャンネルを保持する）"""
+
+    def __init__(self, api: FakeDiscordAPI, client: "FakeDiscordClient", guild: "FakeGuild", name: str):
+        self.api = api
+        self.client = client
+        self.id = api.next_id()
+        self.guild = guild
+        self.name = name
+        self.channels: List[FakeChannel] = []
+
+    async def create_text_channel(self, name: str, *, topic: Optional[str] = None, reason: Optional[str] = None,
+                                  **kwargs) -> FakeChannel:
+        await self.api.call('create_text_channel', route_key('POST', 'guilds', self.guild.id, '/channels'))
+        return self.add_text_channel(name, topic)
+
+    def add_text_channel(self, name: str, topic: Optional[str] = None) -> FakeChannel:
+        """API呼び出しなしでチャンネルを追加（既存のチャンネルの用意に使う）"""
+        channel = FakeChannel(self.api, self.client, name, keep_messages=self.client.keep_messages,
+                              topic=topic, category=self)
+        self.channels.append(channel)
+        self.guild.channels[channel.id] = channel
+        self.client.channels[channel.id] = channel
+        return channel
+
+    @property
+    def __class__(self):
+        return discord.CategoryChannel
+
+
+class FakeGuild:
+    def __init__(self, api: FakeDiscordAPI, client: "FakeDiscordClient", guild_id: int):
+        self.api = api
+        self.client = client
+        self.id = guild_id
+        self.channels: Dict[int, Any] = {}
+
+    def create_category(self, name: str, category_id: Optional[int] = None) -> FakeCategoryChannel:
+        category = FakeCategoryChannel(self.api, self.client, self, name)
+        if category_id is not None:
+            category.id = category_id
+        self.channels[category.id] = category
+        return category
+
+    def get_channel(self, channel_id: int) -> Optional[Any]:
+        return self.channels.get(channel_id)
+
+    @property
+    def __class__(self):
+        return discord.Guild
+
+
+class FakeDiscordClient:
+    """get_channel() でチャンネル・スレッドを返すインメモリなクライアント"""
+
+    def __init__(self, latency_ms: float = 0, jitter_ms: float = 0, seed: Optional[int] = None,
+                 keep_messages: bool = False):
+        self.api = FakeDiscordAPI(latency_ms, jitter_ms, seed)
+        self.keep_messages = keep_messages
+        self.channels: Dict[int, FakeChannel] = {}
+        self.guilds: Dict[int, FakeGuild] = {}
+        # Embedのurl -> 最後に送信が完了した時刻（time.perf_counter()）
+        self.delivered_at: Dict[str, float] = {}
+        self.user = None
+
+    def add_text_channel(self, name: str) -> FakeChannel:
+        channel = FakeChannel(self.api, self, name, keep_messages=self.keep_messages)
+        self.channels[channel.id] = channel
+        return channel
+
+    def add_thread(self, name: str, parent: Optional[FakeChannel] = None) -> FakeChannel:
+        thread = FakeChannel(self.api, self, name, parent=parent, keep_messages=self.keep_messages)
+        self.channels[thread.id] = thread
+        return thread
+
+    def get_channel(self, channel_id: int) -> Optional[FakeChannel]:
+        return self.channels.get(channel_id)
+
+    def add_guild(self, guild_id: int) -> FakeGuild:
+        guild = self.guilds[guild_id] = FakeGuild(self.api, self, guild_id)
+        return guild
+
+    def get_guild(self, guild_id: int) -> Optional[FakeGuild]:
+        return self.guilds.get(guild_id)
+
+    async def fetch_channel(self, channel_id: int) -> FakeChannel:
+        await self.api.call('fetch_channel', route_key('GET', 'channels', channel_id))
+        channel = self.channels.get(channel_id)
+        if channel is None:
+            raise LookupError(f"Unknown channel {channel_id}")
+        return channel
+
+    def record_delivery(self, channel: FakeChannel, url: Optional[str], at: float):
+        if url:
+            self.delivered_at[url] = at
+
+    @property
+    def messages_sent(self) -> int:
+        return sum(channel.message_count for channel in self.channels.values())
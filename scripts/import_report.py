@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+コールドスタート時のインポート時間のレポート
+
+新しいプロセスで `python -X importtime` を使ってモジュールをインポートし、
+インポート時間の多いモジュールと、src.main のインポート時間の上限（IMPORT_BUDGET_MS）との比較を表示します。
+上限を超えた場合は終了コード1を返します。
+
+使用例:
+    python scripts/import_report.py
+    python scripts/import_report.py --runs 5 --top 40
+    python scripts/import_report.py --module sync_channel.utils --self
+    python scripts/import_report.py --json > import_times.json
+"""
+
+import sys
+import os
+import argparse
+import json
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# プロジェクトルートをPythonパスに追加
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+
+import config
+from common.lazy import format_report, measure_imports
+
+
+def main():
+    """メイン関数"""
+    parser = argparse.ArgumentParser(description="コールドスタート時のインポート時間を計測")
+    parser.add_argument('--module', default='src.main', help="インポートするモジュール")
+    parser.add_argument('--runs', type=int, default=3, help="計測回数（最も速い結果を使用）")
+    parser.add_argument('--top', type=int, default=25, help="表示するモジュール数")
+    parser.add_argument('--self', dest='self_time', action='store_true',
+                        help="サブモジュールを除いたモジュール自身の時間で並べる")
+    parser.add_argument('--budget', type=float, default=config.IMPORT_BUDGET_MS,
+                        help="インポート時間の上限（ミリ秒、0で比較しない）")
+    parser.add_argument('--json', action='store_true', help="JSONで出力")
+    args = parser.parse_args()
+
+    # 1回目はバイトコードのキャッシュの作成を含むため、複数回の計測の最小値を使う
+    reports = [measure_imports(args.module, cwd=ROOT, path=[ROOT, os.path.join(ROOT, 'src')])
+               for _ in range(max(args.runs, 1))]
+    report = min(reports, key=lambda report: report.module_ms)
+    budget = args.budget if args.budget > 0 else None
+
+    if args.json:
+        print(json.dumps({
+            'module': report.module,
+            'module_ms': report.module_ms,
+            'total_ms': report.total_ms,
+            'runs_ms': [round(r.module_ms, 3) for r in reports],
+            'budget_ms': budget,
+            'modules': [entry._asdict() for entry in report.slowest(args.top, cumulative=not args.self_time)]
+        }, ensure_ascii=False, indent=2))
+    elif args.self_time:
+        print(f"{report.module}: {report.module_ms:.1f}ms")
+        print(f"{'self':>10}  module")
+        for entry in report.slowest(args.top, cumulative=False):
+            print(f"{entry.self_us / 1000:>8.1f}ms  {entry.name}")
+    else:
+        print(format_report(report, top=args.top, budget_ms=budget))
+
+    return 1 if budget is not None and report.module_ms > budget else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+"""
+大規模なorganizationでのリポジトリ同期の負荷試験
+
+ローカルに起動した偽のGitHub API（organizationのリポジトリ一覧。ページネーション・
+レート制限ヘッダー・ETag・遅延あり）と偽のDiscord REST API（ルートごとのレート制限と遅延あり）
+に対して SyncChannel の同期を実行し、organizationの規模ごとに以下を計測します。
+
+    - list-repos: /list-repos と同じリポジトリ一覧の取得
+    - full:       初回の全件同期（すべてのチャンネルを作成）
+    - full-noop:  変更のない全件同期（ETagによる304を含む）
+    - incremental: 一部のリポジトリを更新した後の差分同期
+    - dry-run:    全件同期の計画のみ
+
+計測値は実行時間、GitHub/DiscordのAPI呼び出し回数、ピークメモリ（tracemalloc）です。
+
+使用例:
+    python scripts/load_test_sync.py
+    python scripts/load_test_sync.py --sizes 1000 10000 --github-latency-ms 100 --json > sync_load.json
+"""
+
+import sys
+import os
+import asyncio
+import argparse
+import hashlib
+import json
+import logging
+import random
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+# プロジェクトルートをPythonパスに追加
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+import aiohttp
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+import config
+from common.discord_scheduler import get_scheduler
+from common.github_client import close_session
+from fake_discord import FakeDiscordAPI, FakeDiscordClient
+
+logger = logging.getLogger(__name__)
+
+ORGANIZATION = "load-test-org"
+GUILD_ID = 1
+CATEGORY_ID = 2
+
+
+def isoformat(value: datetime) -> str:
+    return value.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+async def inject_latency(rng: random.Random, latency: float, jitter: float):
+    delay = latency + rng.uniform(-jitter, jitter)
+    if delay > 0:
+        await asyncio.sleep(delay)
+
+
+class FakeGitHub:
+    """organizationのリポジトリ一覧APIの偽サーバー"""
+
+    def __init__(self, size: int, latency_ms: float = 0, jitter_ms: float = 0, rate_limit: int = 5000,
+                 archived_ratio: float = 0.05, seed: int = 1):
+        self.rng = random.Random(seed)
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.rate_limit = rate_limit
+        self.remaining = rate_limit
+        self.reset_at = int(time.time()) + 3600
+        self.calls: Counter = Counter()
+        # リポジトリ一覧が変更されるたびに増やし、ETagに含める
+        self.version = 0
+        base = datetime(2020, 1, 1, tzinfo=timezone.utc)
+        self.repos: List[Dict[str, Any]] = []
+        for i in range(size):
+            created = base + timedelta(hours=i)
+            updated = created + timedelta(days=self.rng.randint(0, 1000))
+            self.repos.append({
+                'name': f"repo-{i:05d}",
+                'description': f"Repository {i}",
+                'html_url': f"https://github.com/{ORGANIZATION}/repo-{i:05d}",
+                'created_at': isoformat(created),
+                'updated_at': isoformat(updated),
+                'pushed_at': isoformat(updated),
+                'language': self.rng.choice(["Python", "TypeScript", "Go", "Rust", None]),
+                'stargazers_count': self.rng.randint(0, 500),
+                'forks_count': self.rng.randint(0, 50),
+                'private': self.rng.random() < 0.3,
+                'archived': self.rng.random() < archived_ratio,
+            })
+
+    def touch(self, count: int) -> List[str]:
+        """count件のリポジトリの説明と更新日時を変更し、変更したリポジトリ名を返す"""
+        now = datetime.now(timezone.utc)
+        touched = self.rng.sample(self.repos, min(count, len(self.repos)))
+        for repo in touched:
+            repo['description'] = f"{repo['description']} (updated)"
+            repo['updated_at'] = isoformat(now)
+        self.version += 1
+        return [repo['name'] for repo in touched]
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get('/orgs/{org}/repos', self.list_repos)
+        return app
+
+    def rate_limit_headers(self) -> Dict[str, str]:
+        return {
+            'X-RateLimit-Limit': str(self.rate_limit),
+            'X-RateLimit-Remaining': str(max(self.remaining, 0)),
+            'X-RateLimit-Reset': str(self.reset_at),
+            'X-RateLimit-Used': str(self.rate_limit - max(self.remaining, 0)),
+        }
+
+    async def list_repos(self, request: web.Request) -> web.Response:
+        await inject_latency(self.rng, self.latency, self.jitter)
+        query = request.query
+        per_page = min(int(query.get('per_page', '30')), 100)
+        page = int(query.get('page', '1'))
+        sort = query.get('sort', 'full_name')
+        direction = query.get('direction', 'asc' if sort == 'full_name' else 'desc')
+
+        etag = '"{}"'.format(hashlib.sha1(f"{self.version}:{query_string(query)}".encode()).hexdigest())
+        if request.headers.get('If-None-Match') == etag:
+            # 条件付きリクエストの304はレート制限にカウントされない
+            self.calls['304'] += 1
+            return web.Response(status=304, headers={'ETag': etag, **self.rate_limit_headers()})
+
+        if self.remaining <= 0:
+            self.calls['403'] += 1
+            return web.json_response(
+                {'message': 'API rate limit exceeded'}, status=403, headers=self.rate_limit_headers()
+            )
+        self.remaining -= 1
+        self.calls['200'] += 1
+
+        key = {'updated': 'updated_at', 'pushed': 'pushed_at'}.get(sort, 'name')
+        ordered = sorted(self.repos, key=lambda repo: repo[key], reverse=direction == 'desc')
+        items = ordered[(page - 1) * per_page:page * per_page]
+        headers = {'ETag': etag, **self.rate_limit_headers()}
+        if page * per_page < len(ordered):
+            headers['Link'] = f'<{request.url.update_query(page=page + 1)}>; rel="next"'
+        return web.json_response(items, headers=headers)
+
+
+def query_string(query) -> str:
+    return "&".join(f"{key}={value}" for key, value in sorted(query.items()))
+
+
+class FakeDiscordREST:
+    """ルートごとに固定ウィンドウのレート制限を持つDiscord REST APIの偽サーバー"""
+
+    def __init__(self, latency_ms: float = 0, jitter_ms: float = 0, route_limit: int = 50,
+                 route_window: float = 1.0, seed: int = 1):
+        self.rng = random.Random(seed)
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.route_limit = route_limit
+        self.route_window = route_window
+        # route -> (ウィンドウの開始時刻, 使用済みのリクエスト数)
+        self.windows: Dict[str, List[float]] = {}
+        self.calls: Counter = Counter()
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post('/{resource}/{resource_id}/{operation}', self.handle)
+        return app
+
+    async def handle(self, request: web.Request) -> web.Response:
+        # Discordと同様に、同じチャンネルでも操作ごとに別のバケットにする
+        route = f"{request.match_info['resource']}/{request.match_info['resource_id']}/{request.match_info['operation']}"
+        now = time.monotonic()
+        window = self.windows.get(route)
+        if window is None or now - window[0] >= self.route_window:
+            window = self.windows[route] = [now, 0]
+        reset_after = max(0.0, self.route_window - (now - window[0]))
+        if window[1] >= self.route_limit:
+            self.calls['429'] += 1
+            return web.json_response(
+                {'message': 'You are being rate limited.', 'retry_after': reset_after, 'global': False},
+                status=429,
+                headers={'Retry-After': f"{reset_after:.3f}", 'X-RateLimit-Remaining': '0',
+                         'X-RateLimit-Reset-After': f"{reset_after:.3f}", 'X-RateLimit-Scope': 'user'}
+            )
+        window[1] += 1
+        await inject_latency(self.rng, self.latency, self.jitter)
+        self.calls[request.match_info['operation']] += 1
+        return web.json_response({}, headers={
+            'X-RateLimit-Limit': str(self.route_limit),
+            'X-RateLimit-Remaining': str(self.route_limit - int(window[1])),
+            'X-RateLimit-Reset-After': f"{reset_after:.3f}",
+        })
+
+
+class HTTPDiscordAPI(FakeDiscordAPI):
+    """偽のDiscordオブジェクトの操作を FakeDiscordREST へのHTTPリクエストとして送信"""
+
+    def __init__(self, base_url: str, session: aiohttp.ClientSession):
+        super().__init__()
+        self.base_url = base_url.rstrip('/')
+        self.session = session
+        self.rate_limited = 0
+
+    async def call(self, name: str, route: Optional[str] = None):
+        self.calls[name] += 1
+        scheduler = get_scheduler()
+        while True:
+            # ルートのキー（POST channels/123/messages など）のメジャーパラメータに送信する
+            major = '/'.join(route.split(' ', 1)[1].split('/')[:2]) if route else 'misc/0'
+            async with self.session.post(f"{self.base_url}/{major}/{name}") as response:
+                await response.read()
+                # 本番では discord.Client の http_trace でスケジューラに渡しているヘッダー
+                scheduler.observe(route, response.status, response.headers)
+                if response.status != 429:
+                    return
+                # discord.py と同様にRetry-Afterだけ待って再送する
+                self.rate_limited += 1
+                await asyncio.sleep(float(response.headers.get('Retry-After', '1')))
+
+
+async def measure(name: str, func) -> Dict[str, Any]:
+    """処理の実行時間とピークメモリを計測"""
+    tracemalloc.reset_peak()
+    memory_before = tracemalloc.get_traced_memory()[0]
+    started = time.perf_counter()
+    result = await func()
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    return {'run': name, 'wall_s': round(elapsed, 3), 'peak_memory_kb': round((peak - memory_before) / 1024, 1),
+            'result': result}
+
+
+async def run_size(size: int, args) -> List[Dict[str, Any]]:
+    """1つの規模のorganizationで各同期を実行"""
+    from sync_channel.sync_channel import SyncChannel
+
+    github = FakeGitHub(size, args.github_latency_ms, args.github_jitter_ms, args.github_rate_limit, seed=args.seed)
+    discord_rest = FakeDiscordREST(args.discord_latency_ms, args.discord_jitter_ms, args.discord_route_limit,
+                                   args.discord_route_window, seed=args.seed)
+    github_server = TestServer(github.app())
+    discord_server = TestServer(discord_rest.app())
+    await github_server.start_server()
+    await discord_server.start_server()
+
+    config.GITHUB_API_URL = str(github_server.make_url(''))
+    # 同期状態とETagキャッシュは規模ごとに作り直す
+    for path in (config.SYNC_STATE_FILE, config.GITHUB_CACHE_FILE):
+        if os.path.exists(path):
+            os.remove(path)
+
+    results = []
+    async with aiohttp.ClientSession() as session:
+        client = FakeDiscordClient()
+        client.api = HTTPDiscordAPI(str(discord_server.make_url('')), session)
+        guild = client.add_guild(GUILD_ID)
+        guild.create_category("repositories", CATEGORY_ID)
+        syncer = SyncChannel(client)
+
+        async def run(name: str, func, summarize):
+            github.calls.clear()
+            discord_rest.calls.clear()
+            client.api.calls.clear()
+            client.api.rate_limited = 0
+            measured = await measure(name, func)
+            record = {
+                'size': size,
+                'run': name,
+                'wall_s': measured['wall_s'],
+                'peak_memory_kb': measured['peak_memory_kb'],
+                'github_calls': dict(github.calls),
+                'discord_calls': dict(client.api.calls),
+                'discord_429': client.api.rate_limited,
+                **summarize(measured['result']),
+            }
+            results.append(record)
+            logger.info(f"size={size} {name}: {record['wall_s']}s")
+
+        def sync_summary(stats):
+            return {key: stats[key] for key in ('mode', 'created', 'updated', 'skipped', 'errors')}
+
+        await run('list-repos', syncer.get_github_repositories, lambda repos: {'repos': len(repos)})
+        await run('full', lambda: syncer.sync_repositories(full=True), sync_summary)
+        await run('full-noop', lambda: syncer.sync_repositories(full=True), sync_summary)
+
+        # 差分同期は前回の同期以降に更新されたリポジトリのみを取得する
+        github.touch(max(1, int(size * args.touch_ratio)))
+        await run('incremental', lambda: syncer.sync_repositories(full=False), sync_summary)
+
+        github.touch(max(1, int(size * args.touch_ratio)))
+        await run('dry-run', lambda: syncer.sync_repositories(dry_run=True, full=True), lambda stats: {
+            'mode': stats['mode'],
+            'planned': {kind: sum(1 for a in stats['plan'] if a.action == kind) for kind in ('create', 'update', 'noop')}
+        })
+
+    await close_session()
+    await github_server.close()
+    await discord_server.close()
+    return results
+
+
+async def run_all(args) -> List[Dict[str, Any]]:
+    config.GITHUB_TOKEN = 'load-test-token'
+    config.DISCORD_TOKEN = 'load-test-token'
+    config.GITHUB_ORGANIZATION = ORGANIZATION
+    config.DISCORD_GUILD_ID = GUILD_ID
+    config.DISCORD_CATEGORY_ID = CATEGORY_ID
+    config.SYNC_CONCURRENCY = args.concurrency
+    config.GITHUB_CACHE_MAX_ENTRIES = max(config.GITHUB_CACHE_MAX_ENTRIES, max(args.sizes) // 100 * 2 + 10)
+
+    tracemalloc.start()
+    results = []
+    for size in args.sizes:
+        results.extend(await run_size(size, args))
+    tracemalloc.stop()
+    return results
+
+
+def print_table(results: List[Dict[str, Any]]):
+    header = f"{'size':>6} {'run':<12} {'wall_s':>8} {'peak_kb':>9} {'github':<24} {'discord':<40} {'429':>4}  summary"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        summary = {k: v for k, v in r.items() if k not in (
+            'size', 'run', 'wall_s', 'peak_memory_kb', 'github_calls', 'discord_calls', 'discord_429')}
+        github = ",".join(f"{k}:{v}" for k, v in sorted(r['github_calls'].items()))
+        discord_calls = ",".join(f"{k}:{v}" for k, v in sorted(r['discord_calls'].items()))
+        print(f"{r['size']:>6} {r['run']:<12} {r['wall_s']:>8} {r['peak_memory_kb']:>9} {github:<24} "
+              f"{discord_calls:<40} {r['discord_429']:>4}  {summary}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='リポジトリ同期の負荷試験')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000], help='organizationのリポジトリ数')
+    parser.add_argument('--concurrency', type=int, default=config.SYNC_CONCURRENCY, help='SYNC_CONCURRENCY')
+    parser.add_argument('--touch-ratio', type=float, default=0.01, help='差分同期の前に更新するリポジトリの割合')
+    parser.add_argument('--github-latency-ms', type=float, default=30, help='GitHub APIの平均遅延（ミリ秒）')
+    parser.add_argument('--github-jitter-ms', type=float, default=10, help='GitHub APIの遅延のゆらぎ（ミリ秒）')
+    parser.add_argument('--github-rate-limit', type=int, default=5000, help='GitHub APIの1時間あたりのリクエスト数')
+    parser.add_argument('--discord-latency-ms', type=float, default=5, help='Discord APIの平均遅延（ミリ秒）')
+    parser.add_argument('--discord-jitter-ms', type=float, default=2, help='Discord APIの遅延のゆらぎ（ミリ秒）')
+    parser.add_argument('--discord-route-limit', type=int, default=50, help='Discordのルートごとのリクエスト数の上限')
+    parser.add_argument('--discord-route-window', type=float, default=1.0, help='Discordのレート制限のウィンドウ（秒）')
+    parser.add_argument('--seed', type=int, default=1, help='乱数のシード')
+    parser.add_argument('--json', action='store_true', help='結果をJSONで出力')
+    parser.add_argument('--verbose', action='store_true', help='同期処理のログを表示')
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO if args.verbose else logging.WARNING,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    if not args.verbose:
+        # 件数が多いため、チャンネルごとのログは表示しない
+        logging.getLogger('sync_channel').setLevel(logging.WARNING)
+        # 429の回数は結果の表に出力する
+        logging.getLogger('common.discord_scheduler').setLevel(logging.ERROR)
+
+    # 同期状態やETagキャッシュのファイルは一時ディレクトリに作成する
+    with tempfile.TemporaryDirectory() as workdir:
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            results = asyncio.run(run_all(args))
+        finally:
+            os.chdir(cwd)
+
+    if args.json:
+        print(json.dumps(results, indent=2, ensure_ascii=False, default=str))
+    else:
+        print_table(results)
+    return 0 if all(r.get('errors', 0) == 0 for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Comment ConnectorのJSONストレージをSQLiteに移行するスクリプト
+
+使用例:
+    python scripts/migrate_storage.py
+    python scripts/migrate_storage.py --json comment_connector_data.json --db comment_connector_data.db
+
+移行後は .env に STORAGE_BACKEND=sqlite を設定してください。
+"""
+
+import sys
+import os
+import argparse
+import logging
+
+# プロジェクトルートをPythonパスに追加
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import config
+from comment_connecter.sqlite_storage import SQLiteStorage, migrate_json_to_sqlite
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+def main():
+    """メイン関数"""
+    parser = argparse.ArgumentParser(description="JSONストレージをSQLiteに移行")
+    parser.add_argument('--json', default=config.STORAGE_FILE, help="移行元のJSONファイル")
+    parser.add_argument('--db', default=config.SQLITE_STORAGE_FILE, help="移行先のSQLiteファイル")
+    args = parser.parse_args()
+    
+    if not os.path.exists(args.json):
+        logger.error(f"JSONファイルが見つかりません: {args.json}")
+        return 1
+    
+    storage = SQLiteStorage(args.db)
+    try:
+        counts = migrate_json_to_sqlite(args.json, storage)
+    finally:
+        storage.close()
+    
+    logger.info(
+        f"移行完了 - ユーザー: {counts['user_mappings']}, "
+        f"チャンネル: {counts['channel_mappings']}, "
+        f"スレッド: {counts['thread_mappings']}"
+    )
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
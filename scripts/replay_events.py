@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+WebHookイベントのログを再送するスクリプト
+
+Comment Connectorが記録したイベントのログ（EVENT_LOG_DIR）から、オフセットまたは
+受信時刻の範囲を指定してWebHookサーバーに一定のレートで再送します。
+再送したイベントは通常の処理（重複排除・キュー・ハンドラ）を通り、ログには再度記録されません。
+元の配信IDのまま送るため、処理済みのイベントは重複としてスキップされ、停止などで
+処理されなかったイベントだけが処理されます。
+
+使用例:
+    python scripts/replay_events.py --list
+    python scripts/replay_events.py --since 2024-05-01T10:00 --until 2024-05-01T12:30 --rate 5
+    python scripts/replay_events.py --from-offset 1200 --to-offset 1300 --dry-run
+    python scripts/replay_events.py --from-offset 1200 --new-delivery-ids   # 処理済みのイベントも再処理
+"""
+
+import sys
+import os
+import argparse
+import asyncio
+import json
+import logging
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict
+
+# プロジェクトルートをPythonパスに追加
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import aiohttp
+
+import config
+from comment_connecter.event_log import REPLAY_HEADER, load_index, read_events
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 5
+
+
+def parse_time(value: str) -> float:
+    """ISO 8601の日時（タイムゾーンの指定がなければローカル時刻）またはUNIX時刻"""
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+def format_time(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp).isoformat(timespec='seconds')
+
+
+def list_segments(directory: str):
+    """セグメントのオフセットと受信時刻の範囲を表示"""
+    index = load_index(directory)
+    if not index:
+        print("圧縮済みのセグメントはありません")
+    for entry in index:
+        print(f"{entry['file']}.gz  offsets {entry['first_offset']}-{entry['last_offset']}  "
+              f"{format_time(entry['first_time'])} - {format_time(entry['last_time'])}  {entry['bytes'] / 1024:.0f}KB")
+    last = None
+    for last in read_events(directory, from_offset=index[-1]['last_offset'] + 1 if index else None):
+        pass
+    if last is not None:
+        print(f"(書き込み中のセグメント: 最新のオフセット {last['offset']}, {format_time(last['received_at'])})")
+
+
+async def send(session: aiohttp.ClientSession, url: str, record: Dict[str, Any], delivery_id: str) -> int:
+    """1件のイベントを送信し、ステータスコードを返す（503の場合はRetry-Afterだけ待って再送）"""
+    headers = {
+        'X-GitHub-Event': record['event'],
+        'X-GitHub-Delivery': delivery_id,
+        REPLAY_HEADER: str(record['offset']),
+        'Content-Type': 'application/json',
+    }
+    body = json.dumps(record['payload'], ensure_ascii=False).encode('utf-8')
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        async with session.post(url, data=body, headers=headers) as response:
+            await response.read()
+            if response.status != 503 or attempt == MAX_ATTEMPTS:
+                return response.status
+            delay = float(response.headers.get('Retry-After', '10'))
+        logger.warning(f"Queue full, retrying offset {record['offset']} in {delay:.0f}s")
+        await asyncio.sleep(delay)
+    return 503
+
+
+async def replay(args) -> Counter:
+    results: Counter = Counter()
+    interval = 1 / args.rate if args.rate > 0 else 0
+    next_at = time.monotonic()
+    events = set(args.event) if args.event else None
+    timeout = aiohttp.ClientTimeout(total=30)
+    async with aiohttp.ClientSession(timeout=timeout) as session:
+        for record in read_events(args.dir, args.from_offset, args.to_offset, args.since, args.until):
+            if events is not None and record['event'] not in events:
+                continue
+            delivery_id = record['delivery_id']
+            if args.new_delivery_ids:
+                delivery_id = f"replay-{record['offset']}-{delivery_id}"
+            if args.dry_run:
+                action = record['payload'].get('action')
+                print(f"{record['offset']}  {format_time(record['received_at'])}  {record['event']}"
+                      f"{'.' + action if action else ''}  {delivery_id}")
+                results['dry_run'] += 1
+                continue
+
+            # 送信の開始時刻を一定の間隔に揃え、WebHookサーバーに負荷をかけすぎないようにする
+            delay = next_at - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            next_at = max(next_at, time.monotonic()) + interval
+            try:
+                status = await send(session, args.url, record, delivery_id)
+            except aiohttp.ClientError as e:
+                logger.error(f"Failed to replay offset {record['offset']}: {e}")
+                status = 'error'
+            # 200は処理済み（重複）としてスキップされたイベント
+            results['skipped' if status == 200 else status] += 1
+            if status not in (200, 202):
+                logger.warning(f"Offset {record['offset']} ({record['event']}, {delivery_id}): {status}")
+    return results
+
+
+def main():
+    """メイン関数"""
+    parser = argparse.ArgumentParser(description="WebHookイベントのログを再送")
+    parser.add_argument('--dir', default=config.EVENT_LOG_DIR, help="イベントのログのディレクトリ")
+    parser.add_argument('--url', default=f"http://localhost:{config.WEBHOOK_PORT}/webhook/github",
+                        help="再送先のWebHookのURL")
+    parser.add_argument('--from-offset', type=int, help="再送する最初のオフセット")
+    parser.add_argument('--to-offset', type=int, help="再送する最後のオフセット")
+    parser.add_argument('--since', type=parse_time, help="再送する受信時刻の開始（ISO 8601またはUNIX時刻）")
+    parser.add_argument('--until', type=parse_time, help="再送する受信時刻の終了（ISO 8601またはUNIX時刻）")
+    parser.add_argument('--event', action='append', help="再送するイベントの種類（複数指定可）")
+    parser.add_argument('--rate', type=float, default=5, help="1秒あたりの送信数（0で制限なし）")
+    parser.add_argument('--new-delivery-ids', action='store_true',
+                        help="配信IDを変えて送信し、処理済みのイベントも再処理する")
+    parser.add_argument('--dry-run', action='store_true', help="再送するイベントを表示するだけで送信しない")
+    parser.add_argument('--list', action='store_true', help="セグメントの一覧を表示")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.dir):
+        logger.error(f"イベントのログが見つかりません: {args.dir}")
+        return 1
+    if args.list:
+        list_segments(args.dir)
+        return 0
+    if args.from_offset is None and args.since is None and not args.dry_run:
+        logger.error("--from-offset または --since で再送する範囲を指定してください")
+        return 1
+
+    results = asyncio.run(replay(args))
+    summary = ", ".join(f"{status}: {count}" for status, count in results.most_common()) or "対象のイベントなし"
+    logger.info(f"再送完了 - {summary}")
+    return 0 if set(results) <= {202, 'skipped', 'dry_run'} else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -7,6 +7,8 @@ GitHubリポジトリとDiscordチャンネルの自動同期を行います。
 
 使用例:
     python scripts/sync_repositories.py
+    python scripts/sync_repositories.py --dry-run  # 変更を適用せずに同期計画のみを表示
+    python scripts/sync_repositories.py --full     # 前回の同期以降の更新に関係なく全件を照合
 
 cron設定例（毎日午前9時に実行）:
     0 9 * * * cd /path/to/kurono-bot && python scripts/sync_repositories.py >> logs/sync.log 2>&1
@@ -15,15 +17,23 @@ cron設定例（毎日午前9時に実行）:
 import sys
 import os
 import asyncio
+import argparse
 import logging
 from datetime import datetime
 
 # プロジェクトルートをPythonパスに追加
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
 
-import discord
 import config
-from synk_channel.synk_channel import SyncChannel
+import sync_channel
+from sync_channel.utils import validate_config
+from common.lazy import lazy_import
+from common.rate_limit import get_budget
+
+# 設定の検証で終了する場合にdiscord・aiohttpを読み込まないよう、最初の使用時にインポートする
+discord = lazy_import('discord')
+github_client = lazy_import('common.github_client')
+discord_scheduler = lazy_import('common.discord_scheduler')
 
 # ログ設定
 logging.basicConfig(
@@ -40,20 +50,23 @@ logger = logging.getLogger(__name__)
 class SyncBot:
     """同期専用のシンプルなBot"""
     
-    def __init__(self):
+    def __init__(self, dry_run: bool = False, full: bool = False):
         self.intents = discord.Intents.default()
-        self.client = discord.Client(intents=self.intents)
+        self.client = discord.Client(intents=self.intents, http_trace=discord_scheduler.get_scheduler().trace_config())
         self.sync_channel = None
+        self.dry_run = dry_run
+        self.full = full
         
         @self.client.event
         async def on_ready():
             logger.info(f'Bot logged in as {self.client.user}')
             
             # 同期実行
-            self.sync_channel = SyncChannel(self.client)
+            self.sync_channel = sync_channel.SyncChannel(self.client)
             await self.perform_sync()
             
             # 同期完了後にBotを終了
+            await github_client.close_session()
             await self.client.close()
     
     async def perform_sync(self):
@@ -62,18 +75,30 @@ class SyncBot:
             logger.info("GitHubリポジトリとDiscordチャンネルの同期を開始します")
             start_time = datetime.now()
             
-            stats = await self.sync_channel.sync_repositories()
+            stats = await self.sync_channel.sync_repositories(dry_run=self.dry_run, full=True if self.full else None)
             
             end_time = datetime.now()
             duration = (end_time - start_time).total_seconds()
             
+            if self.dry_run:
+                for action in stats['plan']:
+                    if action.action != 'noop':
+                        logger.info(f"[dry-run] {action.action}: {action.channel_name}")
+                return
+            
             logger.info(
-                f"同期完了 - "
+                f"同期完了（{stats['mode']}） - "
                 f"作成: {stats['created']}, "
                 f"更新: {stats['updated']}, "
+                f"変更なし: {stats['skipped']}, "
                 f"エラー: {stats['errors']}, "
                 f"実行時間: {duration:.2f}秒"
             )
+            for phase, seconds in stats['timings'].items():
+                logger.info(f"  {phase}: {seconds:.2f}秒")
+            logger.info(f"GitHub APIレート制限: {get_budget().snapshot()}")
+            for name in stats['orphaned']:
+                logger.warning(f"リポジトリが見つからないチャンネル: {name}")
             
             # 統計情報をファイルに保存
             await self.save_sync_stats(stats, duration)
@@ -109,16 +134,20 @@ class SyncBot:
 
 def main():
     """メイン関数"""
+    parser = argparse.ArgumentParser(description="GitHubリポジトリとDiscordチャンネルを同期")
+    parser.add_argument('--dry-run', action='store_true', help="変更を適用せずに同期計画のみを表示")
+    parser.add_argument('--full', action='store_true', help="前回の同期以降の更新に関係なく全件を照合")
+    args = parser.parse_args()
+    
     logger.info("=== GitHub Repository Sync Script Started ===")
     
     # 設定の検証
-    from synk_channel.utils import validate_config
     if not validate_config():
         logger.error("設定が不完全です。.envファイルを確認してください。")
         return 1
     
     # 同期Bot実行
-    bot = SyncBot()
+    bot = SyncBot(dry_run=args.dry_run, full=args.full)
     success = bot.run()
     
     if success:
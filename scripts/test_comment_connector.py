@@ -39,9 +39,9 @@ def test_persistent_storage():
     # テスト用の一時ファイル
     test_file = "test_storage.json"
     
+    storage = PersistentStorage(test_file)
+    
     try:
-        storage = PersistentStorage(test_file)
-        
         # ユーザーマッピングのテスト
         storage.set_user_mapping("github_user", "discord_123")
         mappings = storage.get_user_mappings()
@@ -61,6 +61,7 @@ def test_persistent_storage():
         print("✅ Thread mapping test passed")
         
     finally:
+        storage.close()
         # テストファイルを削除
         if os.path.exists(test_file):
             os.remove(test_file)
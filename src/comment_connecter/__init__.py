@@ -2,6 +2,9 @@
 Comment Connector module for Discord-GitHub integration
 """
 
-from .comment_connecter import setup
+from common.lazy import lazy_exports
 
-__all__ = ['setup']
+# discord・aiohttpを読み込まずにイベントのログなどを使えるよう、参照時にインポートする
+__getattr__ = lazy_exports(__name__, {'setup': '.comment_connecter', 'teardown': '.comment_connecter'})
+
+__all__ = ['setup', 'teardown']
@@ -0,0 +1,174 @@
+"""
+スレッドへの通知をまとめて送信するコアレッサー
+
+短時間に連続して届いたイベント（複数のインラインコメントを含むレビューなど）を
+スレッドごとに一定時間まとめ、複数のEmbedを含む1つのメッセージとして送信する。
+"""
+
+import asyncio
+import logging
+import time
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+import discord
+
+from common.discord_scheduler import DiscordScheduler, Priority, get_scheduler, route_key
+from common.metrics import get_registry
+from common.tracing import Trace, current_trace
+
+logger = logging.getLogger(__name__)
+
+# 処理中のWebHookイベントの種類とGitHub上での発生時刻（UNIX時刻）
+EventOrigin = Tuple[str, float]
+event_origin: ContextVar[Optional[EventOrigin]] = ContextVar('event_origin', default=None)
+
+NOTIFICATION_FRESHNESS = get_registry().histogram(
+    'kurono_notification_freshness_seconds', 'Time from the GitHub event until its Discord post is sent', ['event'],
+    buckets=(0.5, 1, 2, 5, 10, 30, 60, 120, 300, 900, 3600)
+)
+
+
+def observe_freshness(origins: Iterable[Optional[EventOrigin]]):
+    """送信した通知の元になったイベントの発生時刻から、送信までの時間を記録"""
+    now = time.time()
+    for origin in origins:
+        if origin is not None:
+            event_type, occurred_at = origin
+            NOTIFICATION_FRESHNESS.observe(max(0.0, now - occurred_at), event=event_type)
+
+# Discordの1メッセージあたりの制限
+MAX_EMBEDS_PER_MESSAGE = 10
+MAX_EMBED_CHARS_PER_MESSAGE = 6000
+
+# 送信に失敗した場合に呼ばれる関数（thread, embeds, error）
+ErrorHandler = Callable[[Any, List[discord.Embed], Exception], Awaitable[None]]
+
+
+def batch_embeds(embeds: List[discord.Embed], max_embeds: int = MAX_EMBEDS_PER_MESSAGE,
+                 max_chars: int = MAX_EMBED_CHARS_PER_MESSAGE) -> List[List[discord.Embed]]:
+    """
+    Embedの一覧を1メッセージの制限（件数・合計文字数）に収まるように分割
+
+    Args:
+        embeds: 送信するEmbed（送信順）
+        max_embeds: 1メッセージあたりのEmbedの最大数
+        max_chars: 1メッセージあたりのEmbedの合計文字数の上限
+
+    Returns:
+        list: メッセージごとのEmbedの一覧
+    """
+    batches: List[List[discord.Embed]] = []
+    current: List[discord.Embed] = []
+    current_chars = 0
+    for embed in embeds:
+        size = len(embed)
+        if current and (len(current) >= max_embeds or current_chars + size > max_chars):
+            batches.append(current)
+            current, current_chars = [], 0
+        current.append(embed)
+        current_chars += size
+    if current:
+        batches.append(current)
+    return batches
+
+
+class NotificationCoalescer:
+    """スレッドごとに一定時間内の通知をまとめて送信"""
+
+    def __init__(self, window_ms: float = 1000, on_error: Optional[ErrorHandler] = None,
+                 scheduler: Optional[DiscordScheduler] = None):
+        self.window = window_ms / 1000
+        self.on_error = on_error
+        self.scheduler = scheduler or get_scheduler()
+        # thread_id -> 送信待ちのEmbed
+        self.pending: Dict[int, List[discord.Embed]] = {}
+        # thread_id -> 送信待ちのEmbedの元になったイベントとそのトレース（pendingと同じ順）
+        self.sources: Dict[int, List[Tuple[Optional[EventOrigin], Optional[Trace]]]] = {}
+        self.threads: Dict[int, Any] = {}
+        self.tasks: Dict[int, asyncio.Task] = {}
+        self._flush_now = asyncio.Event()
+        self.stats = {'events': 0, 'messages': 0, 'failed': 0}
+
+    @property
+    def pending_count(self) -> int:
+        """送信待ちのEmbed数"""
+        return sum(len(embeds) for embeds in self.pending.values())
+
+    async def send(self, thread, embed: discord.Embed):
+        """
+        スレッドへの通知を追加
+
+        ウィンドウが0以下の場合はすぐに送信し、送信エラーは呼び出し元に送出する。
+        それ以外の場合はウィンドウの経過後にまとめて送信し、エラーはon_errorに渡す。
+        """
+        self.stats['events'] += 1
+        source = (event_origin.get(), current_trace())
+        if self.window <= 0:
+            await self._deliver(thread, [embed], [source])
+            return
+
+        self.pending.setdefault(thread.id, []).append(embed)
+        self.sources.setdefault(thread.id, []).append(source)
+        self.threads[thread.id] = thread
+        if thread.id not in self.tasks:
+            self.tasks[thread.id] = asyncio.create_task(self._run(thread.id))
+
+    async def _run(self, thread_id: int):
+        try:
+            try:
+                await asyncio.wait_for(self._flush_now.wait(), timeout=self.window)
+            except asyncio.TimeoutError:
+                pass
+            # 送信中に追加された通知も同じタスクで続けて送信し、順序を保つ
+            while self.pending.get(thread_id):
+                await self._flush(thread_id)
+        finally:
+            self.tasks.pop(thread_id, None)
+
+    async def _flush(self, thread_id: int):
+        embeds = self.pending.pop(thread_id, [])
+        sources = self.sources.pop(thread_id, [])
+        thread = self.threads.pop(thread_id, None)
+        if not embeds or thread is None:
+            return
+        try:
+            await self._deliver(thread, embeds, sources)
+        except Exception as e:
+            self.stats['failed'] += 1
+            if self.on_error:
+                await self.on_error(thread, embeds, e)
+            else:
+                logger.error(f"Failed to send {len(embeds)} notifications to thread {thread_id}: {e}")
+
+    async def _deliver(self, thread, embeds: List[discord.Embed],
+                       sources: List[Tuple[Optional[EventOrigin], Optional[Trace]]]):
+        start = time.perf_counter()
+        error = None
+        try:
+            for batch in batch_embeds(embeds):
+                await self.scheduler.submit(
+                    Priority.NOTIFICATION, thread.send, embeds=batch, route=route_key('POST', 'channels', thread.id, '/messages')
+                )
+                self.stats['messages'] += 1
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            # まとめて送信した通知は、元になったそれぞれの配信のトレースに記録する
+            end = time.perf_counter()
+            traces = {id(trace): trace for _, trace in sources if trace is not None}
+            for trace in traces.values():
+                trace.add_span('discord.thread_send', start, end, {'embeds': len(embeds)}, error)
+        observe_freshness(origin for origin, _ in sources)
+        if len(embeds) > 1:
+            logger.debug(f"Coalesced {len(embeds)} notifications for thread {thread.id}")
+
+    async def flush_all(self):
+        """送信待ちの通知をすべてすぐに送信"""
+        self._flush_now.set()
+        try:
+            if self.tasks:
+                await asyncio.gather(*self.tasks.values(), return_exceptions=True)
+        finally:
+            self._flush_now.clear()
@@ -1,28 +1,121 @@
 import discord
-from discord.ext import commands
 import aiohttp
 import json
 import asyncio
-from typing import Dict, Optional, List, Tuple
+import hmac
+from contextvars import ContextVar
+from typing import Any,  Awaitable, Callable, Dict, Optional, List, Tuple
 import logging
-from github import Github
 import config
-from .utils import PersistentStorage, extract_repo_and_issue_from_url, format_github_content, create_github_embed
+from common.github_client import GitHubClient
+from common.discord_scheduler import Priority, get_scheduler, interactive, route_key
+from common.rate_limit import get_budget
+from common.metrics import get_registry
+from common.tracing import get_tracer, span
+from common.loop_monitor import MAX_PROFILE_SECONDS, get_loop_monitor, render_collapsed, sample_stacks
+from .utils import BidirectionalMapping, ThreadKey, create_storage, format_github_content, create_github_embed, webhook_event_key, webhook_event_time
+from .work_queue import WebhookQueue
+from .dedup import DeliveryCache
+from .coalescer import NotificationCoalescer, batch_embeds, event_origin, observe_freshness
+from .keyed_executor import KeyedExecutor
+from .thread_registry import ThreadRegistry, ColdThreadStore
+from .event_log import REPLAY_HEADER, EventLog
+from .dead_letter import EXHAUSTED, PENDING, DeadLetterQueue, DeadLetterStore, describe_dead_letter
 from .exceptions import GitHubAPIError, WebHookError, DiscordAPIError, ConfigurationError
 
 logger = logging.getLogger(__name__)
 
+# repository イベントを受けてチャンネルを同期する関数（action, repository, changes）
+RepositoryHandler = Callable[[str, Dict, Dict], Awaitable[Optional[discord.abc.GuildChannel]]]
+
+_metrics = get_registry()
+WEBHOOK_REQUESTS = _metrics.counter(
+    'kurono_webhook_requests_total', 'Webhook requests received by response status', ['event', 'status']
+)
+QUEUE_DEPTH = _metrics.gauge('kurono_webhook_queue_depth', 'Webhook events waiting in the queue')
+PENDING_WORK = _metrics.gauge('kurono_pending_work', 'Work waiting inside the connector', ['stage'])
+MAPPING_SIZE = _metrics.gauge('kurono_mapping_entries', 'Number of entries in each mapping table', ['table'])
+
+# 処理中のイベントで完了したDiscordへの送信（デッドレターキューに保存し、再試行で同じ送信を繰り返さない）
+event_progress: ContextVar[Optional[Dict[str, Any]]] = ContextVar('event_progress', default=None)
+
 class CommentConnector:
-    def __init__(self, client: discord.Client):
+    def __init__(self, client: discord.Client, repository_handler: Optional[RepositoryHandler] = None):
         self.client = client
-        self.github = Github(config.GITHUB_TOKEN) if config.GITHUB_TOKEN else None
-        self.storage = PersistentStorage()
+        self.repository_handler = repository_handler
+        self.github = GitHubClient(config.GITHUB_TOKEN) if config.GITHUB_TOKEN else None
+        self.storage = create_storage(
+            config.STORAGE_BACKEND, config.STORAGE_FILE, config.SQLITE_STORAGE_FILE,
+            flush_interval=config.STORAGE_FLUSH_INTERVAL
+        )
         
         # 永続化されたデータを読み込み
-        self.user_mappings = self.storage.get_user_mappings()
-        self.thread_mappings = self.storage.get_thread_mappings()
+        self.user_mappings = BidirectionalMapping(self.storage.get_user_mappings())
+        # クローズ済み・長期間更新のないスレッドはコールドストアに移動する
+        self.thread_mappings = ThreadRegistry(self.storage, ColdThreadStore(config.COLD_THREAD_STORE_FILE))
         self.channel_mappings = self.storage.get_channel_mappings()
         
+        # WebHookはすぐに応答し、イベントはワーカーで処理する
+        self.webhook_queue = WebhookQueue(
+            self.process_queued_event,
+            max_size=config.WEBHOOK_QUEUE_SIZE,
+            workers=config.WEBHOOK_WORKERS
+        )
+        # 同じissue/PRのイベントは受信順に直列で、異なるissue/PRのイベントは並列に処理する
+        self.executor = KeyedExecutor()
+        self.runner = None
+        
+        # 再送されたWebHookを重複処理しないためのキャッシュ
+        self.delivery_cache = DeliveryCache(
+            config.DELIVERY_CACHE_FILE,
+            max_size=config.DELIVERY_CACHE_SIZE,
+            ttl=config.DELIVERY_CACHE_TTL,
+            in_flight_ttl=config.DELIVERY_IN_FLIGHT_TTL
+        )
+        self.autosave_task = None
+        self.eviction_task = None
+        
+        # 受信したイベントをディスクに記録し、障害後に再送できるようにする
+        self.event_log = EventLog(
+            config.EVENT_LOG_DIR,
+            segment_bytes=config.EVENT_LOG_SEGMENT_BYTES,
+            max_bytes=config.EVENT_LOG_MAX_BYTES,
+            max_age_days=config.EVENT_LOG_MAX_AGE_DAYS
+        ) if config.EVENT_LOG_ENABLED else None
+        
+        # 処理に失敗したイベント・送信できなかった通知は保存してバックオフ付きで再試行する
+        self.dead_letters = DeadLetterQueue(
+            DeadLetterStore(config.DEAD_LETTER_FILE),
+            base_delay=config.DEAD_LETTER_BASE_DELAY,
+            max_delay=config.DEAD_LETTER_MAX_DELAY,
+            max_attempts=config.DEAD_LETTER_MAX_ATTEMPTS,
+            permanent_errors=(discord.NotFound, discord.Forbidden)
+        )
+        self.dead_letters.register('event', self.retry_event)
+        self.dead_letters.register('embeds', self.retry_embeds)
+        
+        # 短時間に連続したスレッドへの通知を1つのメッセージにまとめる
+        self.scheduler = get_scheduler()
+        self.coalescer = NotificationCoalescer(
+            config.NOTIFY_COALESCE_MS, on_error=self.dead_letter_embeds, scheduler=self.scheduler
+        )
+        self.tracer = get_tracer()
+        self.register_metrics()
+        
+    def register_metrics(self):
+        """/metrics の出力時に値を取得するゲージを登録"""
+        QUEUE_DEPTH.set_function(lambda: self.webhook_queue.depth)
+        PENDING_WORK.set_function(lambda: self.coalescer.pending_count, stage='notifications')
+        PENDING_WORK.set_function(lambda: len(self.executor), stage='executor_keys')
+        for priority in ('interactive', 'notification', 'background'):
+            PENDING_WORK.set_function(lambda p=priority: self.scheduler.depth[p], stage=f"discord_{priority}")
+        MAPPING_SIZE.set_function(lambda: len(self.user_mappings), table='user')
+        MAPPING_SIZE.set_function(lambda: len(self.channel_mappings), table='channel')
+        MAPPING_SIZE.set_function(lambda: len(self.thread_mappings.hot), table='thread_hot')
+        MAPPING_SIZE.set_function(lambda: len(self.thread_mappings.cold), table='thread_cold')
+        MAPPING_SIZE.set_function(lambda: len(self.delivery_cache), table='delivery_cache')
+        self.dead_letters.register_metrics()
+        
     async def setup_webhook_server(self, port: int = None):
         """WebHookサーバーを起動"""
         if port is None:
@@ -30,52 +123,329 @@ class CommentConnector:
             
         from aiohttp import web
         
-        app = web.Application()
-        app.router.add_post('/webhook/github', self.handle_github_webhook)
+        self.webhook_queue.start()
+        self.autosave_task = asyncio.create_task(self.delivery_cache.autosave())
+        self.eviction_task = asyncio.create_task(self.evict_idle_threads())
+        self.dead_letters.start()
         
-        runner = web.AppRunner(app)
-        await runner.setup()
-        site = web.TCPSite(runner, config.WEBHOOK_HOST, port)
+        self.runner = web.AppRunner(self.create_webhook_app())
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, config.WEBHOOK_HOST, port)
         await site.start()
         logger.info(f"WebHook server started on {config.WEBHOOK_HOST}:{port}")
         
+    def create_webhook_app(self):
+        """WebHookサーバーのaiohttpアプリケーションを作成"""
+        from aiohttp import web
+        
+        app = web.Application()
+        app.router.add_post('/webhook/github', self.handle_github_webhook)
+        app.router.add_get('/health', self.handle_health)
+        app.router.add_get('/metrics', self.handle_metrics)
+        app.router.add_get('/debug/profile', self.handle_debug_profile)
+        app.router.add_get('/debug/stalls', self.handle_debug_stalls)
+        return app
+        
+    async def shutdown(self):
+        """WebHookサーバーを停止し、キューに残ったイベントを処理"""
+        if self.runner:
+            await self.runner.cleanup()
+            self.runner = None
+        await self.webhook_queue.stop()
+        # ワーカーの停止後もキーごとのキューに残った処理を待つ（時間内に終わらない処理はキャンセルする）
+        await self.executor.join(timeout=10.0)
+        await self.coalescer.flush_all()
+        await self.dead_letters.stop()
+        for task in (self.autosave_task, self.eviction_task):
+            if task:
+                task.cancel()
+        self.autosave_task = None
+        self.eviction_task = None
+        self.delivery_cache.save()
+        self.thread_mappings.close()
+        self.storage.close()
+        self.dead_letters.close()
+        if self.event_log:
+            self.event_log.close()
+        
+    async def evict_idle_threads(self):
+        """一定期間更新のないスレッド紐づけを定期的にコールドストアへ移動"""
+        max_idle = config.THREAD_IDLE_DAYS * 86400
+        while True:
+            await asyncio.sleep(config.THREAD_EVICTION_INTERVAL)
+            try:
+                # THREAD_EVICTION_BATCH件ずつ移動し、その間に他の処理を進める
+                while len(self.thread_mappings.evict_idle(max_idle, limit=config.THREAD_EVICTION_BATCH)) >= config.THREAD_EVICTION_BATCH:
+                    await asyncio.sleep(0)
+            except Exception as e:
+                logger.error(f"Error evicting idle thread mappings: {e}", exc_info=True)
+        
     async def handle_github_webhook(self, request):
-        """GitHub WebHookのイベントを処理"""
+        """GitHub WebHookを受け付けてキューに追加（処理はワーカーで非同期に行う）"""
+        delivery_id = request.headers.get('X-GitHub-Delivery', 'unknown')
+        event_type = request.headers.get('X-GitHub-Event')
+        
+        # キューに追加された配信のトレースはワーカーでの処理完了時に終了する
+        # 処理中の配信の再送ではstartがNoneを返すため、処理中のトレースを終了しない
+        trace = self.tracer.start(delivery_id, event=event_type) if delivery_id != 'unknown' else None
+        response = await self.accept_webhook(request, event_type, delivery_id)
+        if trace is not None and response.status != 202:
+            self.tracer.finish(delivery_id, status=response.status)
+        WEBHOOK_REQUESTS.inc(event=event_type or 'unknown', status=response.status)
+        return response
+        
+    async def accept_webhook(self, request, event_type: Optional[str], delivery_id: str):
+        """WebHookリクエストを検証してキューに追加し、GitHubへの応答を返す"""
         from aiohttp import web
         
         try:
-            payload = await request.json()
-            event_type = request.headers.get('X-GitHub-Event')
-            delivery_id = request.headers.get('X-GitHub-Delivery', 'unknown')
-            
-            # リポジトリ情報を取得（存在する場合）
-            repo_name = payload.get('repository', {}).get('name', 'unknown')
-            
-            logger.info(f"Received webhook: event={event_type}, repo={repo_name}, delivery={delivery_id}")
-            
-            if event_type == 'issues':
-                logger.info(f"Processing issue event: {payload['action']} for {repo_name}#{payload['issue']['number']}")
-                await self.handle_issue_event(payload)
-            elif event_type == 'issue_comment':
-                logger.info(f"Processing issue comment event: {payload['action']} for {repo_name}#{payload['issue']['number']}")
-                await self.handle_issue_comment_event(payload)
-            elif event_type == 'pull_request':
-                logger.info(f"Processing pull request event: {payload['action']} for {repo_name}#{payload['pull_request']['number']}")
-                await self.handle_pull_request_event(payload)
-            elif event_type == 'pull_request_review':
-                logger.info(f"Processing pull request review event: {payload['action']} for {repo_name}#{payload['pull_request']['number']}")
-                await self.handle_pull_request_review_event(payload)
-            elif event_type == 'pull_request_review_comment':
-                logger.info(f"Processing pull request review comment event: {payload['action']} for {repo_name}#{payload['pull_request']['number']}")
-                await self.handle_pull_request_review_comment_event(payload)
-            else:
-                logger.info(f"Unhandled webhook event type: {event_type} for repo {repo_name}")
-                
-            logger.info(f"Successfully processed webhook: event={event_type}, repo={repo_name}, delivery={delivery_id}")
-            return web.Response(text='OK')
+            with span('webhook.parse'):
+                payload = await request.json()
+        except Exception as e:
+            logger.warning(f"Invalid webhook payload (delivery={delivery_id}): {e}")
+            return web.Response(text='Invalid payload', status=400)
+            
+        if not event_type or not isinstance(payload, dict):
+            logger.warning(f"Malformed webhook request (delivery={delivery_id}, event={event_type})")
+            return web.Response(text='Malformed request', status=400)
+            
+        # 再送による重複をDiscordへの送信前に破棄
+        track_delivery = delivery_id != 'unknown'
+        with span('webhook.dedup'):
+            is_new = not track_delivery or self.delivery_cache.add_if_new(delivery_id)
+        if not is_new:
+            logger.info(f"Ignoring duplicate webhook delivery: event={event_type}, delivery={delivery_id}")
+            return web.Response(text='Duplicate', status=200)
+            
+        # キューが満杯で拒否する場合も含めて記録する（再送されたイベントは記録済み）
+        # ファイルへの書き込みとセグメントの切り替えはイベントループをブロックしないよう別スレッドで行う
+        # 記録できない場合は受け付けずに、再送で受け付けられるようにする
+        if self.event_log is not None and REPLAY_HEADER not in request.headers:
+            try:
+                await asyncio.to_thread(self.event_log.append, event_type, delivery_id, payload)
+            except Exception as e:
+                logger.error(f"Error logging webhook event (delivery={delivery_id}): {e}", exc_info=True)
+                if track_delivery:
+                    self.delivery_cache.discard(delivery_id)
+                return web.Response(text='Event log unavailable', status=503, headers={'Retry-After': '10'})
+            
+        with span('webhook.enqueue'):
+            queued = self.webhook_queue.submit(event_type, delivery_id, payload)
+        if not queued:
+            if track_delivery:
+                self.delivery_cache.discard(delivery_id)
+            return web.Response(text='Queue full', status=503, headers={'Retry-After': '10'})
+            
+        logger.debug(f"Queued webhook: event={event_type}, delivery={delivery_id}, depth={self.webhook_queue.depth}")
+        return web.Response(text='Accepted', status=202)
+        
+    async def handle_health(self, request):
+        """キューの状態を返すヘルスチェック"""
+        from aiohttp import web
+        
+        return web.json_response({
+            'status': 'ok',
+            'queue_depth': self.webhook_queue.depth,
+            'queue_capacity': self.webhook_queue.max_size,
+            'workers': self.webhook_queue.worker_count,
+            'cached_deliveries': len(self.delivery_cache),
+            'pending_notifications': self.coalescer.pending_count,
+            'executor_keys': len(self.executor),
+            'dead_letters': {status: self.dead_letters.store.count(status) for status in (PENDING, EXHAUSTED)},
+            'discord_pending': self.scheduler.depth,
+            'github_rate_limit': get_budget().snapshot(),
+            **self.webhook_queue.stats
+        })
+        
+    async def handle_metrics(self, request):
+        """Prometheusのテキスト形式でメトリクスを返す"""
+        from aiohttp import web
+        
+        return web.Response(
+            body=get_registry().render().encode('utf-8'),
+            headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+        )
+        
+    def authorize_debug(self, request) -> bool:
+        """/debug/* へのリクエストがDEBUG_TOKENのBearerトークンを持つかどうか"""
+        if not config.DEBUG_TOKEN:
+            return False
+        header = request.headers.get('Authorization', '')
+        return hmac.compare_digest(header.encode(), f"Bearer {config.DEBUG_TOKEN}".encode())
+        
+    async def handle_debug_profile(self, request):
+        """指定秒数のサンプリングプロファイルをcollapsed stack形式で返す（?seconds=N）"""
+        from aiohttp import web
+        
+        if not self.authorize_debug(request):
+            # トークン未設定の場合もエンドポイントの存在を明かさない
+            raise web.HTTPNotFound()
+        try:
+            seconds = float(request.query.get('seconds', '10'))
+        except ValueError:
+            return web.Response(text='Invalid seconds', status=400)
+        seconds = min(max(seconds, 0.1), MAX_PROFILE_SECONDS)
+        
+        logger.info(f"Running sampling profiler for {seconds:.1f}s")
+        counts = await asyncio.to_thread(sample_stacks, seconds)
+        return web.Response(
+            text=render_collapsed(counts),
+            headers={'Content-Disposition': 'attachment; filename="profile.collapsed"'}
+        )
+        
+    async def handle_debug_stalls(self, request):
+        """イベントループの遅延監視が記録したブロックの一覧を返す"""
+        from aiohttp import web
+        
+        if not self.authorize_debug(request):
+            raise web.HTTPNotFound()
+        monitor = get_loop_monitor()
+        return web.json_response({
+            'running': monitor.running,
+            'threshold_ms': monitor.threshold * 1000,
+            'stalls': list(monitor.stalls)
+        })
+        
+    async def process_queued_event(self, event_type: str, delivery_id: str, payload: dict):
+        """ワーカーから呼ばれる処理。失敗したイベントはデッドレターキューに保存して再試行する"""
+        outcome = 'failed'
+        progress: Dict[str, Any] = {}
+        try:
+            await self.run_event(event_type, delivery_id, payload, progress)
+            outcome = 'processed'
         except Exception as e:
-            logger.error(f"Error handling webhook (delivery={delivery_id}): {e}", exc_info=True)
-            return web.Response(text='Error', status=500)
+            self.dead_letters.add('event', {
+                'event_type': event_type, 'delivery_id': delivery_id, 'payload': payload, 'progress': progress
+            }, e)
+            outcome = 'dead_lettered'
+            raise
+        finally:
+            # 処理した・デッドレターキューに保存した配信のみを処理済みとし、GitHubからの再送と二重に処理しない
+            # （停止で中断した配信は処理済みにならず、イベントのログからリプレイできる）
+            if outcome != 'failed' and delivery_id != 'unknown':
+                self.delivery_cache.complete(delivery_id)
+            self.tracer.finish(delivery_id, status=202, outcome=outcome)
+            
+    async def run_event(self, event_type: str, delivery_id: str, payload: dict, progress: Dict[str, Any]):
+        """同じissue/PRのイベントと直列になるようにイベントを処理（完了した送信をprogressに記録する）"""
+        key = webhook_event_key(payload)
+        if key is None:
+            await self.process_event_with_progress(progress, event_type, delivery_id, payload)
+        else:
+            # キューから取り出した直後に（awaitを挟まずに）追加し、受信順を保つ
+            await self.executor.submit(key, self.process_event_with_progress, progress, event_type, delivery_id, payload)
+            
+    async def process_event_with_progress(self, progress: Dict[str, Any], event_type: str, delivery_id: str, payload: dict):
+        # エグゼキューターのタスクは同じキーのイベントで共有されるため、イベントごとに設定する
+        event_progress.set(progress)
+        await self.process_webhook_event(event_type, delivery_id, payload)
+            
+    async def retry_event(self, item: Dict):
+        """デッドレターキューに保存したイベントを、前回までに完了した送信を除いて再処理"""
+        progress = item.setdefault('progress', {})
+        await self.run_event(item['event_type'], item['delivery_id'], item['payload'], progress)
+        
+    async def dead_letter_embeds(self, thread, embeds: List[discord.Embed], error: Exception):
+        """まとめて送信できなかったスレッドへの通知をデッドレターキューに保存"""
+        self.dead_letters.add('embeds', {'thread_id': thread.id, 'embeds': [embed.to_dict() for embed in embeds]}, error)
+        
+    async def retry_embeds(self, item: Dict):
+        """デッドレターキューに保存した通知を再送（ライブの通知より低い優先度で送信する）"""
+        thread_id = item['thread_id']
+        # スレッドが削除されている場合のNotFoundは再試行せずに打ち切る
+        thread = self.client.get_channel(thread_id) or await self.scheduler.submit(
+            Priority.BACKGROUND, self.client.fetch_channel, thread_id, route=route_key('GET', 'channels', thread_id)
+        )
+        embeds = [discord.Embed.from_dict(data) for data in item['embeds']]
+        route = route_key('POST', 'channels', thread_id, '/messages')
+        for batch in batch_embeds(embeds):
+            await self.scheduler.submit(Priority.BACKGROUND, thread.send, embeds=batch, route=route)
+            
+    async def resolve_channel(self, channel_id: int):
+        """
+        チャンネル・スレッドを取得（キャッシュにない場合はAPIから取得）
+        
+        アーカイブされたスレッドや再接続直後などはキャッシュにないため、
+        fetch_channel で取得する。存在しない・権限がない場合はNone。
+        """
+        channel = self.client.get_channel(channel_id)
+        if channel is not None:
+            return channel
+        try:
+            return await self.scheduler.submit(
+                Priority.NOTIFICATION, self.client.fetch_channel, channel_id, route=route_key('GET', 'channels', channel_id)
+            )
+        except (discord.NotFound, discord.Forbidden) as e:
+            logger.warning(f"Channel {channel_id} is not available: {e}")
+            return None
+            
+
+    async def process_webhook_event(self, event_type: str, delivery_id: str, payload: dict):
+        """キューから取り出したGitHub WebHookイベントを処理"""
+        # 受信時に開始したトレースを引き継ぐ（エグゼキューターのタスクで処理される場合も同じ）
+        self.tracer.resume(delivery_id)
+        # 通知の送信時に、GitHub上での発生からの経過時間を記録する
+        occurred_at = webhook_event_time(payload)
+        event_origin.set((event_type, occurred_at) if occurred_at is not None else None)
+        
+        with span('handler.dispatch', event=event_type, action=payload.get('action')):
+            await self.dispatch_webhook_event(event_type, delivery_id, payload)
+            
+    async def dispatch_webhook_event(self, event_type: str, delivery_id: str, payload: dict):
+        """イベントの種類に応じたハンドラを呼び出す"""
+        # リポジトリ情報を取得（存在する場合）
+        repo_name = payload.get('repository', {}).get('name', 'unknown')
+        
+        logger.info(f"Received webhook: event={event_type}, repo={repo_name}, delivery={delivery_id}")
+        
+        if event_type == 'issues':
+            logger.info(f"Processing issue event: {payload['action']} for {repo_name}#{payload['issue']['number']}")
+            await self.handle_issue_event(payload)
+        elif event_type == 'issue_comment':
+            logger.info(f"Processing issue comment event: {payload['action']} for {repo_name}#{payload['issue']['number']}")
+            await self.handle_issue_comment_event(payload)
+        elif event_type == 'pull_request':
+            logger.info(f"Processing pull request event: {payload['action']} for {repo_name}#{payload['pull_request']['number']}")
+            await self.handle_pull_request_event(payload)
+        elif event_type == 'pull_request_review':
+            logger.info(f"Processing pull request review event: {payload['action']} for {repo_name}#{payload['pull_request']['number']}")
+            await self.handle_pull_request_review_event(payload)
+        elif event_type == 'pull_request_review_comment':
+            logger.info(f"Processing pull request review comment event: {payload['action']} for {repo_name}#{payload['pull_request']['number']}")
+            await self.handle_pull_request_review_comment_event(payload)
+        elif event_type == 'repository':
+            logger.info(f"Processing repository event: {payload['action']} for {repo_name}")
+            await self.handle_repository_event(payload)
+        else:
+            logger.info(f"Unhandled webhook event type: {event_type} for repo {repo_name}")
+            
+        logger.info(f"Successfully processed webhook: event={event_type}, repo={repo_name}, delivery={delivery_id}")
+    
+    async def handle_repository_event(self, payload):
+        """リポジトリの作成・名前変更・編集・アーカイブ・削除を該当チャンネルとその紐づけに反映"""
+        action = payload['action']
+        repository = payload['repository']
+        repo_name = repository['name']
+        changes = payload.get('changes', {})
+        
+        channel = None
+        if self.repository_handler:
+            channel = await self.repository_handler(action, repository, changes)
+        
+        if action == 'deleted':
+            self.unlink_channel(repo_name)
+            return
+        if action == 'renamed':
+            old_name = changes.get('repository', {}).get('name', {}).get('from')
+            old_channel_id = self.channel_mappings.get(old_name) if old_name else None
+            if old_channel_id is not None:
+                self.unlink_channel(old_name)
+                self.link_channel(repo_name, channel.id if channel else old_channel_id)
+                return
+        
+        if channel and config.AUTO_LINK_ENABLED and self.channel_mappings.get(repo_name) != channel.id:
+            self.link_channel(repo_name, channel.id)
+            logger.info(f"Linked repository {repo_name} to channel {channel.id}")
     
     async def handle_issue_event(self, payload):
         """Issueイベントの処理"""
@@ -83,10 +453,14 @@ class CommentConnector:
         issue = payload['issue']
         repository = payload['repository']
         
-        if action in ['opened', 'reopened']:
+        if action == 'reopened' and issue['html_url'] in self.thread_mappings:
+            # 既存のスレッドがあれば（コールドストアからも）再利用する
+            await self.notify_issue_state(issue, repository)
+        elif action in ['opened', 'reopened']:
             await self.notify_issue_created(issue, repository)
         elif action == 'closed':
-            await self.notify_issue_closed(issue, repository)
+            await self.notify_issue_state(issue, repository)
+            self.thread_mappings.retire(issue['html_url'])
             
     async def handle_issue_comment_event(self, payload):
         """Issue コメントイベントの処理"""
@@ -104,10 +478,13 @@ class CommentConnector:
         pull_request = payload['pull_request']
         repository = payload['repository']
         
-        if action in ['opened', 'reopened']:
+        if action == 'reopened' and pull_request['html_url'] in self.thread_mappings:
+            await self.notify_pull_request_reopened(pull_request, repository)
+        elif action in ['opened', 'reopened']:
             await self.notify_pull_request_created(pull_request, repository)
         elif action == 'closed':
             await self.notify_pull_request_closed(pull_request, repository)
+            self.thread_mappings.retire(pull_request['html_url'])
             
     async def handle_pull_request_review_event(self, payload):
         """Pull Request レビューイベントの処理"""
@@ -141,7 +518,7 @@ class CommentConnector:
             logger.info(f"No channel mapping found for repository: {repo_name}")
             return
             
-        channel = self.client.get_channel(channel_id)
+        channel = await self.resolve_channel(channel_id)
         if not channel:
             logger.warning(f"Channel not found for ID: {channel_id} (repo: {repo_name})")
             return
@@ -158,17 +535,74 @@ class CommentConnector:
         if issue['body']:
             embed.add_field(name="Description", value=format_github_content(issue['body'], 500), inline=False)
             
-        message = await channel.send(embed=embed)
-        
-        # スレッドを作成
         thread_name = f"Issue #{issue['number']}: {issue['title'][:50]}"
-        thread = await message.create_thread(name=thread_name)
+        thread_id = await self.create_notification_thread(channel, embed, thread_name)
         
         # 永続化
-        self.thread_mappings[issue['html_url']] = thread.id
-        self.storage.set_thread_mapping(issue['html_url'], thread.id)
+        self.link_thread(issue['html_url'], thread_id)
+        
+        logger.info(f"Created thread for issue {repo_name}#{issue_number}: {thread_id}")
+        
+    async def create_notification_thread(self, channel, embed: discord.Embed, thread_name: str) -> int:
+        """
+        チャンネルに通知を送信し、そのメッセージからスレッドを作成
+        
+        デッドレターキューからの再試行では、前回送信したメッセージ・作成したスレッドを再利用し、
+        チャンネルに同じ通知を二重に送信しない。
+        
+        Returns:
+            int: 作成したスレッドのID
+        """
+        progress = event_progress.get()
+        if progress is None:
+            progress = {}
+        if 'thread_id' in progress:
+            return progress['thread_id']
+            
+        if 'message_id' in progress:
+            message = channel.get_partial_message(progress['message_id'])
+        else:
+            with span('discord.channel_send'):
+                message = await self.scheduler.submit(
+                    Priority.NOTIFICATION, channel.send, embed=embed, route=route_key('POST', 'channels', channel.id, '/messages')
+                )
+            progress['message_id'] = message.id
+            observe_freshness([event_origin.get()])
+            
+        # スレッドを作成
+        with span('discord.create_thread'):
+            thread = await self.scheduler.submit(
+                Priority.NOTIFICATION, message.create_thread, name=thread_name,
+                route=route_key('POST', 'channels', channel.id, '/messages/{id}/threads')
+            )
+        progress['thread_id'] = thread.id
+        return thread.id
         
-        logger.info(f"Created thread for issue {repo_name}#{issue_number}: {thread.id}")
+    async def notify_issue_state(self, issue, repository):
+        """Issueのクローズ・再オープン通知"""
+        thread_id = self.thread_mappings.get(issue['html_url'])
+        if not thread_id:
+            return
+            
+        thread = await self.resolve_channel(thread_id)
+        if not thread:
+            return
+            
+        if issue['state'] == 'closed':
+            title = f"✔️ Issue Closed: #{issue['number']}"
+            color = 0x6f42c1
+        else:
+            title = f"📝 Issue Reopened: #{issue['number']}"
+            color = 0x28a745
+            
+        embed = discord.Embed(
+            title=title,
+            description=issue['title'],
+            url=issue['html_url'],
+            color=color
+        )
+        
+        await self.coalescer.send(thread, embed)
         
     async def notify_issue_comment(self, comment, issue, repository):
         """Issue コメント通知"""
@@ -182,7 +616,7 @@ class CommentConnector:
             logger.info(f"No thread found for issue: {issue['html_url']}")
             return
             
-        thread = self.client.get_channel(thread_id)
+        thread = await self.resolve_channel(thread_id)
         if not thread:
             logger.warning(f"Thread not found for ID: {thread_id} (issue: {repo_name}#{issue_number})")
             return
@@ -195,8 +629,8 @@ class CommentConnector:
         )
         embed.add_field(name="Author", value=self.convert_github_mention(comment['user']['login']), inline=True)
         
-        await thread.send(embed=embed)
-        logger.info(f"Sent comment notification to thread {thread_id} for {repo_name}#{issue_number}")
+        await self.coalescer.send(thread, embed)
+        logger.info(f"Queued comment notification to thread {thread_id} for {repo_name}#{issue_number}")
         
     async def notify_pull_request_created(self, pull_request, repository):
         """Pull Request作成通知"""
@@ -210,7 +644,7 @@ class CommentConnector:
             logger.info(f"No channel mapping found for repository: {repo_name}")
             return
             
-        channel = self.client.get_channel(channel_id)
+        channel = await self.resolve_channel(channel_id)
         if not channel:
             logger.warning(f"Channel not found for ID: {channel_id} (repo: {repo_name})")
             return
@@ -229,17 +663,13 @@ class CommentConnector:
         if pull_request['body']:
             embed.add_field(name="Description", value=format_github_content(pull_request['body'], 500), inline=False)
             
-        message = await channel.send(embed=embed)
-        
-        # スレッドを作成
         thread_name = f"PR #{pull_request['number']}: {pull_request['title'][:50]}"
-        thread = await message.create_thread(name=thread_name)
+        thread_id = await self.create_notification_thread(channel, embed, thread_name)
         
         # 永続化
-        self.thread_mappings[pull_request['html_url']] = thread.id
-        self.storage.set_thread_mapping(pull_request['html_url'], thread.id)
+        self.link_thread(pull_request['html_url'], thread_id)
         
-        logger.info(f"Created thread for pull request {repo_name}#{pr_number}: {thread.id}")
+        logger.info(f"Created thread for pull request {repo_name}#{pr_number}: {thread_id}")
         
     async def notify_pull_request_closed(self, pull_request, repository):
         """Pull Request終了通知"""
@@ -247,7 +677,7 @@ class CommentConnector:
         if not thread_id:
             return
             
-        thread = self.client.get_channel(thread_id)
+        thread = await self.resolve_channel(thread_id)
         if not thread:
             return
             
@@ -261,7 +691,26 @@ class CommentConnector:
             color=color
         )
         
-        await thread.send(embed=embed)
+        await self.coalescer.send(thread, embed)
+        
+    async def notify_pull_request_reopened(self, pull_request, repository):
+        """Pull Request再オープン通知"""
+        thread_id = self.thread_mappings.get(pull_request['html_url'])
+        if not thread_id:
+            return
+            
+        thread = await self.resolve_channel(thread_id)
+        if not thread:
+            return
+            
+        embed = discord.Embed(
+            title=f"🔄 Pull Request Reopened: #{pull_request['number']}",
+            description=pull_request['title'],
+            url=pull_request['html_url'],
+            color=0x28a745
+        )
+        
+        await self.coalescer.send(thread, embed)
         
     async def notify_pull_request_review(self, review, pull_request, repository):
         """Pull Request レビュー通知"""
@@ -269,7 +718,7 @@ class CommentConnector:
         if not thread_id:
             return
             
-        thread = self.client.get_channel(thread_id)
+        thread = await self.resolve_channel(thread_id)
         if not thread:
             return
             
@@ -287,7 +736,7 @@ class CommentConnector:
         )
         embed.add_field(name="Reviewer", value=self.convert_github_mention(review['user']['login']), inline=True)
         
-        await thread.send(embed=embed)
+        await self.coalescer.send(thread, embed)
         
     async def notify_pull_request_review_comment(self, comment, pull_request, repository):
         """Pull Request レビューコメント通知"""
@@ -295,7 +744,7 @@ class CommentConnector:
         if not thread_id:
             return
             
-        thread = self.client.get_channel(thread_id)
+        thread = await self.resolve_channel(thread_id)
         if not thread:
             return
             
@@ -307,7 +756,48 @@ class CommentConnector:
         )
         embed.add_field(name="Author", value=self.convert_github_mention(comment['user']['login']), inline=True)
         
-        await thread.send(embed=embed)
+        await self.coalescer.send(thread, embed)
+    
+    async def react(self, message: discord.Message, emoji: str):
+        """ユーザーのメッセージにリアクションを付ける（ユーザー操作への応答として優先して送信）"""
+        await self.scheduler.submit(
+            Priority.INTERACTIVE, message.add_reaction, emoji, route=route_key('PUT', 'channels', message.channel.id, '/messages/{id}/reactions/{id}/@me')
+        )
+        
+    def link_user(self, github_username: str, discord_user_id: str):
+        """GitHubユーザーとDiscordユーザーを紐づけ"""
+        self.user_mappings[github_username] = discord_user_id
+        self.storage.set_user_mapping(github_username, discord_user_id)
+        
+    def unlink_user(self, github_username: str) -> bool:
+        """ユーザー紐づけを解除。紐づけが存在しない場合はFalse"""
+        if github_username not in self.user_mappings:
+            return False
+        del self.user_mappings[github_username]
+        self.storage.remove_user_mapping(github_username)
+        return True
+        
+    def link_channel(self, repo_name: str, channel_id: int):
+        """GitHubリポジトリとDiscordチャンネルを紐づけ"""
+        self.channel_mappings[repo_name] = channel_id
+        self.storage.set_channel_mapping(repo_name, channel_id)
+        
+    def unlink_channel(self, repo_name: str) -> bool:
+        """チャンネル紐づけを解除。紐づけが存在しない場合はFalse"""
+        if repo_name not in self.channel_mappings:
+            return False
+        del self.channel_mappings[repo_name]
+        self.storage.remove_channel_mapping(repo_name)
+        return True
+        
+    def link_thread(self, github_url: str, thread_id: int):
+        """GitHubのissue/PRとDiscordスレッドを紐づけ"""
+        with span('storage.link_thread'):
+            self.thread_mappings.set(github_url, thread_id)
+        
+    def unlink_thread(self, github_url: str) -> bool:
+        """スレッド紐づけを解除。紐づけが存在しない場合はFalse"""
+        return self.thread_mappings.remove(github_url)
     
     def convert_github_mention(self, github_username: str) -> str:
         """GitHubユーザー名をDiscordメンションに変換"""
@@ -318,9 +808,9 @@ class CommentConnector:
         
     def convert_discord_mention(self, discord_user_id: str) -> str:
         """DiscordユーザーIDをGitHubユーザー名に変換"""
-        for github_username, user_id in self.user_mappings.items():
-            if user_id == discord_user_id:
-                return f"@{github_username}"
+        github_username = self.user_mappings.get_key(discord_user_id)
+        if github_username:
+            return f"@{github_username}"
         return f"<@{discord_user_id}>"
     
     async def post_github_comment(self, repo_name: str, issue_number: int, comment_body: str):
@@ -330,9 +820,7 @@ class CommentConnector:
             raise ConfigurationError("GitHub token not configured")
             
         try:
-            repo = self.github.get_repo(f"{config.GITHUB_ORGANIZATION}/{repo_name}")
-            issue = repo.get_issue(issue_number)
-            issue.create_comment(comment_body)
+            await self.github.create_issue_comment(config.GITHUB_ORGANIZATION, repo_name, issue_number, comment_body)
             logger.info(f"Successfully posted comment to {repo_name}#{issue_number}")
             return True
         except Exception as e:
@@ -346,21 +834,15 @@ class CommentConnector:
             # スレッドかどうかチェック
             if isinstance(message.channel, discord.Thread):
                 # GitHubのissue/PRスレッドかどうかチェック
-                github_url = None
-                for url, thread_id in self.thread_mappings.items():
-                    if thread_id == message.channel.id:
-                        github_url = url
-                        break
-                        
-                if github_url:
-                    await self.process_discord_to_github_comment(message, github_url)
+                thread_key = self.thread_mappings.get_key(message.channel.id)
+                if thread_key:
+                    await self.process_discord_to_github_comment(message, thread_key)
                     
-    async def process_discord_to_github_comment(self, message: discord.Message, github_url: str):
+    async def process_discord_to_github_comment(self, message: discord.Message, thread_key: ThreadKey):
         """DiscordメッセージをGitHubコメントに変換"""
+        repo_name, issue_number = thread_key.repo, thread_key.number
+        github_url = thread_key.to_url(config.GITHUB_ORGANIZATION)
         try:
-            # URLからリポジトリ名とissue/PR番号を抽出
-            repo_name, issue_number, issue_type = extract_repo_and_issue_from_url(github_url)
-            
             # メンションを変換
             comment_body = message.content
             # Discord メンションをGitHub メンションに変換
@@ -380,23 +862,28 @@ class CommentConnector:
             success = await self.post_github_comment(repo_name, issue_number, comment_body)
             
             if success:
-                await message.add_reaction("✅")
+                await self.react(message, "✅")
                 logger.info(f"Successfully posted comment to GitHub: {github_url}")
             else:
-                await message.add_reaction("❌")
+                await self.react(message, "❌")
                 logger.error(f"Failed to post comment to GitHub: {github_url}")
                 
         except Exception as e:
             logger.error(f"Error processing Discord to GitHub comment: {e}")
-            await message.add_reaction("❌")
+            await self.react(message, "❌")
 
 # グローバルインスタンス
 comment_connector = None
 
-async def setup(tree: discord.app_commands.CommandTree, client: discord.Client):
+async def setup(tree: discord.app_commands.CommandTree, client: discord.Client,
+                repository_handler: Optional[RepositoryHandler] = None):
     """Comment Connectorモジュールのセットアップ"""
     global comment_connector
-    comment_connector = CommentConnector(client)
+    if comment_connector is not None:
+        # WebHookサーバーの二重起動やコマンドの再登録を防ぐ
+        logger.warning("Comment Connector module is already set up")
+        return
+    comment_connector = CommentConnector(client, repository_handler=repository_handler)
     
     # WebHookサーバー起動
     asyncio.create_task(comment_connector.setup_webhook_server())
@@ -412,9 +899,8 @@ async def setup(tree: discord.app_commands.CommandTree, client: discord.Client):
         if discord_user is None:
             discord_user = interaction.user
             
-        comment_connector.user_mappings[github_username] = str(discord_user.id)
-        comment_connector.storage.set_user_mapping(github_username, str(discord_user.id))
-        await interaction.response.send_message(f"✅ GitHubユーザー `{github_username}` とDiscordユーザー {discord_user.mention} を紐づけました")
+        comment_connector.link_user(github_username, str(discord_user.id))
+        await interactive(interaction.response.send_message, f"✅ GitHubユーザー `{github_username}` とDiscordユーザー {discord_user.mention} を紐づけました")
     
     # チャンネル紐づけコマンド
     @tree.command(name="link_channel", description="GitHubリポジトリとDiscordチャンネルを紐づけ")
@@ -422,9 +908,8 @@ async def setup(tree: discord.app_commands.CommandTree, client: discord.Client):
         if channel is None:
             channel = interaction.channel
             
-        comment_connector.channel_mappings[repo_name] = channel.id
-        comment_connector.storage.set_channel_mapping(repo_name, channel.id)
-        await interaction.response.send_message(f"✅ GitHubリポジトリ `{repo_name}` とDiscordチャンネル {channel.mention} を紐づけました")
+        comment_connector.link_channel(repo_name, channel.id)
+        await interactive(interaction.response.send_message, f"✅ GitHubリポジトリ `{repo_name}` とDiscordチャンネル {channel.mention} を紐づけました")
     
     # 設定確認コマンド
     @tree.command(name="connector_status", description="Comment Connectorの設定状況を確認")
@@ -438,24 +923,43 @@ async def setup(tree: discord.app_commands.CommandTree, client: discord.Client):
         embed.add_field(name="チャンネル紐づけ", value=channel_mappings_text[:1000], inline=False)
         
         thread_count = len(comment_connector.thread_mappings)
-        embed.add_field(name="アクティブスレッド数", value=str(thread_count), inline=True)
+        archived_count = comment_connector.thread_mappings.cold_count
+        embed.add_field(name="アクティブスレッド数", value=f"{thread_count}（アーカイブ: {archived_count}）", inline=True)
         
         github_status = "✅ 接続済み" if comment_connector.github else "❌ 未設定"
         embed.add_field(name="GitHub接続", value=github_status, inline=True)
         
-        await interaction.response.send_message(embed=embed)
+        budget = get_budget().snapshot()
+        if budget['remaining'] is not None:
+            embed.add_field(
+                name="GitHub API残量",
+                value=f"{budget['remaining']}/{budget['limit']}（リセットまで{budget['reset_in']}秒）",
+                inline=True
+            )
+        
+        queue = comment_connector.webhook_queue
+        embed.add_field(name="WebHookキュー", value=f"{queue.depth}/{queue.max_size}", inline=True)
+        
+        store = comment_connector.dead_letters.store
+        embed.add_field(
+            name="デッドレター",
+            value=f"再試行待ち: {store.count(PENDING)} / 打ち切り: {store.count(EXHAUSTED)}",
+            inline=True
+        )
+        
+        await interactive(interaction.response.send_message, embed=embed)
     
     # 自動チャンネル紐づけコマンド
     @tree.command(name="auto_link", description="チャンネル名とリポジトリ名に基づいて自動で紐づけ")
     async def auto_link(interaction: discord.Interaction):
         if not interaction.guild:
-            await interaction.response.send_message("❌ このコマンドはサーバー内でのみ使用できます")
+            await interactive(interaction.response.send_message, "❌ このコマンドはサーバー内でのみ使用できます")
             return
         
         # カテゴリ内のチャンネルを取得
         category = interaction.guild.get_channel(config.DISCORD_CATEGORY_ID)
         if not category:
-            await interaction.response.send_message("❌ 指定されたカテゴリが見つかりません")
+            await interactive(interaction.response.send_message, "❌ 指定されたカテゴリが見つかりません")
             return
         
         linked_count = 0
@@ -463,30 +967,78 @@ async def setup(tree: discord.app_commands.CommandTree, client: discord.Client):
             if isinstance(channel, discord.TextChannel):
                 # チャンネル名をリポジトリ名として使用
                 repo_name = channel.name
-                comment_connector.channel_mappings[repo_name] = channel.id
-                comment_connector.storage.set_channel_mapping(repo_name, channel.id)
+                comment_connector.link_channel(repo_name, channel.id)
                 linked_count += 1
         
-        await interaction.response.send_message(f"✅ {linked_count}個のチャンネルを自動で紐づけました")
+        await interactive(interaction.response.send_message, f"✅ {linked_count}個のチャンネルを自動で紐づけました")
     
     # チャンネル紐づけ解除コマンド
     @tree.command(name="unlink_channel", description="GitHubリポジトリとDiscordチャンネルの紐づけを解除")
     async def unlink_channel(interaction: discord.Interaction, repo_name: str):
-        if repo_name in comment_connector.channel_mappings:
-            del comment_connector.channel_mappings[repo_name]
-            comment_connector.storage.save_data()
-            await interaction.response.send_message(f"✅ リポジトリ `{repo_name}` の紐づけを解除しました")
+        if comment_connector.unlink_channel(repo_name):
+            await interactive(interaction.response.send_message, f"✅ リポジトリ `{repo_name}` の紐づけを解除しました")
         else:
-            await interaction.response.send_message(f"❌ リポジトリ `{repo_name}` は紐づけされていません")
+            await interactive(interaction.response.send_message, f"❌ リポジトリ `{repo_name}` は紐づけされていません")
     
     # ユーザー紐づけ解除コマンド
     @tree.command(name="unlink_user", description="GitHubユーザーとDiscordユーザーの紐づけを解除")
     async def unlink_user(interaction: discord.Interaction, github_username: str):
-        if github_username in comment_connector.user_mappings:
-            del comment_connector.user_mappings[github_username]
-            comment_connector.storage.save_data()
-            await interaction.response.send_message(f"✅ GitHubユーザー `{github_username}` の紐づけを解除しました")
+        if comment_connector.unlink_user(github_username):
+            await interactive(interaction.response.send_message, f"✅ GitHubユーザー `{github_username}` の紐づけを解除しました")
         else:
-            await interaction.response.send_message(f"❌ GitHubユーザー `{github_username}` は紐づけされていません")
+            await interactive(interaction.response.send_message, f"❌ GitHubユーザー `{github_username}` は紐づけされていません")
+    
+    # デッドレター一覧コマンド
+    @tree.command(name="dlq_list", description="処理・送信に失敗した通知（デッドレター）の一覧を表示")
+    async def dlq_list(interaction: discord.Interaction):
+        # 権限チェック（管理者権限が必要）
+        if not interaction.user.guild_permissions.administrator:
+            await interactive(
+                interaction.response.send_message,
+                "❌ このコマンドを実行するには管理者権限が必要です。",
+                ephemeral=True
+            )
+            return
+        store = comment_connector.dead_letters.store
+        embed = discord.Embed(
+            title="Dead Letter Queue",
+            description=f"再試行待ち: {store.count(PENDING)}件 / 打ち切り: {store.count(EXHAUSTED)}件",
+            color=0xd73a49
+        )
+        for item in store.list(limit=10):
+            if item.status == PENDING:
+                state = f"再試行 <t:{int(item.next_attempt_at)}:R>"
+            else:
+                state = "打ち切り（/dlq_requeue で再投入）"
+            embed.add_field(
+                name=f"#{item.id} {item.kind}（{item.attempts}回失敗）",
+                value=f"{describe_dead_letter(item)}\n{state}\n`{(item.error or '')[:200]}`",
+                inline=False
+            )
+        await interactive(interaction.response.send_message, embed=embed)
+    
+    # デッドレター再投入コマンド
+    @tree.command(name="dlq_requeue", description="デッドレターをすぐに再試行（IDを省略した場合は打ち切ったものをすべて）")
+    async def dlq_requeue(interaction: discord.Interaction, item_id: Optional[int] = None):
+        # 権限チェック（管理者権限が必要）
+        if not interaction.user.guild_permissions.administrator:
+            await interactive(
+                interaction.response.send_message,
+                "❌ このコマンドを実行するには管理者権限が必要です。",
+                ephemeral=True
+            )
+            return
+        count = comment_connector.dead_letters.requeue(item_id)
+        if count:
+            await interactive(interaction.response.send_message, f"✅ {count}件のデッドレターを再投入しました")
+        elif item_id is not None:
+            await interactive(interaction.response.send_message, f"❌ デッドレター #{item_id} は見つかりません")
+        else:
+            await interactive(interaction.response.send_message, "再投入するデッドレターはありません")
     
     logger.info("Comment Connector module setup completed")
+
+async def teardown():
+    """Comment Connectorモジュールの終了処理"""
+    if comment_connector:
+        await comment_connector.shutdown()
@@ -0,0 +1,321 @@
+"""
+送信に失敗した通知のデッドレターキュー
+
+処理中に例外が発生したWebHookイベント（event）と、まとめて送信できなかった
+スレッドへの通知（embeds）をSQLiteに保存し、ジッター付きの指数バックオフで再試行する。
+再試行の上限に達したもの・再試行しても成功しない失敗（スレッドの削除など）は
+exhausted として残し、スラッシュコマンドから確認・再投入できる。
+"""
+
+import asyncio
+import json
+import logging
+import random
+import sqlite3
+import time
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple, Type
+
+from common.metrics import get_registry
+
+logger = logging.getLogger(__name__)
+
+_metrics = get_registry()
+DEAD_LETTERS = _metrics.gauge('kurono_dead_letters', 'Notifications in the dead-letter queue', ['status'])
+DEAD_LETTER_RETRIES = _metrics.counter(
+    'kurono_dead_letter_retries_total', 'Dead-letter retry attempts by outcome', ['kind', 'outcome']
+)
+
+PENDING = 'pending'
+EXHAUSTED = 'exhausted'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS dead_letters (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL,
+    next_attempt_at REAL NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_dead_letters_due ON dead_letters (status, next_attempt_at);
+"""
+
+
+class DeadLetter(NamedTuple):
+    id: int
+    kind: str
+    payload: Dict[str, Any]
+    error: Optional[str]
+    attempts: int
+    status: str
+    next_attempt_at: float
+    created_at: float
+
+    @classmethod
+    def from_row(cls, row: Tuple) -> "DeadLetter":
+        item_id, kind, payload, error, attempts, status, next_attempt_at, created_at = row
+        return cls(item_id, kind, json.loads(payload), error, attempts, status, next_attempt_at, created_at)
+
+
+_COLUMNS = "id, kind, payload, error, attempts, status, next_attempt_at, created_at"
+
+
+def describe_dead_letter(item: DeadLetter) -> str:
+    """デッドレターの内容を1行で表す（/dlq_list の表示用）"""
+    if item.kind == 'event':
+        payload = item.payload
+        action = payload['payload'].get('action')
+        event = f"{payload['event_type']}.{action}" if action else payload['event_type']
+        return f"{event} (delivery: {payload['delivery_id']})"
+    if item.kind == 'embeds':
+        return f"<#{item.payload['thread_id']}> への通知 {len(item.payload['embeds'])}件"
+    return item.kind
+
+
+def backoff_delay(attempts: int, base: float, cap: float, rng: random.Random = random) -> float:
+    """
+    再試行までの待ち時間（フルジッター付きの指数バックオフ）
+
+    Args:
+        attempts: これまでの試行回数（1以上）
+        base: 1回目の失敗後の待ち時間の上限（秒）
+        cap: 待ち時間の上限（秒）
+
+    Returns:
+        float: 0 から min(cap, base * 2^(attempts-1)) までのランダムな秒数
+    """
+    return rng.uniform(0, min(cap, base * 2 ** max(0, attempts - 1)))
+
+
+class DeadLetterStore:
+    """デッドレターを保持するSQLiteストア"""
+
+    def __init__(self, storage_file: str = "comment_connector_dlq.db"):
+        self.storage_file = storage_file
+        self.conn = sqlite3.connect(storage_file)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def __len__(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM dead_letters").fetchone()[0]
+
+    def count(self, status: str) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM dead_letters WHERE status = ?", (status,)).fetchone()[0]
+
+    def add(self, kind: str, payload: Dict[str, Any], error: str, next_attempt_at: float,
+            status: str = PENDING) -> int:
+        now = time.time()
+        with self.conn:
+            cursor = self.conn.execute(
+                "INSERT INTO dead_letters (kind, payload, error, attempts, status, next_attempt_at, created_at, updated_at) "
+                "VALUES (?, ?, ?, 1, ?, ?, ?, ?)",
+                (kind, json.dumps(payload, ensure_ascii=False), error, status, next_attempt_at, now, now)
+            )
+        return cursor.lastrowid
+
+    def get(self, item_id: int) -> Optional[DeadLetter]:
+        row = self.conn.execute(f"SELECT {_COLUMNS} FROM dead_letters WHERE id = ?", (item_id,)).fetchone()
+        return DeadLetter.from_row(row) if row else None
+
+    def due(self, now: float, limit: int = 50) -> List[DeadLetter]:
+        """再試行の時刻を過ぎたデッドレター（古い順）"""
+        rows = self.conn.execute(
+            f"SELECT {_COLUMNS} FROM dead_letters WHERE status = ? AND next_attempt_at <= ? "
+            "ORDER BY next_attempt_at LIMIT ?", (PENDING, now, limit)
+        ).fetchall()
+        return [DeadLetter.from_row(row) for row in rows]
+
+    def next_due_at(self) -> Optional[float]:
+        row = self.conn.execute(
+            "SELECT MIN(next_attempt_at) FROM dead_letters WHERE status = ?", (PENDING,)
+        ).fetchone()
+        return row[0]
+
+    def list(self, status: Optional[str] = None, limit: int = 20) -> List[DeadLetter]:
+        """デッドレターの一覧（新しい順）"""
+        if status is None:
+            rows = self.conn.execute(
+                f"SELECT {_COLUMNS} FROM dead_letters ORDER BY id DESC LIMIT ?", (limit,)
+            ).fetchall()
+        else:
+            rows = self.conn.execute(
+                f"SELECT {_COLUMNS} FROM dead_letters WHERE status = ? ORDER BY id DESC LIMIT ?", (status, limit)
+            ).fetchall()
+        return [DeadLetter.from_row(row) for row in rows]
+
+    def update(self, item_id: int, status: str, attempts: int, error: Optional[str], next_attempt_at: float,
+               payload: Optional[Dict[str, Any]] = None):
+        with self.conn:
+            self.conn.execute(
+                "UPDATE dead_letters SET status = ?, attempts = ?, error = ?, next_attempt_at = ?, updated_at = ? "
+                "WHERE id = ?", (status, attempts, error, next_attempt_at, time.time(), item_id)
+            )
+            if payload is not None:
+                self.conn.execute(
+                    "UPDATE dead_letters SET payload = ? WHERE id = ?",
+                    (json.dumps(payload, ensure_ascii=False), item_id)
+                )
+
+    def requeue(self, item_id: Optional[int] = None) -> int:
+        """デッドレターをすぐに再試行する状態に戻す（IDを省略した場合はexhaustedをすべて）。戻した件数を返す"""
+        now = time.time()
+        with self.conn:
+            if item_id is None:
+                cursor = self.conn.execute(
+                    "UPDATE dead_letters SET status = ?, attempts = 0, next_attempt_at = ?, updated_at = ? "
+                    "WHERE status = ?", (PENDING, now, now, EXHAUSTED)
+                )
+            else:
+                cursor = self.conn.execute(
+                    "UPDATE dead_letters SET status = ?, attempts = 0, next_attempt_at = ?, updated_at = ? "
+                    "WHERE id = ?", (PENDING, now, now, item_id)
+                )
+        return cursor.rowcount
+
+    def remove(self, item_id: int):
+        with self.conn:
+            self.conn.execute("DELETE FROM dead_letters WHERE id = ?", (item_id,))
+
+    def close(self):
+        self.conn.close()
+
+
+# デッドレターを再試行する関数（kindごとに登録する）
+RetryHandler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+class DeadLetterQueue:
+    """デッドレターの保存と、バックグラウンドでの再試行"""
+
+    def __init__(self, store: DeadLetterStore, base_delay: float = 5, max_delay: float = 900,
+                 max_attempts: int = 8, permanent_errors: Tuple[Type[BaseException], ...] = ()):
+        self.store = store
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_attempts = max_attempts
+        # 再試行しても成功しない例外（発生した時点でexhaustedにする）
+        self.permanent_errors = permanent_errors
+        self.handlers: Dict[str, RetryHandler] = {}
+        self.task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self.stats = {'added': 0, 'retried': 0, 'recovered': 0, 'exhausted': 0}
+
+    def register(self, kind: str, handler: RetryHandler):
+        """kindのデッドレターを再試行する関数を登録"""
+        self.handlers[kind] = handler
+
+    def register_metrics(self):
+        DEAD_LETTERS.set_function(lambda: self.store.count(PENDING), status=PENDING)
+        DEAD_LETTERS.set_function(lambda: self.store.count(EXHAUSTED), status=EXHAUSTED)
+
+    def add(self, kind: str, payload: Dict[str, Any], error: BaseException) -> int:
+        """
+        失敗した処理をデッドレターとして保存
+
+        Args:
+            kind: 処理の種類（event / embeds）
+            payload: 再試行に必要なJSONに変換できるデータ（再試行で更新した内容は失敗時に保存される）
+            error: 失敗の原因となった例外
+
+        Returns:
+            int: デッドレターのID
+        """
+        message = f"{type(error).__name__}: {error}"
+        if isinstance(error, self.permanent_errors):
+            item_id = self.store.add(kind, payload, message, time.time(), status=EXHAUSTED)
+            self.stats['exhausted'] += 1
+        else:
+            item_id = self.store.add(kind, payload, message, time.time() + self.delay(1))
+            self._notify()
+        self.stats['added'] += 1
+        logger.warning(f"Dead-lettered {kind} #{item_id}: {message}")
+        return item_id
+
+    def requeue(self, item_id: Optional[int] = None) -> int:
+        """デッドレターを再投入（IDを省略した場合はexhaustedをすべて）"""
+        count = self.store.requeue(item_id)
+        if count:
+            self._notify()
+        return count
+
+    def delay(self, attempts: int) -> float:
+        return backoff_delay(attempts, self.base_delay, self.max_delay)
+
+    def start(self):
+        """再試行ループを起動"""
+        if self.task is None:
+            self._wake = asyncio.Event()
+            self.task = asyncio.create_task(self._run(), name="dead-letter-retry")
+
+    async def stop(self):
+        if self.task is None:
+            return
+        self.task.cancel()
+        await asyncio.gather(self.task, return_exceptions=True)
+        self.task = None
+
+    def _notify(self):
+        if self._wake is not None:
+            self._wake.set()
+
+    async def _run(self):
+        while True:
+            try:
+                await self.retry_due()
+            except Exception as e:
+                logger.error(f"Error retrying dead letters: {e}", exc_info=True)
+            next_due_at = self.store.next_due_at()
+            timeout = None if next_due_at is None else max(0.0, next_due_at - time.time())
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def retry_due(self) -> int:
+        """再試行の時刻を過ぎたデッドレターを再試行し、成功した件数を返す"""
+        recovered = 0
+        for item in self.store.due(time.time()):
+            if await self.retry(item):
+                recovered += 1
+        return recovered
+
+    async def retry(self, item: DeadLetter) -> bool:
+        """デッドレターを1件再試行（成功した場合は削除する）"""
+        handler = self.handlers.get(item.kind)
+        if handler is None:
+            logger.error(f"No retry handler for dead letter kind: {item.kind}")
+            self.store.update(item.id, EXHAUSTED, item.attempts, f"Unknown kind: {item.kind}", item.next_attempt_at)
+            return False
+
+        self.stats['retried'] += 1
+        attempts = item.attempts + 1
+        try:
+            await handler(item.payload)
+        except Exception as e:
+            message = f"{type(e).__name__}: {e}"
+            # ハンドラがpayloadに記録した完了済みの処理を保存し、次の再試行で繰り返さない
+            if isinstance(e, self.permanent_errors) or attempts >= self.max_attempts:
+                self.store.update(item.id, EXHAUSTED, attempts, message, time.time(), payload=item.payload)
+                self.stats['exhausted'] += 1
+                DEAD_LETTER_RETRIES.inc(kind=item.kind, outcome='exhausted')
+                logger.error(f"Giving up on dead letter #{item.id} ({item.kind}) after {attempts} attempts: {message}")
+            else:
+                delay = self.delay(attempts)
+                self.store.update(item.id, PENDING, attempts, message, time.time() + delay, payload=item.payload)
+                DEAD_LETTER_RETRIES.inc(kind=item.kind, outcome='failed')
+                logger.warning(f"Retry of dead letter #{item.id} ({item.kind}) failed, next in {delay:.1f}s: {message}")
+            return False
+
+        self.store.remove(item.id)
+        self.stats['recovered'] += 1
+        DEAD_LETTER_RETRIES.inc(kind=item.kind, outcome='recovered')
+        logger.info(f"Recovered dead letter #{item.id} ({item.kind}) after {attempts} attempts")
+        return True
+
+    def close(self):
+        self.store.close()
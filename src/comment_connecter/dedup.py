@@ -0,0 +1,137 @@
+"""
+GitHub WebHookの再送（X-GitHub-Delivery）重複排除キャッシュ
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from common.files import atomic_write_json
+from .utils import STORAGE_FLUSH_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+class DeliveryCache:
+    """
+    処理済みのDelivery IDを保持するTTL+FIFOキャッシュ（再起動後も保持）
+
+    TTLは受信時刻から数えるため、参照しても順序は変えず、上限を超えた場合は受信の古い順に削除する。
+    受け付けた配信は処理が終わるまでメモリ上で処理中として扱い、処理の完了（complete）で
+    処理済みとして保存する。処理前に停止した配信は再起動後に再送・リプレイで受け付けられる。
+    完了も破棄もされなかった処理中の配信は、in_flight_ttl秒後またはmax_size件を超えた時点で古い順に忘れる。
+    """
+
+    def __init__(self, storage_file: Optional[str] = "webhook_deliveries.json",
+                 max_size: int = 10000, ttl: float = 259200, in_flight_ttl: float = 3600):
+        self.storage_file = storage_file
+        self.max_size = max_size
+        self.ttl = ttl
+        self.in_flight_ttl = in_flight_ttl
+        # delivery_id -> 受信時刻（古い順）
+        self.entries: "OrderedDict[str, float]" = OrderedDict()
+        # 処理中のdelivery_id -> 受信時刻（古い順、保存しない）
+        self.in_flight: "OrderedDict[str, float]" = OrderedDict()
+        self.dirty = False
+        self.load()
+
+    def __len__(self) -> int:
+        return len(self.entries) + len(self.in_flight)
+
+    def __contains__(self, delivery_id: str) -> bool:
+        now = time.time()
+        started_at = self.in_flight.get(delivery_id)
+        if started_at is not None and now - started_at < self.in_flight_ttl:
+            return True
+        received_at = self.entries.get(delivery_id)
+        return received_at is not None and now - received_at < self.ttl
+
+    def add_if_new(self, delivery_id: str) -> bool:
+        """処理済み・処理中でないDelivery IDであれば処理中として記録してTrueを返す。重複の場合はFalse"""
+        if delivery_id in self:
+            return False
+        now = time.time()
+        self.in_flight[delivery_id] = now
+        self.in_flight.move_to_end(delivery_id)
+        self._evict_in_flight(now)
+        return True
+
+    def complete(self, delivery_id: str):
+        """処理中のDelivery IDを処理済みとして記録（次回の保存でファイルに書き込む）"""
+        received_at = self.in_flight.pop(delivery_id, None)
+        now = time.time()
+        self.entries[delivery_id] = received_at if received_at is not None else now
+        self.entries.move_to_end(delivery_id)
+        self._evict(now)
+        self.dirty = True
+
+    def discard(self, delivery_id: str):
+        """Delivery IDを削除（受け付けられなかったイベントを再送可能にする）"""
+        self.in_flight.pop(delivery_id, None)
+        if self.entries.pop(delivery_id, None) is not None:
+            self.dirty = True
+
+    def _evict(self, now: float):
+        """期限切れと上限超過のエントリを古い順に削除"""
+        while self.entries:
+            oldest_id, received_at = next(iter(self.entries.items()))
+            if len(self.entries) <= self.max_size and now - received_at < self.ttl:
+                break
+            del self.entries[oldest_id]
+
+    def _evict_in_flight(self, now: float):
+        """完了も破棄もされずに残った処理中のエントリを古い順に削除"""
+        while self.in_flight:
+            oldest_id, started_at = next(iter(self.in_flight.items()))
+            if len(self.in_flight) <= self.max_size and now - started_at < self.in_flight_ttl:
+                break
+            del self.in_flight[oldest_id]
+            logger.warning(f"Dropped stale in-flight delivery {oldest_id}")
+
+    def load(self):
+        """ファイルからキャッシュを読み込み"""
+        if not self.storage_file or not os.path.exists(self.storage_file):
+            return
+        try:
+            with open(self.storage_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            for delivery_id, received_at in sorted(data.items(), key=lambda item: item[1]):
+                self.entries[delivery_id] = received_at
+            self._evict(time.time())
+            logger.info(f"Loaded {len(self.entries)} delivery IDs from {self.storage_file}")
+        except Exception as e:
+            logger.error(f"Error loading delivery cache from {self.storage_file}: {e}")
+
+    def save(self):
+        """キャッシュをファイルに保存"""
+        if not self.storage_file or not self.dirty:
+            return
+        started_at = time.monotonic()
+        try:
+            atomic_write_json(self.storage_file, dict(self.entries))
+            self.dirty = False
+        except Exception as e:
+            logger.error(f"Error saving delivery cache to {self.storage_file}: {e}")
+        finally:
+            STORAGE_FLUSH_SECONDS.observe(time.monotonic() - started_at, store='deliveries')
+
+    async def autosave(self, interval: float = 30.0):
+        """一定間隔で変更をファイルに保存（書き込みはイベントループ外で行う）"""
+        while True:
+            await asyncio.sleep(interval)
+            if not self.storage_file or not self.dirty:
+                continue
+            snapshot = dict(self.entries)
+            self.dirty = False
+            started_at = time.monotonic()
+            try:
+                await asyncio.to_thread(atomic_write_json, self.storage_file, snapshot)
+            except Exception as e:
+                self.dirty = True
+                logger.error(f"Error saving delivery cache to {self.storage_file}: {e}")
+            finally:
+                STORAGE_FLUSH_SECONDS.observe(time.monotonic() - started_at, store='deliveries')
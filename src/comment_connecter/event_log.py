@@ -0,0 +1,280 @@
+"""
+受信したWebHookイベントのセグメント分割ログ
+
+重複排除を通過したWebHookのペイロードを、連番のオフセット付きでJSONLのセグメントに追記する。
+セグメントが一定サイズを超えると新しいセグメントに切り替え、閉じたセグメントはgzipで圧縮して
+インデックス（オフセットと受信時刻の範囲）に登録する。古いセグメントは合計サイズと経過日数で削除する。
+
+ボットの停止中やDiscordの障害で失われた通知は、scripts/replay_events.py で
+オフセットまたは時刻の範囲を指定してWebHookサーバーに再送できる。
+"""
+
+import glob
+import gzip
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, IO, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 再送されたイベントに付けるヘッダー（ログに二重に記録しない）
+REPLAY_HEADER = 'X-Kurono-Replay'
+
+INDEX_FILE = 'index.json'
+SEGMENT_PREFIX = 'events-'
+
+
+def segment_name(first_offset: int) -> str:
+    return f"{SEGMENT_PREFIX}{first_offset:012d}.jsonl"
+
+
+def segment_first_offset(path: str) -> int:
+    name = os.path.basename(path)
+    return int(name[len(SEGMENT_PREFIX):].split('.', 1)[0])
+
+
+def load_index(directory: str) -> List[Dict[str, Any]]:
+    """閉じたセグメントのインデックス（オフセット順）を読み込む"""
+    try:
+        with open(os.path.join(directory, INDEX_FILE), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return []
+
+
+def _read_lines(path: str) -> Iterator[Dict[str, Any]]:
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                # 書き込み途中で停止した場合の不完全な最終行
+                logger.warning(f"Skipping truncated record in {path}")
+
+
+def read_events(directory: str, from_offset: Optional[int] = None, to_offset: Optional[int] = None,
+                since: Optional[float] = None, until: Optional[float] = None) -> Iterator[Dict[str, Any]]:
+    """
+    ログからイベントをオフセット順に読み込む
+
+    インデックスの範囲で対象外のセグメントは読み込まない。
+
+    Args:
+        directory: ログのディレクトリ
+        from_offset, to_offset: 読み込むオフセットの範囲（両端を含む）
+        since, until: 読み込む受信時刻（UNIX時刻）の範囲（両端を含む）
+
+    Returns:
+        Iterator: オフセット・受信時刻・イベントの種類・配信ID・ペイロードを含むレコード
+    """
+    index = {entry['file']: entry for entry in load_index(directory)}
+    segments: Dict[int, str] = {}
+    for path in glob.glob(os.path.join(directory, f"{SEGMENT_PREFIX}*.jsonl*")):
+        if path.endswith('.tmp'):
+            continue
+        first_offset = segment_first_offset(path)
+        # 圧縮中のセグメントは圧縮前のファイルを読む
+        if first_offset not in segments or not path.endswith('.gz'):
+            segments[first_offset] = path
+
+    for first_offset in sorted(segments):
+        path = segments[first_offset]
+        entry = index.get(segment_name(first_offset))
+        if entry is not None:
+            if (from_offset is not None and entry['last_offset'] < from_offset) or \
+                    (since is not None and entry['last_time'] < since):
+                continue
+            if (to_offset is not None and entry['first_offset'] > to_offset) or \
+                    (until is not None and entry['first_time'] > until):
+                break
+        elif to_offset is not None and first_offset > to_offset:
+            break
+        if not os.path.exists(path) and os.path.exists(f"{path}.gz"):
+            # 一覧の取得後に圧縮されたセグメント
+            path = f"{path}.gz"
+        try:
+            for record in _read_lines(path):
+                offset, received_at = record['offset'], record['received_at']
+                if from_offset is not None and offset < from_offset:
+                    continue
+                if to_offset is not None and offset > to_offset:
+                    return
+                if since is not None and received_at < since:
+                    continue
+                if until is not None and received_at > until:
+                    continue
+                yield record
+        except FileNotFoundError:
+            # 保持期間を過ぎて削除されたセグメント
+            logger.warning(f"Segment disappeared while reading: {path}")
+
+
+class EventLog:
+    """WebHookイベントを追記するセグメント分割ログ"""
+
+    def __init__(self, directory: str = "webhook_events", segment_bytes: int = 16 * 1024 * 1024,
+                 max_bytes: int = 512 * 1024 * 1024, max_age_days: float = 14,
+                 clock: Callable[[], float] = time.time):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        self.max_age = max_age_days * 86400
+        # 受信時刻と保持期間の判定に使う時計（圧縮用のスレッドからも呼ばれる）
+        self.clock = clock
+        os.makedirs(directory, exist_ok=True)
+        # 圧縮・インデックスの更新・古いセグメントの削除は1つのスレッドで順に行う
+        self._sealer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="event-log")
+        self._lock = threading.Lock()
+        self._file: Optional[IO[str]] = None
+        self._segment: Optional[Dict[str, Any]] = None
+        self.next_offset = 0
+        self._recover()
+
+    def _recover(self):
+        """前回の書き込み中のセグメントを引き継ぎ、圧縮されていないセグメントを圧縮する"""
+        index = load_index(self.directory)
+        if index:
+            self.next_offset = index[-1]['last_offset'] + 1
+        open_segments = sorted(glob.glob(os.path.join(self.directory, f"{SEGMENT_PREFIX}*.jsonl")),
+                               key=segment_first_offset)
+        for path in open_segments:
+            segment = self._scan(path)
+            if segment is None:
+                os.remove(path)
+                continue
+            self.next_offset = max(self.next_offset, segment['last_offset'] + 1)
+            if path == open_segments[-1] and segment['bytes'] < self.segment_bytes:
+                self._segment = segment
+                self._file = open(path, 'a', encoding='utf-8')
+                if not self._ends_with_newline(path):
+                    # 不完全な最終行の後ろに続けて書き込まない
+                    self._file.write('\n')
+            else:
+                self._sealer.submit(self._seal, segment)
+        self._sealer.submit(self._update_index)
+
+    @staticmethod
+    def _ends_with_newline(path: str) -> bool:
+        with open(path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b'\n'
+
+    def _scan(self, path: str) -> Optional[Dict[str, Any]]:
+        records = list(_read_lines(path))
+        if not records:
+            return None
+        return {
+            'file': os.path.basename(path),
+            'first_offset': records[0]['offset'],
+            'last_offset': records[-1]['offset'],
+            'first_time': records[0]['received_at'],
+            'last_time': records[-1]['received_at'],
+            'bytes': os.path.getsize(path),
+        }
+
+    def append(self, event_type: str, delivery_id: str, payload: Dict[str, Any]) -> int:
+        """
+        イベントをログに追記
+
+        Returns:
+            int: 追記したイベントのオフセット
+        """
+        received_at = self.clock()
+        with self._lock:
+            offset = self.next_offset
+            line = json.dumps({
+                'offset': offset,
+                'received_at': received_at,
+                'event': event_type,
+                'delivery_id': delivery_id,
+                'payload': payload
+            }, ensure_ascii=False, separators=(',', ':')) + '\n'
+            if self._file is None:
+                self._open_segment(offset, received_at)
+            self._file.write(line)
+            self._file.flush()
+            self.next_offset += 1
+            segment = self._segment
+            segment['last_offset'] = offset
+            segment['last_time'] = received_at
+            segment['bytes'] += len(line.encode('utf-8'))
+            if segment['bytes'] >= self.segment_bytes:
+                self._roll()
+        return offset
+
+    def _open_segment(self, first_offset: int, received_at: float):
+        name = segment_name(first_offset)
+        self._file = open(os.path.join(self.directory, name), 'a', encoding='utf-8')
+        self._segment = {
+            'file': name, 'first_offset': first_offset, 'last_offset': first_offset,
+            'first_time': received_at, 'last_time': received_at, 'bytes': 0
+        }
+
+    def _roll(self):
+        """書き込み中のセグメントを閉じ、圧縮を別スレッドで行う（次の追記で新しいセグメントを作成）"""
+        self._file.close()
+        self._sealer.submit(self._seal, self._segment)
+        self._file = None
+        self._segment = None
+
+    def _seal(self, segment: Dict[str, Any]):
+        path = os.path.join(self.directory, segment['file'])
+        try:
+            tmp_path = f"{path}.gz.tmp"
+            with open(path, 'rb') as src, gzip.open(tmp_path, 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+            os.replace(tmp_path, f"{path}.gz")
+            os.remove(path)
+
+            self._update_index({**segment, 'bytes': os.path.getsize(f"{path}.gz")})
+        except Exception as e:
+            logger.error(f"Failed to seal event log segment {segment['file']}: {e}", exc_info=True)
+
+    def _update_index(self, sealed: Optional[Dict[str, Any]] = None):
+        """圧縮したセグメントをインデックスに追加し、保持期間を過ぎたセグメントを削除"""
+        index = load_index(self.directory)
+        if sealed is not None:
+            index = [entry for entry in index if entry['file'] != sealed['file']]
+            index.append(sealed)
+            index.sort(key=lambda entry: entry['first_offset'])
+        self._write_index(self._apply_retention(index))
+
+    def _apply_retention(self, index: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """合計サイズと経過日数の上限を超えた古いセグメントを削除"""
+        cutoff = self.clock() - self.max_age
+        total = sum(entry['bytes'] for entry in index)
+        while index and (total > self.max_bytes or index[0]['last_time'] < cutoff):
+            entry = index.pop(0)
+            total -= entry['bytes']
+            try:
+                os.remove(os.path.join(self.directory, entry['file'] + '.gz'))
+            except FileNotFoundError:
+                pass
+            logger.info(f"Removed event log segment {entry['file']} (offsets {entry['first_offset']}-{entry['last_offset']})")
+        return index
+
+    def _write_index(self, index: List[Dict[str, Any]]):
+        path = os.path.join(self.directory, INDEX_FILE)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, path)
+
+    def flush(self):
+        """それまでに閉じたセグメントの圧縮とインデックスの更新の完了を待つ"""
+        self._sealer.submit(lambda: None).result()
+
+    def close(self):
+        """書き込み中のセグメントを閉じ、圧縮の完了を待つ（書き込み中のセグメントは次回の起動時に引き継ぐ）"""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+                self._segment = None
+        self._sealer.shutdown(wait=True)
@@ -0,0 +1,98 @@
+"""
+キーごとに直列、キー間では並列に処理を実行するエグゼキューター
+
+同じissue/PRのイベント（作成・レビュー・コメントなど）を受信順に処理し、
+異なるissue/PRのイベントは並列に処理するために使用する。
+"""
+
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+Job = Tuple[Callable[..., Awaitable[Any]], Tuple[Any, ...], asyncio.Future]
+
+
+class KeyedExecutor:
+    """キーごとのFIFOキューで処理を直列化（アイドルになったキューは破棄する）"""
+
+    def __init__(self):
+        self.queues: Dict[Hashable, Deque[Job]] = {}
+        self.runners: Dict[Hashable, asyncio.Task] = {}
+
+    def __len__(self) -> int:
+        """処理中・待機中の処理があるキーの数"""
+        return len(self.queues)
+
+    @property
+    def pending(self) -> int:
+        """待機中の処理の数（実行中を除く）"""
+        return sum(len(queue) for queue in self.queues.values())
+
+    def submit(self, key: Hashable, func: Callable[..., Awaitable[Any]], *args) -> asyncio.Future:
+        """
+        処理をキーのキューに追加
+
+        呼び出し順がそのまま実行順になるよう、このメソッドはawaitせずに追加する。
+
+        Args:
+            key: 直列化の単位となるキー
+            func: 実行するコルーチン関数
+            *args: funcに渡す引数
+
+        Returns:
+            asyncio.Future: 処理の結果（例外）が設定されるFuture
+        """
+        future = asyncio.get_running_loop().create_future()
+        queue = self.queues.get(key)
+        if queue is None:
+            queue = self.queues[key] = deque()
+            self.runners[key] = asyncio.create_task(self._drain(key, queue))
+        queue.append((func, args, future))
+        return future
+
+    async def _drain(self, key: Hashable, queue: Deque[Job]):
+        future = None
+        try:
+            while queue:
+                func, args, future = queue.popleft()
+                if future.cancelled():
+                    continue
+                try:
+                    result = await func(*args)
+                except Exception as e:
+                    if not future.cancelled():
+                        future.set_exception(e)
+                else:
+                    if not future.cancelled():
+                        future.set_result(result)
+        finally:
+            # ランナーがキャンセルされた場合（停止時・ループの終了時）も、結果を待つ呼び出し元が止まらないよう
+            # 実行中と待機中の処理のFutureに例外を設定する
+            futures = [pending for _, _, pending in queue]
+            if future is not None:
+                futures.insert(0, future)
+            for pending in futures:
+                if not pending.done():
+                    pending.set_exception(RuntimeError(f"Keyed executor for {key!r} was cancelled"))
+            queue.clear()
+            # キューが空になった時点で（awaitを挟まずに）破棄し、メモリを解放する
+            del self.queues[key]
+            del self.runners[key]
+
+    async def join(self, timeout: Optional[float] = None):
+        """すべてのキーの処理が完了するまで待機（timeout秒を過ぎた場合は残りの処理をキャンセル）"""
+        try:
+            await asyncio.wait_for(self._join(), timeout)
+        except asyncio.TimeoutError:
+            runners = list(self.runners.values())
+            logger.warning(f"Keyed executor did not finish within {timeout}s, cancelling {len(runners)} keys")
+            for runner in runners:
+                runner.cancel()
+            await asyncio.gather(*runners, return_exceptions=True)
+
+    async def _join(self):
+        while self.runners:
+            await asyncio.gather(*self.runners.values(), return_exceptions=True)
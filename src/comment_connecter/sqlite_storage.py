@@ -0,0 +1,221 @@
+"""
+SQLite（WALモード）を使った設定データの永続化
+"""
+
+import json
+import os
+import sqlite3
+import logging
+import time
+from typing import Dict, List, Optional
+
+from .utils import STORAGE_FLUSH_SECONDS
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS user_mappings (
+    github_username TEXT PRIMARY KEY,
+    discord_user_id TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_user_mappings_discord_user_id ON user_mappings (discord_user_id);
+
+CREATE TABLE IF NOT EXISTS channel_mappings (
+    repo_name TEXT PRIMARY KEY,
+    channel_id INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_channel_mappings_channel_id ON channel_mappings (channel_id);
+
+CREATE TABLE IF NOT EXISTS thread_mappings (
+    github_url TEXT PRIMARY KEY,
+    thread_id INTEGER NOT NULL
+);
+-- スレッドIDからの逆引きはThreadRegistryがメモリ上で行うため、インデックスは作らない
+DROP INDEX IF EXISTS idx_thread_mappings_thread_id;
+
+CREATE TABLE IF NOT EXISTS thread_activity (
+    github_url TEXT PRIMARY KEY,
+    last_activity REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+class SQLiteStorage:
+    """PersistentStorageと同じAPIを持つSQLiteバックエンド（1行単位で書き込み）"""
+
+    def __init__(self, storage_file: str = "comment_connector_data.db", json_file: Optional[str] = None):
+        self.storage_file = storage_file
+        self.conn = sqlite3.connect(storage_file)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+        # 既存のJSONファイルがあれば初回のみ移行
+        if json_file and os.path.exists(json_file) and not self.get_meta("json_migrated_from"):
+            migrate_json_to_sqlite(json_file, self)
+
+    def _execute(self, sql: str, params: tuple = ()):
+        started_at = time.monotonic()
+        try:
+            with self.conn:
+                return self.conn.execute(sql, params)
+        finally:
+            STORAGE_FLUSH_SECONDS.observe(time.monotonic() - started_at, store='mappings')
+
+    def _fetch_dict(self, sql: str) -> Dict:
+        return dict(self.conn.execute(sql).fetchall())
+
+    def get_meta(self, key: str) -> Optional[str]:
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: str):
+        self._execute(
+            "INSERT INTO meta (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (key, value)
+        )
+
+    def save_data(self):
+        """互換用（書き込みは各操作で即時に反映される）"""
+        pass
+
+    def close(self):
+        """データベース接続を閉じる"""
+        self.conn.close()
+
+    def get_user_mappings(self) -> Dict[str, str]:
+        """ユーザー紐づけ情報を取得"""
+        return self._fetch_dict("SELECT github_username, discord_user_id FROM user_mappings")
+
+    def set_user_mapping(self, github_username: str, discord_user_id: str):
+        """ユーザー紐づけ情報を設定"""
+        self._execute(
+            "INSERT INTO user_mappings (github_username, discord_user_id) VALUES (?, ?) "
+            "ON CONFLICT(github_username) DO UPDATE SET discord_user_id = excluded.discord_user_id",
+            (github_username, discord_user_id)
+        )
+
+    def remove_user_mapping(self, github_username: str):
+        """ユーザー紐づけ情報を削除"""
+        self._execute("DELETE FROM user_mappings WHERE github_username = ?", (github_username,))
+
+    def get_channel_mappings(self) -> Dict[str, int]:
+        """チャンネル紐づけ情報を取得"""
+        return self._fetch_dict("SELECT repo_name, channel_id FROM channel_mappings")
+
+    def set_channel_mapping(self, repo_name: str, channel_id: int):
+        """チャンネル紐づけ情報を設定"""
+        self._execute(
+            "INSERT INTO channel_mappings (repo_name, channel_id) VALUES (?, ?) "
+            "ON CONFLICT(repo_name) DO UPDATE SET channel_id = excluded.channel_id",
+            (repo_name, channel_id)
+        )
+
+    def remove_channel_mapping(self, repo_name: str):
+        """チャンネル紐づけ情報を削除"""
+        self._execute("DELETE FROM channel_mappings WHERE repo_name = ?", (repo_name,))
+
+    def get_thread_mappings(self) -> Dict[str, int]:
+        """スレッド紐づけ情報を取得"""
+        return self._fetch_dict("SELECT github_url, thread_id FROM thread_mappings")
+
+    def set_thread_mapping(self, github_url: str, thread_id: int):
+        """スレッド紐づけ情報を設定"""
+        self._execute(
+            "INSERT INTO thread_mappings (github_url, thread_id) VALUES (?, ?) "
+            "ON CONFLICT(github_url) DO UPDATE SET thread_id = excluded.thread_id",
+            (github_url, thread_id)
+        )
+
+    def remove_thread_mapping(self, github_url: str):
+        """スレッド紐づけ情報を削除"""
+        self._execute("DELETE FROM thread_mappings WHERE github_url = ?", (github_url,))
+        self._execute("DELETE FROM thread_activity WHERE github_url = ?", (github_url,))
+
+    def remove_thread_mappings(self, github_urls: List[str]):
+        """複数のスレッド紐づけ情報を1つのトランザクションでまとめて削除"""
+        if not github_urls:
+            return
+        params = [(url,) for url in github_urls]
+        started_at = time.monotonic()
+        try:
+            with self.conn:
+                self.conn.executemany("DELETE FROM thread_mappings WHERE github_url = ?", params)
+                self.conn.executemany("DELETE FROM thread_activity WHERE github_url = ?", params)
+        finally:
+            STORAGE_FLUSH_SECONDS.observe(time.monotonic() - started_at, store='mappings')
+
+    def get_thread_activity(self) -> Dict[str, float]:
+        """スレッド紐づけの最終参照時刻を取得"""
+        return self._fetch_dict("SELECT github_url, last_activity FROM thread_activity")
+
+    def set_thread_activity(self, activity: Dict[str, float]):
+        """スレッド紐づけの最終参照時刻をまとめて設定"""
+        if not activity:
+            return
+        started_at = time.monotonic()
+        try:
+            with self.conn:
+                self.conn.executemany(
+                    "INSERT INTO thread_activity (github_url, last_activity) VALUES (?, ?) "
+                    "ON CONFLICT(github_url) DO UPDATE SET last_activity = excluded.last_activity",
+                    activity.items()
+                )
+        finally:
+            STORAGE_FLUSH_SECONDS.observe(time.monotonic() - started_at, store='mappings')
+
+
+def migrate_json_to_sqlite(json_file: str, storage: SQLiteStorage) -> Dict[str, int]:
+    """
+    PersistentStorageのJSONファイルをSQLiteに移行
+
+    Args:
+        json_file: 移行元のJSONファイル
+        storage: 移行先のSQLiteStorage
+
+    Returns:
+        dict: テーブルごとの移行件数
+    """
+    with open(json_file, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    user_mappings = data.get("user_mappings", {})
+    channel_mappings = data.get("channel_mappings", {})
+    thread_mappings = data.get("thread_mappings", {})
+    thread_activity = data.get("thread_activity", {})
+
+    with storage.conn:
+        storage.conn.executemany(
+            "INSERT OR REPLACE INTO user_mappings (github_username, discord_user_id) VALUES (?, ?)",
+            user_mappings.items()
+        )
+        storage.conn.executemany(
+            "INSERT OR REPLACE INTO channel_mappings (repo_name, channel_id) VALUES (?, ?)",
+            channel_mappings.items()
+        )
+        storage.conn.executemany(
+            "INSERT OR REPLACE INTO thread_mappings (github_url, thread_id) VALUES (?, ?)",
+            thread_mappings.items()
+        )
+        storage.conn.executemany(
+            "INSERT OR REPLACE INTO thread_activity (github_url, last_activity) VALUES (?, ?)",
+            thread_activity.items()
+        )
+        storage.conn.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES ('json_migrated_from', ?)",
+            (os.path.abspath(json_file),)
+        )
+
+    counts = {
+        "user_mappings": len(user_mappings),
+        "channel_mappings": len(channel_mappings),
+        "thread_mappings": len(thread_mappings)
+    }
+    logger.info(f"Migrated {json_file} to {storage.storage_file}: {counts}")
+    return counts
@@ -0,0 +1,993 @@
+"""
+comment_connecter モジュールのテスト
+"""
+
+import pytest
+import asyncio
+import json
+import time
+from datetime import datetime, timedelta, timezone
+from unittest.mock import Mock, AsyncMock, patch
+import discord
+from aiohttp.test_utils import make_mocked_request
+from src.comment_connecter.comment_connecter import CommentConnector
+from src.comment_connecter.work_queue import WebhookQueue
+from src.comment_connecter.dedup import DeliveryCache
+from src.comment_connecter.sqlite_storage import SQLiteStorage
+from src.comment_connecter.utils import PersistentStorage, BidirectionalMapping, ThreadKey
+from src.comment_connecter.thread_registry import ThreadRegistry, ColdThreadStore
+from src.comment_connecter.coalescer import NOTIFICATION_FRESHNESS, NotificationCoalescer, batch_embeds
+from src.comment_connecter.keyed_executor import KeyedExecutor
+from src.comment_connecter.event_log import EventLog, load_index, read_events
+from src.comment_connecter.dead_letter import EXHAUSTED, PENDING, DeadLetterQueue, DeadLetterStore, backoff_delay
+from common.tracing import Tracer
+
+
+def make_webhook_request(payload: bytes, event_type: str = 'issues', delivery_id: str = 'delivery-1', **headers):
+    """WebHookリクエストのモックを作成"""
+    request = make_mocked_request(
+        'POST', '/webhook/github',
+        headers={'X-GitHub-Event': event_type, 'X-GitHub-Delivery': delivery_id, 'Content-Type': 'application/json',
+                 **headers}
+    )
+    request.json = AsyncMock(side_effect=lambda: json.loads(payload))
+    return request
+
+
+class TestWebhookQueue:
+
+    @pytest.mark.asyncio
+    async def test_processes_events(self):
+        """キューに追加したイベントがワーカーで処理されることのテスト"""
+        handler = AsyncMock()
+        queue = WebhookQueue(handler, max_size=10, workers=2)
+        queue.start()
+
+        assert queue.submit('issues', 'd1', {'action': 'opened'})
+        await queue.stop()
+
+        handler.assert_awaited_once_with('issues', 'd1', {'action': 'opened'})
+        assert queue.stats['processed'] == 1
+
+    @pytest.mark.asyncio
+    async def test_rejects_when_full(self):
+        """キューが満杯の場合に拒否されることのテスト"""
+        blocker = asyncio.Event()
+
+        async def handler(*args):
+            await blocker.wait()
+
+        queue = WebhookQueue(handler, max_size=1, workers=1)
+        queue.start()
+        assert queue.submit('issues', 'd1', {})
+        await asyncio.sleep(0)  # ワーカーが1件目を取り出す
+        assert queue.submit('issues', 'd2', {})
+        assert not queue.submit('issues', 'd3', {})
+        assert queue.depth == 1
+        assert queue.stats['rejected'] == 1
+
+        blocker.set()
+        await queue.stop()
+
+
+class TestDeliveryCache:
+
+    def test_duplicate_delivery(self, tmp_path):
+        """同じDelivery IDが重複として扱われることのテスト"""
+        cache = DeliveryCache(str(tmp_path / "deliveries.json"))
+        assert cache.add_if_new('d1')
+        assert not cache.add_if_new('d1')
+        assert 'd1' in cache
+
+    def test_fifo_eviction(self, tmp_path):
+        """上限を超えたら受信の古いIDから削除されることのテスト"""
+        cache = DeliveryCache(str(tmp_path / "deliveries.json"), max_size=2)
+        for delivery_id in ['d1', 'd2', 'd3']:
+            cache.add_if_new(delivery_id)
+            cache.complete(delivery_id)
+        assert len(cache) == 2
+        assert 'd1' not in cache
+
+    def test_ttl_expiry(self, tmp_path):
+        """TTLを過ぎたIDは再度受け付けられることのテスト"""
+        cache = DeliveryCache(str(tmp_path / "deliveries.json"), ttl=60)
+        with patch('src.comment_connecter.dedup.time.time', return_value=1000.0):
+            cache.add_if_new('d1')
+            cache.complete('d1')
+        with patch('src.comment_connecter.dedup.time.time', return_value=1061.0):
+            assert cache.add_if_new('d1')
+
+    def test_persisted_across_restarts(self, tmp_path):
+        """保存したキャッシュが再読み込みされることのテスト"""
+        path = str(tmp_path / "deliveries.json")
+        cache = DeliveryCache(path)
+        cache.add_if_new('d1')
+        cache.complete('d1')
+        cache.save()
+
+        assert not DeliveryCache(path).add_if_new('d1')
+
+    def test_in_flight_not_persisted(self, tmp_path):
+        """処理中のIDは重複として扱われるが、処理が完了するまで保存されないことのテスト"""
+        path = str(tmp_path / "deliveries.json")
+        cache = DeliveryCache(path)
+        assert cache.add_if_new('d1')
+        assert not cache.add_if_new('d1')
+        cache.save()
+
+        # 処理前に停止した配信は再起動後に受け付けられる
+        assert DeliveryCache(path).add_if_new('d1')
+
+    def test_stale_in_flight_released(self, tmp_path):
+        """完了も破棄もされない処理中のIDが、期限と上限で削除されることのテスト"""
+        cache = DeliveryCache(str(tmp_path / "deliveries.json"), max_size=2, in_flight_ttl=60)
+        with patch('src.comment_connecter.dedup.time.time', return_value=1000.0):
+            cache.add_if_new('d1')
+        with patch('src.comment_connecter.dedup.time.time', return_value=1061.0):
+            assert cache.add_if_new('d1')
+            cache.add_if_new('d2')
+            cache.add_if_new('d3')
+            assert len(cache.in_flight) == 2
+            assert cache.add_if_new('d1')
+
+
+class TestBidirectionalMapping:
+
+    def test_reverse_lookup(self):
+        """逆引きが正引きと同期されることのテスト"""
+        mapping = BidirectionalMapping({"a": 1, "b": 2})
+        assert mapping.get_key(1) == "a"
+
+        mapping["a"] = 3
+        assert mapping.get_key(1) is None
+        assert mapping.get_key(3) == "a"
+
+        del mapping["b"]
+        assert mapping.get_key(2) is None
+        assert dict(mapping) == {"a": 3}
+
+    def test_shared_values(self):
+        """同じ値を持つキーが複数ある場合のテスト"""
+        mapping = BidirectionalMapping()
+        mapping["a"] = 1
+        mapping["b"] = 1
+        assert mapping.get_key(1) == "a"
+
+        del mapping["a"]
+        assert mapping.get_key(1) == "b"
+
+
+class TestPersistentStorage:
+
+    def test_coalesces_writes(self, tmp_path):
+        """複数の変更がまとめて書き込まれることのテスト"""
+        path = tmp_path / "data.json"
+        storage = PersistentStorage(str(path), flush_interval=60)
+        with patch('src.comment_connecter.utils.atomic_write_json') as write:
+            for i in range(100):
+                storage.set_thread_mapping(f"https://github.com/org/repo/issues/{i}", i)
+            write.assert_not_called()
+
+            storage.close()
+            write.assert_called_once()
+
+    def test_close_flushes(self, tmp_path):
+        """終了時に未保存の変更が書き込まれることのテスト"""
+        path = str(tmp_path / "data.json")
+        storage = PersistentStorage(path, flush_interval=60)
+        storage.set_user_mapping("github_user", "123")
+        storage.close()
+
+        assert PersistentStorage(path).get_user_mappings() == {"github_user": "123"}
+
+    def test_failed_write_keeps_file(self, tmp_path):
+        """書き込みに失敗しても既存のファイルが壊れないことのテスト"""
+        path = tmp_path / "data.json"
+        storage = PersistentStorage(str(path), flush_interval=0)
+        storage.set_user_mapping("github_user", "123")
+
+        with patch('src.comment_connecter.utils.json.dump', side_effect=RuntimeError("disk full")):
+            storage.set_user_mapping("other_user", "456")
+
+        assert PersistentStorage(str(path)).get_user_mappings() == {"github_user": "123"}
+        assert list(tmp_path.iterdir()) == [path]
+
+
+class TestSQLiteStorage:
+
+    @pytest.fixture
+    def storage(self, tmp_path):
+        """SQLiteStorageインスタンス"""
+        storage = SQLiteStorage(str(tmp_path / "data.db"))
+        yield storage
+        storage.close()
+
+    def test_mappings(self, storage):
+        """紐づけ情報の設定・取得・削除のテスト"""
+        storage.set_user_mapping("github_user", "123")
+        storage.set_user_mapping("github_user", "456")
+        storage.set_channel_mapping("test-repo", 111)
+        storage.set_thread_mapping("https://github.com/org/test-repo/issues/1", 222)
+
+        assert storage.get_user_mappings() == {"github_user": "456"}
+        assert storage.get_channel_mappings() == {"test-repo": 111}
+        assert storage.get_thread_mappings() == {"https://github.com/org/test-repo/issues/1": 222}
+
+        storage.remove_thread_mapping("https://github.com/org/test-repo/issues/1")
+        storage.remove_user_mapping("github_user")
+        assert storage.get_thread_mappings() == {}
+        assert storage.get_user_mappings() == {}
+
+    def test_migrate_from_json(self, tmp_path):
+        """JSONファイルからの初回移行のテスト"""
+        json_file = str(tmp_path / "data.json")
+        legacy = PersistentStorage(json_file)
+        legacy.set_user_mapping("github_user", "123")
+        legacy.set_thread_mapping("https://github.com/org/test-repo/pull/2", 333)
+        legacy.close()
+
+        storage = SQLiteStorage(str(tmp_path / "data.db"), json_file=json_file)
+        assert storage.get_user_mappings() == {"github_user": "123"}
+        assert storage.get_thread_mappings() == {"https://github.com/org/test-repo/pull/2": 333}
+
+        # 2回目以降は移行しない
+        storage.remove_user_mapping("github_user")
+        storage.close()
+        storage = SQLiteStorage(str(tmp_path / "data.db"), json_file=json_file)
+        assert storage.get_user_mappings() == {}
+        storage.close()
+
+
+class TestThreadRegistry:
+
+    @pytest.fixture
+    def registry(self, tmp_path):
+        """ThreadRegistryインスタンス"""
+        storage = PersistentStorage(str(tmp_path / "data.json"), flush_interval=0)
+        registry = ThreadRegistry(storage, ColdThreadStore(str(tmp_path / "cold.db")))
+        yield registry
+        registry.close()
+
+    def test_compact_keys(self, registry):
+        """URLが (repo, kind, number) のキーで保存されることのテスト"""
+        registry.set("https://github.com/org/repo/issues/1", 100)
+
+        assert registry.storage.get_thread_mappings() == {"repo/issues/1": 100}
+        assert registry.get_key(100) == ThreadKey("repo", "issues", 1)
+
+    def test_legacy_url_keys_converted(self, tmp_path):
+        """URL形式で保存された紐づけが読み込み時に変換されることのテスト"""
+        storage = PersistentStorage(str(tmp_path / "data.json"), flush_interval=0)
+        storage.set_thread_mapping("https://github.com/org/repo/pull/2", 200)
+
+        registry = ThreadRegistry(storage, ColdThreadStore(str(tmp_path / "cold.db")))
+        assert registry.get(ThreadKey("repo", "pull", 2)) == 200
+        assert storage.get_thread_mappings() == {"repo/pull/2": 200}
+        registry.close()
+
+    def test_retire_and_rehydrate(self, registry):
+        """coldに移動した紐づけが参照時にhotに戻ることのテスト"""
+        registry.set("https://github.com/org/repo/pull/3", 300)
+        assert registry.retire("https://github.com/org/repo/pull/3")
+        assert len(registry) == 0
+        assert registry.cold_count == 1
+        assert registry.storage.get_thread_mappings() == {}
+
+        assert registry.get("https://github.com/org/repo/pull/3") == 300
+        assert len(registry) == 1
+        assert registry.cold_count == 0
+
+    def test_evict_idle(self, registry):
+        """一定期間参照されていない紐づけがcoldに移動することのテスト"""
+        with patch('src.comment_connecter.thread_registry.time.time', return_value=1000.0):
+            registry.set("https://github.com/org/repo/issues/4", 400)
+        with patch('src.comment_connecter.thread_registry.time.time', return_value=2000.0):
+            registry.set("https://github.com/org/repo/issues/5", 500)
+            evicted = registry.evict_idle(500)
+
+        assert evicted == [ThreadKey("repo", "issues", 4)]
+        assert registry.get_key(400) == ThreadKey("repo", "issues", 4)
+
+    def test_evict_idle_in_batches(self, registry):
+        """最終参照の古い順に上限件数ずつcoldに移動することのテスト"""
+        for number in range(5):
+            with patch('src.comment_connecter.thread_registry.time.time', return_value=1000.0 + number):
+                registry.set(f"https://github.com/org/repo/issues/{number}", 100 + number)
+
+        with patch('src.comment_connecter.thread_registry.time.time', return_value=5000.0):
+            first = registry.evict_idle(500, limit=3)
+            second = registry.evict_idle(500, limit=3)
+
+        assert first == [ThreadKey("repo", "issues", number) for number in range(3)]
+        assert second == [ThreadKey("repo", "issues", 3), ThreadKey("repo", "issues", 4)]
+        assert len(registry) == 0
+        assert registry.cold_count == 5
+        assert registry.storage.get_thread_mappings() == {}
+
+    def test_missing_lookups_cached(self, registry):
+        """存在しない紐づけの問い合わせを覚え、coldへの移動後は見つかることのテスト"""
+        registry.cold = Mock(wraps=registry.cold)
+        assert registry.get("https://github.com/org/repo/issues/8") is None
+        assert registry.get("https://github.com/org/repo/issues/8") is None
+        assert registry.get_key(800) is None
+        assert registry.get_key(800) is None
+        assert registry.cold.get.call_count == 1
+        assert registry.cold.get_key.call_count == 1
+
+        registry.set("https://github.com/org/repo/issues/8", 800)
+        assert registry.retire("https://github.com/org/repo/issues/8")
+        assert registry.get_key(800) == ThreadKey("repo", "issues", 8)
+
+    @pytest.mark.parametrize("backend", ["json", "sqlite"])
+    def test_last_activity_survives_restart(self, tmp_path, backend):
+        """最終参照時刻が保存され、再起動後もアイドル判定に使われることのテスト"""
+        def open_registry():
+            if backend == "sqlite":
+                storage = SQLiteStorage(str(tmp_path / "data.db"))
+            else:
+                storage = PersistentStorage(str(tmp_path / "data.json"), flush_interval=0)
+            return ThreadRegistry(storage, ColdThreadStore(str(tmp_path / "cold.db")))
+
+        registry = open_registry()
+        with patch('src.comment_connecter.thread_registry.time.time', return_value=1000.0):
+            registry.set("https://github.com/org/repo/issues/6", 600)
+            registry.set("https://github.com/org/repo/issues/7", 700)
+        with patch('src.comment_connecter.thread_registry.time.time', return_value=1800.0):
+            registry.get("https://github.com/org/repo/issues/7")
+        registry.close()
+        registry.storage.close()
+
+        with patch('src.comment_connecter.thread_registry.time.time', return_value=2000.0):
+            registry = open_registry()
+            evicted = registry.evict_idle(500)
+        assert evicted == [ThreadKey("repo", "issues", 6)]
+        assert registry.storage.get_thread_activity() == {"repo/issues/7": 1800.0}
+        registry.close()
+        registry.storage.close()
+
+
+class TestNotificationCoalescer:
+
+    def make_thread(self, thread_id: int = 1):
+        thread = Mock()
+        thread.id = thread_id
+        thread.send = AsyncMock()
+        return thread
+
+    def test_batch_embeds(self):
+        """Embedの件数と合計文字数の制限で分割されることのテスト"""
+        embeds = [discord.Embed(title=f"{i}") for i in range(25)]
+        assert [len(batch) for batch in batch_embeds(embeds)] == [10, 10, 5]
+
+        large = [discord.Embed(description="x" * 2500) for _ in range(5)]
+        assert [len(batch) for batch in batch_embeds(large)] == [2, 2, 1]
+
+    @pytest.mark.asyncio
+    async def test_coalesces_burst(self):
+        """ウィンドウ内の通知がスレッドごとにまとめて送信されることのテスト"""
+        coalescer = NotificationCoalescer(window_ms=20)
+        thread, other = self.make_thread(1), self.make_thread(2)
+
+        for i in range(20):
+            await coalescer.send(thread, discord.Embed(title=f"comment {i}"))
+        await coalescer.send(other, discord.Embed(title="other"))
+        thread.send.assert_not_awaited()
+
+        await asyncio.gather(*coalescer.tasks.values())
+
+        assert [len(call.kwargs['embeds']) for call in thread.send.await_args_list] == [10, 10]
+        assert thread.send.await_args_list[1].kwargs['embeds'][-1].title == "comment 19"
+        assert other.send.await_count == 1
+        assert coalescer.stats == {'events': 21, 'messages': 3, 'failed': 0}
+
+    @pytest.mark.asyncio
+    async def test_flush_all_and_on_error(self):
+        """終了時に送信待ちの通知が送信され、失敗がon_errorに渡されることのテスト"""
+        on_error = AsyncMock()
+        coalescer = NotificationCoalescer(window_ms=60000, on_error=on_error)
+        thread = self.make_thread()
+        thread.send.side_effect = discord.DiscordException("boom")
+
+        await coalescer.send(thread, discord.Embed(title="review"))
+        await coalescer.flush_all()
+
+        assert coalescer.pending_count == 0
+        assert on_error.await_args.args[0] is thread
+        assert on_error.await_args.args[1][0].title == "review"
+
+
+class TestKeyedExecutor:
+
+    @pytest.mark.asyncio
+    async def test_serial_within_key_parallel_across_keys(self):
+        """同じキーは投入順に直列、異なるキーは並列に実行されることのテスト"""
+        executor = KeyedExecutor()
+        log = []
+        release = asyncio.Event()
+
+        async def job(name, wait=False):
+            log.append(f"start {name}")
+            if wait:
+                await release.wait()
+            log.append(f"end {name}")
+            return name
+
+        first = executor.submit("a", job, "a1", True)
+        second = executor.submit("a", job, "a2")
+        other = executor.submit("b", job, "b1")
+
+        assert await other == "b1"
+        assert "start a2" not in log
+        release.set()
+        assert await asyncio.gather(first, second) == ["a1", "a2"]
+        assert log.index("end a1") < log.index("start a2")
+
+    @pytest.mark.asyncio
+    async def test_idle_queues_reclaimed(self):
+        """処理が完了したキーのキューが破棄され、例外がFutureに設定されることのテスト"""
+        executor = KeyedExecutor()
+
+        async def fail():
+            raise RuntimeError("boom")
+
+        with pytest.raises(RuntimeError):
+            await executor.submit("a", fail)
+        await executor.join()
+
+        assert len(executor) == 0
+        assert executor.runners == {}
+
+    @pytest.mark.asyncio
+    async def test_cancelled_runner_resolves_pending(self):
+        """ランナーがキャンセルされた場合に、実行中・待機中の処理のFutureに例外が設定されることのテスト"""
+        executor = KeyedExecutor()
+        never = asyncio.Event()
+
+        running = executor.submit("a", never.wait)
+        queued = executor.submit("a", never.wait)
+        await asyncio.sleep(0)
+        executor.runners["a"].cancel()
+
+        for future in (running, queued):
+            with pytest.raises(RuntimeError, match="cancelled"):
+                await asyncio.wait_for(future, 1)
+        assert len(executor) == 0
+
+    @pytest.mark.asyncio
+    async def test_join_timeout_cancels_remaining(self):
+        """join が時間内に終わらない処理をキャンセルして戻ることのテスト"""
+        executor = KeyedExecutor()
+        future = executor.submit("a", asyncio.Event().wait)
+
+        await executor.join(timeout=0.01)
+
+        assert executor.runners == {}
+        with pytest.raises(RuntimeError):
+            await future
+
+
+class TestDeadLetterQueue:
+
+    @pytest.fixture
+    def dlq(self, tmp_path):
+        """再試行の待ち時間が0のデッドレターキュー"""
+        queue = DeadLetterQueue(DeadLetterStore(str(tmp_path / "dlq.db")), base_delay=0, max_delay=0,
+                                max_attempts=3, permanent_errors=(LookupError,))
+        yield queue
+        queue.close()
+
+    def test_backoff_delay(self):
+        """待ち時間が試行回数ごとに倍になり、上限で頭打ちになることのテスト"""
+        rng = Mock()
+        rng.uniform.side_effect = lambda low, high: high
+        assert [backoff_delay(n, 5, 60, rng) for n in range(1, 6)] == [5, 10, 20, 40, 60]
+        assert 0 <= backoff_delay(3, 5, 60) <= 20
+
+    @pytest.mark.asyncio
+    async def test_retry_until_recovered(self, dlq):
+        """失敗した再試行が上限まで繰り返され、成功したものは削除されることのテスト"""
+        handler = AsyncMock(side_effect=[RuntimeError("503"), None])
+        dlq.register('event', handler)
+        item_id = dlq.add('event', {'n': 1}, RuntimeError("500"))
+
+        assert await dlq.retry_due() == 0
+        assert dlq.store.get(item_id).attempts == 2
+        assert dlq.store.get(item_id).error == "RuntimeError: 503"
+        assert await dlq.retry_due() == 1
+        assert len(dlq.store) == 0
+        handler.assert_awaited_with({'n': 1})
+
+    @pytest.mark.asyncio
+    async def test_exhausted_and_requeue(self, dlq):
+        """上限に達したものと恒久的なエラーが打ち切られ、再投入できることのテスト"""
+        dlq.register('embeds', AsyncMock(side_effect=RuntimeError("503")))
+        failing = dlq.add('embeds', {'thread_id': 1, 'embeds': []}, RuntimeError("503"))
+        permanent = dlq.add('embeds', {'thread_id': 2, 'embeds': []}, LookupError("deleted"))
+
+        for _ in range(3):
+            await dlq.retry_due()
+        assert dlq.store.get(failing).status == EXHAUSTED
+        assert dlq.store.get(failing).attempts == 3
+        assert dlq.store.get(permanent).status == EXHAUSTED
+        assert dlq.store.due(time.time() + 3600) == []
+
+        assert dlq.requeue(failing) == 1
+        assert dlq.store.get(failing).status == PENDING
+        assert dlq.requeue() == 1
+        assert dlq.store.count(EXHAUSTED) == 0
+
+    @pytest.mark.asyncio
+    async def test_retry_loop(self, dlq):
+        """追加したデッドレターがバックグラウンドで再試行されることのテスト"""
+        done = asyncio.Event()
+        dlq.register('event', AsyncMock(side_effect=lambda payload: done.set()))
+        dlq.start()
+        dlq.add('event', {}, RuntimeError("500"))
+
+        await asyncio.wait_for(done.wait(), timeout=1)
+        await dlq.stop()
+        assert dlq.stats['recovered'] == 1
+
+
+class TestEventLog:
+
+    def test_roll_compress_and_read_range(self, tmp_path):
+        """セグメントが切り替わって圧縮され、オフセットと時刻の範囲で読み込めることのテスト"""
+        # 圧縮用のスレッドの保持期間の判定も同じ時計を使う
+        now = [1000.0]
+        log = EventLog(str(tmp_path / "events"), segment_bytes=300, clock=lambda: now[0])
+        for i in range(10):
+            now[0] = 1000.0 + i
+            assert log.append('issues', f"d-{i}", {'action': 'opened', 'n': i}) == i
+        log.flush()
+
+        index = load_index(str(tmp_path / "events"))
+        assert len(index) >= 2
+        assert all((tmp_path / "events" / f"{entry['file']}.gz").exists() for entry in index)
+        log.close()
+        assert [r['offset'] for r in read_events(str(tmp_path / "events"))] == list(range(10))
+        assert [r['delivery_id'] for r in read_events(str(tmp_path / "events"), from_offset=3, to_offset=5)] == ['d-3', 'd-4', 'd-5']
+        assert [r['payload']['n'] for r in read_events(str(tmp_path / "events"), since=1007.0)] == [7, 8, 9]
+
+    def test_resume_after_restart(self, tmp_path):
+        """再起動後に書き込み中のセグメントを引き継ぎ、オフセットが続くことのテスト"""
+        log = EventLog(str(tmp_path / "events"))
+        log.append('issues', 'd-0', {})
+        log.close()
+        with open(tmp_path / "events" / "events-000000000000.jsonl", 'a') as f:
+            f.write('{"offset": 1, "rece')  # 書き込み途中で停止
+
+        log = EventLog(str(tmp_path / "events"))
+        assert log.append('issues', 'd-1', {}) == 1
+        log.close()
+        assert [r['delivery_id'] for r in read_events(str(tmp_path / "events"))] == ['d-0', 'd-1']
+
+    def test_retention(self, tmp_path):
+        """合計サイズと経過日数の上限を超えた古いセグメントが削除されることのテスト"""
+        now = [time.time() - 3 * 86400]
+        log = EventLog(str(tmp_path / "events"), segment_bytes=1, max_bytes=10 ** 6, max_age_days=1,
+                       clock=lambda: now[0])
+        log.append('issues', 'old', {})
+        log.flush()
+        now[0] = time.time()
+        log.append('issues', 'new', {})
+        log.close()
+
+        assert [r['delivery_id'] for r in read_events(str(tmp_path / "events"))] == ['new']
+        assert [entry['first_offset'] for entry in load_index(str(tmp_path / "events"))] == [1]
+
+
+class TestCommentConnector:
+
+    @pytest.fixture
+    def connector(self, tmp_path, monkeypatch):
+        """CommentConnectorインスタンス"""
+        monkeypatch.chdir(tmp_path)
+        client = Mock(spec=discord.Client)
+        with patch('src.comment_connecter.comment_connecter.config.GITHUB_TOKEN', None), \
+                patch('src.comment_connecter.comment_connecter.config.NOTIFY_COALESCE_MS', 0):
+            connector = CommentConnector(client)
+        yield connector
+        # 遅延書き込みが作業ディレクトリを戻した後に実行されないよう、ここで書き込んで閉じる
+        connector.thread_mappings.close()
+        connector.storage.close()
+        connector.dead_letters.close()
+        connector.event_log.close()
+
+    @pytest.mark.asyncio
+    async def test_webhook_returns_accepted(self, connector):
+        """WebHookが即座に202を返しキューに追加されることのテスト"""
+        connector.process_webhook_event = AsyncMock()
+        connector.webhook_queue.handler = connector.process_webhook_event
+
+        response = await connector.handle_github_webhook(make_webhook_request(b'{"action": "opened"}'))
+
+        assert response.status == 202
+        await connector.webhook_queue.stop()
+        connector.process_webhook_event.assert_awaited_once_with('issues', 'delivery-1', {'action': 'opened'})
+
+    @pytest.mark.asyncio
+    async def test_webhook_invalid_payload(self, connector):
+        """不正なJSONに400を返すことのテスト"""
+        response = await connector.handle_github_webhook(make_webhook_request(b'not json'))
+        assert response.status == 400
+
+    @pytest.mark.asyncio
+    async def test_webhook_queue_full(self, connector):
+        """キューが満杯の場合に503を返すことのテスト"""
+        connector.webhook_queue.submit = Mock(return_value=False)
+
+        response = await connector.handle_github_webhook(make_webhook_request(b'{}'))
+
+        assert response.status == 503
+
+    @pytest.mark.asyncio
+    async def test_webhook_event_log_failure(self, connector):
+        """イベントログへの記録に失敗した場合に503を返し、再送を受け付けることのテスト"""
+        connector.webhook_queue.submit = Mock(return_value=True)
+        connector.tracer = Tracer(sample_rate=1)
+        connector.event_log.append = Mock(side_effect=[OSError("No space left on device"), None])
+
+        first = await connector.handle_github_webhook(make_webhook_request(b'{}', delivery_id='e1'))
+        assert first.status == 503
+        assert first.headers['Retry-After'] == '10'
+        assert 'e1' not in connector.delivery_cache
+        assert 'e1' not in connector.tracer.active
+
+        second = await connector.handle_github_webhook(make_webhook_request(b'{}', delivery_id='e1'))
+        assert second.status == 202
+        connector.webhook_queue.submit.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_webhook_duplicate_delivery(self, connector):
+        """再送されたWebHookがキューに追加されないことのテスト"""
+        connector.webhook_queue.submit = Mock(return_value=True)
+
+        first = await connector.handle_github_webhook(make_webhook_request(b'{}', delivery_id='d1'))
+        second = await connector.handle_github_webhook(make_webhook_request(b'{}', delivery_id='d1'))
+
+        assert first.status == 202
+        assert second.status == 200
+        connector.webhook_queue.submit.assert_called_once()
+
+    def test_mapping_lookups(self, connector):
+        """紐づけ・解除で逆引きが更新されることのテスト"""
+        connector.link_user("github_user", "123")
+        assert connector.convert_discord_mention("123") == "@github_user"
+        assert connector.convert_github_mention("github_user") == "<@123>"
+
+        connector.unlink_user("github_user")
+        assert connector.convert_discord_mention("123") == "<@123>"
+
+        connector.link_thread("https://github.com/org/repo/issues/1", 555)
+        assert connector.thread_mappings.get_key(555) == ThreadKey("repo", "issues", 1)
+        assert connector.storage.get_thread_mappings() == {"repo/issues/1": 555}
+
+    @pytest.mark.asyncio
+    async def test_closed_pull_request_retired(self, connector):
+        """クローズされたPRの紐づけがcoldに移動し、再オープンで同じスレッドが使われることのテスト"""
+        thread = Mock()
+        thread.send = AsyncMock()
+        connector.client.get_channel.return_value = thread
+        connector.link_thread("https://github.com/org/repo/pull/7", 777)
+        pull_request = {
+            'number': 7, 'title': 'PR', 'merged': True,
+            'html_url': "https://github.com/org/repo/pull/7"
+        }
+
+        await connector.handle_pull_request_event({'action': 'closed', 'pull_request': pull_request, 'repository': {'name': 'repo'}})
+        assert len(connector.thread_mappings) == 0
+        assert connector.thread_mappings.cold_count == 1
+
+        connector.notify_pull_request_created = AsyncMock()
+        await connector.handle_pull_request_event({'action': 'reopened', 'pull_request': pull_request, 'repository': {'name': 'repo'}})
+        connector.notify_pull_request_created.assert_not_awaited()
+        assert connector.thread_mappings.get_key(777) == ThreadKey("repo", "pull", 7)
+        assert thread.send.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_review_comments_coalesced(self, connector):
+        """連続したレビューコメントが1つのメッセージにまとめられることのテスト"""
+        thread = Mock()
+        thread.id = 888
+        thread.send = AsyncMock()
+        connector.client.get_channel.return_value = thread
+        connector.coalescer = NotificationCoalescer(window_ms=60000)
+        connector.link_thread("https://github.com/org/repo/pull/8", 888)
+        pull_request = {'number': 8, 'html_url': "https://github.com/org/repo/pull/8"}
+
+        for i in range(3):
+            comment = {'body': f"nit {i}", 'html_url': f"https://github.com/org/repo/pull/8#r{i}", 'user': {'login': 'alice'}}
+            await connector.handle_pull_request_review_comment_event(
+                {'action': 'created', 'comment': comment, 'pull_request': pull_request, 'repository': {'name': 'repo'}}
+            )
+        await connector.shutdown()
+
+        thread.send.assert_awaited_once()
+        assert len(thread.send.await_args.kwargs['embeds']) == 3
+
+    @pytest.mark.asyncio
+    async def test_repository_events_update_channel_mappings(self, connector):
+        """repositoryイベントでチャンネル紐づけが作成・移動・解除されることのテスト"""
+        channel = Mock(spec=discord.TextChannel)
+        channel.id = 42
+        connector.repository_handler = AsyncMock(return_value=channel)
+
+        await connector.process_webhook_event('repository', 'd-1', {'action': 'created', 'repository': {'name': 'repo'}})
+        assert connector.channel_mappings == {'repo': 42}
+
+        await connector.process_webhook_event('repository', 'd-2', {
+            'action': 'renamed', 'repository': {'name': 'renamed'},
+            'changes': {'repository': {'name': {'from': 'repo'}}}
+        })
+        assert connector.channel_mappings == {'renamed': 42}
+        assert connector.storage.get_channel_mappings() == {'renamed': 42}
+
+        connector.repository_handler.return_value = None
+        await connector.process_webhook_event('repository', 'd-3', {'action': 'deleted', 'repository': {'name': 'renamed'}})
+        assert connector.channel_mappings == {}
+        connector.repository_handler.assert_awaited_with('deleted', {'name': 'renamed'}, {})
+
+    @pytest.mark.asyncio
+    async def test_events_for_same_pull_request_processed_in_order(self, connector):
+        """PR作成の処理中に届いたレビューが、スレッド作成後に処理されることのテスト"""
+        pull_request = {'number': 9, 'html_url': "https://github.com/org/repo/pull/9"}
+        release = asyncio.Event()
+        thread = Mock()
+        thread.id = 999
+        thread.send = AsyncMock()
+        connector.client.get_channel.return_value = thread
+
+        async def slow_create(pull_request, repository):
+            await release.wait()
+            connector.link_thread(pull_request['html_url'], thread.id)
+
+        connector.notify_pull_request_created = slow_create
+        review = {'state': 'approved', 'body': '', 'html_url': "https://github.com/org/repo/pull/9#r1", 'user': {'login': 'bob'}}
+        connector.webhook_queue.submit('pull_request', 'd-1', {'action': 'opened', 'pull_request': pull_request, 'repository': {'name': 'repo'}})
+        connector.webhook_queue.submit('pull_request_review', 'd-2', {'action': 'submitted', 'review': review, 'pull_request': pull_request, 'repository': {'name': 'repo'}})
+
+        await asyncio.sleep(0)
+        release.set()
+        await connector.webhook_queue.stop()
+
+        thread.send.assert_awaited_once()
+        assert connector.webhook_queue.stats['processed'] == 2
+
+    @pytest.mark.asyncio
+    async def test_metrics_endpoint(self, connector):
+        """/metrics が処理時間・紐づけ数・通知の鮮度をPrometheus形式で返すことのテスト"""
+        thread = Mock()
+        thread.id = 321
+        thread.send = AsyncMock()
+        connector.client.get_channel.return_value = thread
+        connector.link_thread("https://github.com/org/repo/issues/3", 321)
+        freshness = NOTIFICATION_FRESHNESS.get_count(event='issue_comment')
+        comment = {
+            'body': 'hi', 'html_url': "https://github.com/org/repo/issues/3#c1", 'user': {'login': 'alice'},
+            'updated_at': (datetime.now(timezone.utc) - timedelta(seconds=5)).isoformat()
+        }
+        payload = {
+            'action': 'created', 'comment': comment, 'repository': {'name': 'repo'},
+            'issue': {'number': 3, 'html_url': "https://github.com/org/repo/issues/3"}
+        }
+
+        response = await connector.handle_github_webhook(make_webhook_request(json.dumps(payload).encode(), 'issue_comment', 'm-1'))
+        assert response.status == 202
+        await connector.webhook_queue.stop()
+        thread.send.assert_awaited_once()
+        assert NOTIFICATION_FRESHNESS.get_count(event='issue_comment') == freshness + 1
+
+        response = await connector.handle_metrics(make_mocked_request('GET', '/metrics'))
+        text = response.body.decode()
+        assert response.content_type == 'text/plain'
+        assert 'kurono_webhook_requests_total{event="issue_comment",status="202"}' in text
+        assert 'kurono_webhook_latency_seconds_count{event="issue_comment"}' in text
+        assert 'kurono_mapping_entries{table="thread_hot"} 1' in text
+        assert 'kurono_webhook_queue_depth 0' in text
+        assert 'kurono_discord_request_seconds_count{priority="notification"}' in text
+
+    @pytest.mark.asyncio
+    async def test_debug_profile_requires_token(self, connector):
+        """/debug/profile がDEBUG_TOKENのBearerトークンを要求することのテスト"""
+        from aiohttp import web
+
+        with patch('src.comment_connecter.comment_connecter.config.DEBUG_TOKEN', None):
+            with pytest.raises(web.HTTPNotFound):
+                await connector.handle_debug_profile(make_mocked_request('GET', '/debug/profile'))
+
+        with patch('src.comment_connecter.comment_connecter.config.DEBUG_TOKEN', 'secret'):
+            with pytest.raises(web.HTTPNotFound):
+                await connector.handle_debug_profile(make_mocked_request(
+                    'GET', '/debug/profile', headers={'Authorization': 'Bearer wrong'}
+                ))
+            response = await connector.handle_debug_profile(make_mocked_request(
+                'GET', '/debug/profile?seconds=0.1', headers={'Authorization': 'Bearer secret'}
+            ))
+
+        assert response.status == 200
+        assert 'MainThread;' in response.text
+
+    @pytest.mark.asyncio
+    async def test_webhook_traced_per_delivery(self, connector, tmp_path):
+        """受信からスレッドへの送信までの処理区間が配信ごとに記録されることのテスト"""
+        thread = Mock()
+        thread.id = 654
+        thread.send = AsyncMock()
+        connector.client.get_channel.return_value = thread
+        connector.link_thread("https://github.com/org/repo/issues/5", 654)
+        connector.tracer = Tracer(str(tmp_path / "traces.jsonl"), sample_rate=1)
+        payload = {
+            'action': 'created', 'repository': {'name': 'repo'},
+            'comment': {'body': 'hi', 'html_url': "https://github.com/org/repo/issues/5#c1", 'user': {'login': 'alice'}},
+            'issue': {'number': 5, 'html_url': "https://github.com/org/repo/issues/5"}
+        }
+
+        await connector.handle_github_webhook(make_webhook_request(json.dumps(payload).encode(), 'issue_comment', 't-1'))
+        await connector.handle_github_webhook(make_webhook_request(b'not json', 'issues', 't-2'))
+        await connector.webhook_queue.stop()
+        connector.tracer.close()
+
+        records = {r['delivery_id']: r for r in map(json.loads, (tmp_path / "traces.jsonl").read_text().splitlines())}
+        assert records['t-1']['outcome'] == 'processed'
+        assert [s['name'] for s in records['t-1']['spans']] == [
+            'webhook.parse', 'webhook.dedup', 'webhook.enqueue', 'discord.thread_send', 'handler.dispatch'
+        ]
+        assert records['t-2']['status'] == 400
+
+    @pytest.mark.asyncio
+    async def test_redelivery_does_not_finish_queued_trace(self, connector, tmp_path):
+        """処理中の配信の再送で、処理中のトレースが終了されないことのテスト"""
+        released = asyncio.Event()
+
+        async def send(*args, **kwargs):
+            await released.wait()
+
+        thread = Mock()
+        thread.id = 655
+        thread.send = AsyncMock(side_effect=send)
+        connector.client.get_channel.return_value = thread
+        connector.link_thread("https://github.com/org/repo/issues/6", 655)
+        connector.tracer = Tracer(str(tmp_path / "traces.jsonl"), sample_rate=1)
+        body = json.dumps({
+            'action': 'created', 'repository': {'name': 'repo'},
+            'comment': {'body': 'hi', 'html_url': "https://github.com/org/repo/issues/6#c1", 'user': {'login': 'alice'}},
+            'issue': {'number': 6, 'html_url': "https://github.com/org/repo/issues/6"}
+        }).encode()
+
+        first = await connector.handle_github_webhook(make_webhook_request(body, 'issue_comment', 't-3'))
+        duplicate = await connector.handle_github_webhook(make_webhook_request(body, 'issue_comment', 't-3'))
+        assert (first.status, duplicate.status) == (202, 200)
+        assert 't-3' in connector.tracer.active
+
+        released.set()
+        await connector.webhook_queue.stop()
+        connector.tracer.close()
+
+        [record] = map(json.loads, (tmp_path / "traces.jsonl").read_text().splitlines())
+        assert record['outcome'] == 'processed'
+        assert [s['name'] for s in record['spans']][:3] == ['webhook.parse', 'webhook.dedup', 'webhook.enqueue']
+
+    @pytest.mark.asyncio
+    async def test_failed_event_dead_lettered_and_retried(self, connector):
+        """処理に失敗したイベントがデッドレターキューに保存され、再試行で通知されることのテスト"""
+        thread = Mock()
+        thread.id = 777
+        thread.send = AsyncMock(side_effect=[RuntimeError("Discord 503"), Mock()])
+        connector.client.get_channel.return_value = thread
+        connector.link_thread("https://github.com/org/repo/issues/7", 777)
+        payload = {
+            'action': 'created', 'repository': {'name': 'repo'},
+            'comment': {'body': 'hi', 'html_url': "https://github.com/org/repo/issues/7#c1", 'user': {'login': 'alice'}},
+            'issue': {'number': 7, 'html_url': "https://github.com/org/repo/issues/7"}
+        }
+
+        await connector.handle_github_webhook(make_webhook_request(json.dumps(payload).encode(), 'issue_comment', 'f-1'))
+        await connector.webhook_queue.stop()
+
+        [item] = connector.dead_letters.store.list()
+        assert item.kind == 'event'
+        assert item.payload['delivery_id'] == 'f-1'
+        # GitHubからの再送とデッドレターの再試行で二重に処理しない
+        assert not connector.delivery_cache.add_if_new('f-1')
+
+        connector.dead_letters.store.update(item.id, PENDING, item.attempts, item.error, 0)
+        assert await connector.dead_letters.retry_due() == 1
+        assert thread.send.await_count == 2
+        assert len(connector.dead_letters.store) == 0
+
+    @pytest.mark.asyncio
+    async def test_retry_reuses_sent_root_message(self, connector):
+        """スレッドの作成に失敗したIssue作成通知の再試行で、チャンネルに通知を二重に送信しないことのテスト"""
+        message = Mock()
+        message.id = 555
+        message.create_thread = AsyncMock(side_effect=RuntimeError("Discord 502"))
+        channel = Mock()
+        channel.id = 100
+        channel.send = AsyncMock(return_value=message)
+        partial = Mock()
+        partial.create_thread = AsyncMock(side_effect=[RuntimeError("Discord 503"), Mock(id=666)])
+        channel.get_partial_message = Mock(return_value=partial)
+        connector.client.get_channel.return_value = channel
+        connector.link_channel('repo', 100)
+        payload = {
+            'action': 'opened', 'repository': {'name': 'repo'},
+            'issue': {'number': 3, 'title': 'Bug', 'body': '', 'user': {'login': 'alice'},
+                      'html_url': "https://github.com/org/repo/issues/3"}
+        }
+
+        await connector.handle_github_webhook(make_webhook_request(json.dumps(payload).encode(), 'issues', 'i-1'))
+        await connector.webhook_queue.stop()
+        [item] = connector.dead_letters.store.list()
+        assert item.payload['progress'] == {'message_id': 555}
+
+        # 再試行の失敗でも、送信済みのメッセージの記録は保存されたまま
+        connector.dead_letters.store.update(item.id, PENDING, item.attempts, item.error, 0)
+        assert await connector.dead_letters.retry_due() == 0
+        [item] = connector.dead_letters.store.list()
+        assert item.payload['progress'] == {'message_id': 555}
+
+        connector.dead_letters.store.update(item.id, PENDING, item.attempts, item.error, 0)
+        assert await connector.dead_letters.retry_due() == 1
+        channel.send.assert_awaited_once()
+        channel.get_partial_message.assert_called_with(555)
+        assert connector.thread_mappings.get("https://github.com/org/repo/issues/3") == 666
+
+    @pytest.mark.asyncio
+    async def test_coalesced_failure_resent_to_fetched_thread(self, connector):
+        """まとめ送信に失敗した通知が保存され、キャッシュにないスレッドを取得して再送されることのテスト"""
+        thread = Mock()
+        thread.id = 888
+        thread.send = AsyncMock()
+        embed = discord.Embed(title="Review", url="https://github.com/org/repo/pull/8#r1")
+
+        await connector.dead_letter_embeds(thread, [embed], RuntimeError("Discord 500"))
+        [item] = connector.dead_letters.store.list()
+        assert item.kind == 'embeds'
+
+        connector.client.get_channel.return_value = None
+        connector.client.fetch_channel = AsyncMock(return_value=thread)
+        connector.dead_letters.store.update(item.id, PENDING, item.attempts, item.error, 0)
+        assert await connector.dead_letters.retry_due() == 1
+
+        connector.client.fetch_channel.assert_awaited_once_with(888)
+        [sent] = thread.send.await_args.kwargs['embeds']
+        assert sent.title == "Review"
+
+        deleted = discord.NotFound(Mock(status=404, reason='Not Found'), 'Unknown Channel')
+        connector.client.fetch_channel = AsyncMock(side_effect=deleted)
+        await connector.dead_letter_embeds(thread, [embed], RuntimeError("Discord 500"))
+        connector.dead_letters.requeue(connector.dead_letters.store.list()[0].id)
+        assert await connector.dead_letters.retry_due() == 0
+        assert connector.dead_letters.store.count(EXHAUSTED) == 1
+
+    @pytest.mark.asyncio
+    async def test_webhook_logged_except_replays(self, connector):
+        """受信したイベントがログに記録され、再送されたイベントは記録されないことのテスト"""
+        connector.webhook_queue.handler = AsyncMock()
+        await connector.handle_github_webhook(make_webhook_request(b'{"action": "opened"}', 'issues', 'l-1'))
+        await connector.handle_github_webhook(
+            make_webhook_request(b'{"action": "closed"}', 'issues', 'l-2', **{'X-Kurono-Replay': '0'})
+        )
+        await connector.webhook_queue.stop()
+
+        records = list(read_events(connector.event_log.directory))
+        assert [(r['offset'], r['delivery_id'], r['payload']) for r in records] == [(0, 'l-1', {'action': 'opened'})]
+
+    @pytest.mark.asyncio
+    async def test_replay_accepts_only_unprocessed_deliveries(self, connector):
+        """処理前に停止した配信だけが、再起動後に元の配信IDのままリプレイで受け付けられることのテスト"""
+        connector.process_webhook_event = AsyncMock()
+        await connector.handle_github_webhook(make_webhook_request(b'{"action": "opened"}', 'issues', 'r-1'))
+        await connector.webhook_queue.stop()
+        connector.process_webhook_event.assert_awaited_once()
+
+        # キューに追加した後、処理する前に停止した配信
+        connector.webhook_queue.submit = Mock(return_value=True)
+        await connector.handle_github_webhook(make_webhook_request(b'{"action": "closed"}', 'issues', 'r-2'))
+        connector.delivery_cache.save()
+
+        restarted = DeliveryCache(connector.delivery_cache.storage_file)
+        replayed = [r['delivery_id'] for r in read_events(connector.event_log.directory)
+                    if restarted.add_if_new(r['delivery_id'])]
+        assert replayed == ['r-2']
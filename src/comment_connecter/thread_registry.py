@@ -0,0 +1,253 @@
+"""
+issue/PRとDiscordスレッドの紐づけのライフサイクル管理
+
+アクティブな紐づけ（hot）はメモリとストレージに保持し、クローズ・マージされた
+ものや一定期間更新のないものはディスク上のコールドストア（cold）に移動する。
+コールドストアの紐づけは、再オープンや遅れて届いたコメントで参照された時点で
+hotに戻される。
+"""
+
+import sqlite3
+import time
+import logging
+from collections import OrderedDict
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+from .utils import BidirectionalMapping, ThreadKey
+
+logger = logging.getLogger(__name__)
+
+KeyLike = Union[ThreadKey, str]
+
+# hotにもcoldにも存在しないことを覚えておくキー・スレッドIDの数（コールドストアへの問い合わせを省く）
+MISSING_CACHE_SIZE = 10000
+
+
+class ColdThreadStore:
+    """アーカイブされたスレッド紐づけを保持するSQLiteストア"""
+
+    def __init__(self, storage_file: str = "comment_connector_cold.db"):
+        self.storage_file = storage_file
+        self.conn = sqlite3.connect(storage_file)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS cold_threads (
+                repo TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                number INTEGER NOT NULL,
+                thread_id INTEGER NOT NULL,
+                archived_at REAL NOT NULL,
+                PRIMARY KEY (repo, kind, number)
+            );
+            CREATE INDEX IF NOT EXISTS idx_cold_threads_thread_id ON cold_threads (thread_id);
+        """)
+        self.conn.commit()
+
+    def __len__(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM cold_threads").fetchone()[0]
+
+    def get(self, key: ThreadKey) -> Optional[int]:
+        row = self.conn.execute(
+            "SELECT thread_id FROM cold_threads WHERE repo = ? AND kind = ? AND number = ?", tuple(key)
+        ).fetchone()
+        return row[0] if row else None
+
+    def get_key(self, thread_id: int) -> Optional[ThreadKey]:
+        row = self.conn.execute(
+            "SELECT repo, kind, number FROM cold_threads WHERE thread_id = ?", (thread_id,)
+        ).fetchone()
+        return ThreadKey(*row) if row else None
+
+    def put(self, key: ThreadKey, thread_id: int):
+        self.put_many([(key, thread_id)])
+
+    def put_many(self, items: Iterable[Tuple[ThreadKey, int]]):
+        """複数の紐づけを1つのトランザクションで追加"""
+        archived_at = time.time()
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO cold_threads (repo, kind, number, thread_id, archived_at) VALUES (?, ?, ?, ?, ?)",
+                [(*key, thread_id, archived_at) for key, thread_id in items]
+            )
+
+    def remove(self, key: ThreadKey):
+        with self.conn:
+            self.conn.execute("DELETE FROM cold_threads WHERE repo = ? AND kind = ? AND number = ?", tuple(key))
+
+    def close(self):
+        self.conn.close()
+
+
+class ThreadRegistry:
+    """スレッド紐づけのhot/coldを管理するレジストリ"""
+
+    def __init__(self, storage, cold_store: ColdThreadStore):
+        self.storage = storage
+        self.cold = cold_store
+        self.hot = BidirectionalMapping()
+        self.last_activity: Dict[ThreadKey, float] = {}
+        # ストレージに未保存の最終参照時刻を持つキー
+        self.unsaved_activity: Set[ThreadKey] = set()
+        # hotにもcoldにも存在しないキー・スレッドID（LRU、coldに移動した時点で削除する）
+        self.missing: "OrderedDict[Union[ThreadKey, int], None]" = OrderedDict()
+        self.load()
+
+    def load(self):
+        """ストレージからhotな紐づけと最終参照時刻を読み込み（URL形式のキーは保存形式に変換）"""
+        now = time.time()
+        activity = self.storage.get_thread_activity()
+        for stored_key, thread_id in self.storage.get_thread_mappings().items():
+            try:
+                key = ThreadKey.parse(stored_key)
+            except ValueError:
+                logger.warning(f"Skipping invalid thread mapping key: {stored_key}")
+                continue
+            self.hot[key] = thread_id
+            # 最終参照時刻が保存されていない紐づけ（移行前のデータ）は読み込み時点から数える
+            self.last_activity[key] = activity.get(stored_key, now)
+            if stored_key != str(key):
+                self.storage.remove_thread_mapping(stored_key)
+                self.storage.set_thread_mapping(str(key), thread_id)
+                self.unsaved_activity.add(key)
+
+    def __len__(self) -> int:
+        return len(self.hot)
+
+    def __contains__(self, key: KeyLike) -> bool:
+        return self.get(key) is not None
+
+    def __iter__(self) -> Iterator[ThreadKey]:
+        return iter(self.hot)
+
+    @property
+    def cold_count(self) -> int:
+        return len(self.cold)
+
+    def get(self, key: KeyLike) -> Optional[int]:
+        """キーまたはURLに対応するスレッドIDを取得（coldにあればhotに戻す）"""
+        key = ThreadKey.parse(key)
+        thread_id = self.hot.get(key)
+        if thread_id is None:
+            if self._known_missing(key):
+                return None
+            thread_id = self.cold.get(key)
+            if thread_id is None:
+                self._remember_missing(key)
+                return None
+            self._rehydrate(key, thread_id)
+        self._touch(key)
+        return thread_id
+
+    def get_key(self, thread_id: int) -> Optional[ThreadKey]:
+        """スレッドIDに対応するキーを取得（coldにあればhotに戻す）"""
+        key = self.hot.get_key(thread_id)
+        if key is None:
+            if self._known_missing(thread_id):
+                return None
+            key = self.cold.get_key(thread_id)
+            if key is None:
+                self._remember_missing(thread_id)
+                return None
+            self._rehydrate(key, thread_id)
+        self._touch(key)
+        return key
+
+    def set(self, key: KeyLike, thread_id: int):
+        """紐づけを登録"""
+        key = ThreadKey.parse(key)
+        self.hot[key] = thread_id
+        self.last_activity[key] = time.time()
+        self.storage.set_thread_mapping(str(key), thread_id)
+        self.storage.set_thread_activity({str(key): self.last_activity[key]})
+        self.unsaved_activity.discard(key)
+        self.cold.remove(key)
+
+    def remove(self, key: KeyLike) -> bool:
+        """紐づけをhot/coldの両方から削除。存在しない場合はFalse"""
+        key = ThreadKey.parse(key)
+        if key not in self.hot and self.cold.get(key) is None:
+            return False
+        if key in self.hot:
+            del self.hot[key]
+            self.last_activity.pop(key, None)
+            self.unsaved_activity.discard(key)
+            self.storage.remove_thread_mapping(str(key))
+        self.cold.remove(key)
+        return True
+
+    def retire(self, key: KeyLike) -> bool:
+        """紐づけをcoldに移動。hotに存在しない場合はFalse"""
+        key = ThreadKey.parse(key)
+        if not self.retire_many([key]):
+            return False
+        logger.info(f"Moved thread mapping {key} to cold store")
+        return True
+
+    def retire_many(self, keys: Iterable[ThreadKey]) -> List[ThreadKey]:
+        """複数の紐づけをまとめてcoldに移動（コールドストアとストレージへの書き込みは1回ずつ）"""
+        items = [(key, self.hot[key]) for key in keys if key in self.hot]
+        if not items:
+            return []
+        self.cold.put_many(items)
+        for key, thread_id in items:
+            del self.hot[key]
+            self.last_activity.pop(key, None)
+            self.unsaved_activity.discard(key)
+            self.missing.pop(key, None)
+            self.missing.pop(thread_id, None)
+        self.storage.remove_thread_mappings([str(key) for key, _ in items])
+        return [key for key, _ in items]
+
+    def evict_idle(self, max_idle: float, limit: Optional[int] = None) -> List[ThreadKey]:
+        """
+        max_idle秒以上参照されていない紐づけをcoldに移動し、残りの最終参照時刻を保存
+
+        Args:
+            max_idle: coldに移動するまでの参照のない期間（秒）
+            limit: 1回で移動する最大件数（最終参照の古い順。Noneの場合は制限しない）
+
+        Returns:
+            list: coldに移動したキー
+        """
+        deadline = time.time() - max_idle
+        idle = sorted((last, key) for key, last in self.last_activity.items() if last < deadline)
+        idle_keys = self.retire_many([key for _, key in idle[:limit]])
+        if idle_keys:
+            logger.info(f"Evicted {len(idle_keys)} idle thread mappings to cold store")
+        self.save_activity()
+        return idle_keys
+
+    def save_activity(self):
+        """参照で更新された最終参照時刻をストレージにまとめて書き込み"""
+        if not self.unsaved_activity:
+            return
+        self.storage.set_thread_activity({
+            str(key): self.last_activity[key] for key in self.unsaved_activity if key in self.last_activity
+        })
+        self.unsaved_activity.clear()
+
+    def _known_missing(self, item: Union[ThreadKey, int]) -> bool:
+        if item not in self.missing:
+            return False
+        self.missing.move_to_end(item)
+        return True
+
+    def _remember_missing(self, item: Union[ThreadKey, int]):
+        self.missing[item] = None
+        if len(self.missing) > MISSING_CACHE_SIZE:
+            self.missing.popitem(last=False)
+
+    def _touch(self, key: ThreadKey):
+        # 参照のたびには書き込まず、evict_idle・close時にまとめて保存する
+        self.last_activity[key] = time.time()
+        self.unsaved_activity.add(key)
+
+    def _rehydrate(self, key: ThreadKey, thread_id: int):
+        self.hot[key] = thread_id
+        self.storage.set_thread_mapping(str(key), thread_id)
+        self.cold.remove(key)
+        logger.info(f"Rehydrated thread mapping {key} from cold store")
+
+    def close(self):
+        self.save_activity()
+        self.cold.close()
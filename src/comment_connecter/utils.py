@@ -1,73 +1,249 @@
 import json
 import os
 import logging
-from typing import Dict, Any
+import threading
+import time
+from datetime import datetime
+from collections.abc import MutableMapping
+from typing import Dict, Any, List, NamedTuple, Optional, Union
+from common.files import atomic_write_json
+from common.metrics import get_registry
 
 logger = logging.getLogger(__name__)
 
+STORAGE_FLUSH_SECONDS = get_registry().histogram(
+    'kurono_storage_flush_seconds', 'Duration of writing persisted state to disk', ['store']
+)
+
 class PersistentStorage:
-    """設定データの永続化クラス"""
+    """
+    設定データの永続化クラス
+    
+    変更はメモリ上に反映してダーティフラグを立てるだけで、ファイルへの書き込みは
+    バックグラウンドスレッドが flush_interval ごとにまとめて行う。
+    flush_interval が0以下の場合は変更のたびに同期的に書き込む。
+    """
     
-    def __init__(self, storage_file: str = "comment_connector_data.json"):
+    def __init__(self, storage_file: str = "comment_connector_data.json", flush_interval: float = 1.0):
         self.storage_file = storage_file
+        self.flush_interval = flush_interval
+        self.lock = threading.RLock()
+        self.dirty = False
         self.data = self.load_data()
+        
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._flusher = None
     
     def load_data(self) -> Dict[str, Any]:
         """データファイルから設定を読み込み"""
+        data = {}
         if os.path.exists(self.storage_file):
             try:
                 with open(self.storage_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+                    data = json.load(f)
             except Exception as e:
                 logger.error(f"Error loading data from {self.storage_file}: {e}")
         
-        return {
-            "user_mappings": {},
-            "channel_mappings": {},
-            "thread_mappings": {}
-        }
+        for key in ("user_mappings", "channel_mappings", "thread_mappings", "thread_activity"):
+            data.setdefault(key, {})
+        return data
     
     def save_data(self):
-        """データファイルに設定を保存"""
+        """変更を記録し、書き込みをスケジュール"""
+        with self.lock:
+            self.dirty = True
+        if self.flush_interval <= 0:
+            self.flush()
+            return
+        self._ensure_flusher()
+    
+    def flush(self):
+        """未保存の変更があればファイルにアトミックに書き込み"""
+        with self.lock:
+            if not self.dirty:
+                return
+            snapshot = {key: dict(value) for key, value in self.data.items()}
+            self.dirty = False
+        
+        started_at = time.monotonic()
         try:
-            with open(self.storage_file, 'w', encoding='utf-8') as f:
-                json.dump(self.data, f, ensure_ascii=False, indent=2)
-            logger.info(f"Data saved to {self.storage_file}")
+            atomic_write_json(self.storage_file, snapshot, indent=2)
+            logger.debug(f"Data saved to {self.storage_file}")
         except Exception as e:
+            with self.lock:
+                self.dirty = True
             logger.error(f"Error saving data to {self.storage_file}: {e}")
+        finally:
+            STORAGE_FLUSH_SECONDS.observe(time.monotonic() - started_at, store='mappings')
+    
+    def _ensure_flusher(self):
+        if self._flusher is None and not self._closed:
+            self._flusher = threading.Thread(target=self._flush_loop, name="storage-flusher", daemon=True)
+            self._flusher.start()
+    
+    def _flush_loop(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self.flush()
+    
+    def close(self):
+        """バックグラウンドの書き込みを停止し、未保存の変更を書き込む"""
+        self._closed = True
+        self._wakeup.set()
+        if self._flusher is not None:
+            self._flusher.join()
+            self._flusher = None
+        self.flush()
     
     def get_user_mappings(self) -> Dict[str, str]:
         """ユーザー紐づけ情報を取得"""
-        return self.data.get("user_mappings", {})
+        with self.lock:
+            return dict(self.data["user_mappings"])
     
     def set_user_mapping(self, github_username: str, discord_user_id: str):
         """ユーザー紐づけ情報を設定"""
-        self.data["user_mappings"][github_username] = discord_user_id
+        with self.lock:
+            self.data["user_mappings"][github_username] = discord_user_id
+        self.save_data()
+    
+    def remove_user_mapping(self, github_username: str):
+        """ユーザー紐づけ情報を削除"""
+        with self.lock:
+            if self.data["user_mappings"].pop(github_username, None) is None:
+                return
         self.save_data()
     
     def get_channel_mappings(self) -> Dict[str, int]:
         """チャンネル紐づけ情報を取得"""
-        return self.data.get("channel_mappings", {})
+        with self.lock:
+            return dict(self.data["channel_mappings"])
     
     def set_channel_mapping(self, repo_name: str, channel_id: int):
         """チャンネル紐づけ情報を設定"""
-        self.data["channel_mappings"][repo_name] = channel_id
+        with self.lock:
+            self.data["channel_mappings"][repo_name] = channel_id
+        self.save_data()
+    
+    def remove_channel_mapping(self, repo_name: str):
+        """チャンネル紐づけ情報を削除"""
+        with self.lock:
+            if self.data["channel_mappings"].pop(repo_name, None) is None:
+                return
         self.save_data()
     
     def get_thread_mappings(self) -> Dict[str, int]:
         """スレッド紐づけ情報を取得"""
-        return self.data.get("thread_mappings", {})
+        with self.lock:
+            return dict(self.data["thread_mappings"])
     
     def set_thread_mapping(self, github_url: str, thread_id: int):
         """スレッド紐づけ情報を設定"""
-        self.data["thread_mappings"][github_url] = thread_id
+        with self.lock:
+            self.data["thread_mappings"][github_url] = thread_id
         self.save_data()
     
     def remove_thread_mapping(self, github_url: str):
         """スレッド紐づけ情報を削除"""
-        if github_url in self.data.get("thread_mappings", {}):
-            del self.data["thread_mappings"][github_url]
+        with self.lock:
+            self.data["thread_activity"].pop(github_url, None)
+            if self.data["thread_mappings"].pop(github_url, None) is None:
+                return
+        self.save_data()
+    
+    def remove_thread_mappings(self, github_urls: List[str]):
+        """複数のスレッド紐づけ情報をまとめて削除"""
+        with self.lock:
+            removed = [self.data["thread_mappings"].pop(url, None) for url in github_urls]
+            for url in github_urls:
+                self.data["thread_activity"].pop(url, None)
+        if any(thread_id is not None for thread_id in removed):
             self.save_data()
+    
+    def get_thread_activity(self) -> Dict[str, float]:
+        """スレッド紐づけの最終参照時刻を取得"""
+        with self.lock:
+            return dict(self.data["thread_activity"])
+    
+    def set_thread_activity(self, activity: Dict[str, float]):
+        """スレッド紐づけの最終参照時刻をまとめて設定"""
+        if not activity:
+            return
+        with self.lock:
+            self.data["thread_activity"].update(activity)
+        self.save_data()
+
+class BidirectionalMapping(MutableMapping):
+    """
+    正引きと逆引きの辞書を同期して保持するマッピング
+    
+    値から対応するキーをO(1)で引ける。同じ値を持つキーが複数ある場合は、
+    最初に登録されたキーを返す。
+    """
+    
+    def __init__(self, initial: Optional[Dict] = None):
+        self.forward: Dict = {}
+        self.reverse: Dict[Any, Dict] = {}
+        if initial:
+            self.update(initial)
+    
+    def __getitem__(self, key):
+        return self.forward[key]
+    
+    def __setitem__(self, key, value):
+        if key in self.forward:
+            self._remove_reverse(key, self.forward[key])
+        self.forward[key] = value
+        self.reverse.setdefault(value, {})[key] = None
+    
+    def __delitem__(self, key):
+        value = self.forward.pop(key)
+        self._remove_reverse(key, value)
+    
+    def __iter__(self):
+        return iter(self.forward)
+    
+    def __len__(self) -> int:
+        return len(self.forward)
+    
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.forward!r})"
+    
+    def _remove_reverse(self, key, value):
+        keys = self.reverse.get(value)
+        if keys is None:
+            return
+        keys.pop(key, None)
+        if not keys:
+            del self.reverse[value]
+    
+    def get_key(self, value, default=None):
+        """値に対応するキーを取得"""
+        keys = self.reverse.get(value)
+        if not keys:
+            return default
+        return next(iter(keys))
+
+def create_storage(backend: str = "json", storage_file: str = "comment_connector_data.json",
+                   sqlite_file: str = "comment_connector_data.db", flush_interval: float = 1.0):
+    """
+    設定に応じたストレージを作成
+    
+    Args:
+        backend: 'json' または 'sqlite'
+        storage_file: JSONファイルのパス（sqliteの場合は初回の移行元）
+        sqlite_file: SQLiteファイルのパス
+        flush_interval: JSONファイルへの書き込み間隔（秒）
+    
+    Returns:
+        PersistentStorage または SQLiteStorage
+    """
+    if backend == "sqlite":
+        from .sqlite_storage import SQLiteStorage
+        return SQLiteStorage(sqlite_file, json_file=storage_file)
+    if backend != "json":
+        logger.warning(f"Unknown storage backend '{backend}', falling back to json")
+    return PersistentStorage(storage_file, flush_interval)
 
 def extract_repo_and_issue_from_url(github_url: str) -> tuple[str, int, str]:
     """
@@ -89,6 +265,82 @@ def extract_repo_and_issue_from_url(github_url: str) -> tuple[str, int, str]:
         logger.error(f"Error parsing GitHub URL {github_url}: {e}")
         raise ValueError(f"Invalid GitHub URL format: {github_url}")
 
+class ThreadKey(NamedTuple):
+    """issue/PRを識別するキー（URL文字列の代わりに保持する）"""
+    repo: str
+    kind: str  # 'issues' or 'pull'
+    number: int
+    
+    def __str__(self) -> str:
+        return f"{self.repo}/{self.kind}/{self.number}"
+    
+    @classmethod
+    def parse(cls, value: Union["ThreadKey", str]) -> "ThreadKey":
+        """
+        ThreadKey、保存形式（repo/kind/number）またはGitHub URLからキーを作成
+        
+        Args:
+            value: 変換元の値
+        
+        Returns:
+            ThreadKey: 変換したキー
+        """
+        if isinstance(value, ThreadKey):
+            return value
+        if value.startswith(('https://', 'http://')):
+            repo_name, issue_number, issue_type = extract_repo_and_issue_from_url(value)
+            return cls(repo_name, issue_type, issue_number)
+        try:
+            repo_name, issue_type, issue_number = value.split('/')
+            return cls(repo_name, issue_type, int(issue_number))
+        except ValueError:
+            raise ValueError(f"Invalid thread key format: {value}")
+    
+    def to_url(self, organization: str) -> str:
+        """GitHubのURLに変換"""
+        return f"https://github.com/{organization}/{self.repo}/{self.kind}/{self.number}"
+
+def webhook_event_key(payload: Dict) -> Optional[ThreadKey]:
+    """
+    WebHookイベントの対象となるissue/PRのキーを取得
+    
+    Args:
+        payload: WebHookペイロード
+    
+    Returns:
+        ThreadKey: issue/PRのキー（issue/PRに関するイベントでない場合はNone）
+    """
+    target = payload.get('pull_request') or payload.get('issue')
+    if not isinstance(target, dict) or not target.get('html_url'):
+        return None
+    try:
+        return ThreadKey.parse(target['html_url'])
+    except ValueError:
+        return None
+
+def webhook_event_time(payload: Dict) -> Optional[float]:
+    """
+    WebHookイベントがGitHub上で発生した時刻を取得
+    
+    Args:
+        payload: WebHookペイロード
+    
+    Returns:
+        float: 発生時刻（UNIX時刻）。ペイロードに時刻が含まれない場合はNone
+    """
+    candidates = (
+        ('comment', 'updated_at'), ('review', 'submitted_at'),
+        ('pull_request', 'updated_at'), ('issue', 'updated_at'), ('repository', 'updated_at')
+    )
+    for obj_key, field in candidates:
+        value = (payload.get(obj_key) or {}).get(field)
+        if isinstance(value, str):
+            try:
+                return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+            except ValueError:
+                continue
+    return None
+
 def format_github_content(content: str, max_length: int = 1000) -> str:
     """
     GitHubコンテンツをDiscord表示用にフォーマット
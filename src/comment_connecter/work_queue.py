@@ -0,0 +1,101 @@
+"""
+WebHookイベントの非同期ワークキュー
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from common.metrics import get_registry
+
+logger = logging.getLogger(__name__)
+
+_metrics = get_registry()
+WEBHOOK_LATENCY = _metrics.histogram(
+    'kurono_webhook_latency_seconds', 'Time from webhook receipt until the event is processed', ['event']
+)
+WEBHOOK_QUEUE_WAIT = _metrics.histogram(
+    'kurono_webhook_queue_wait_seconds', 'Time webhook events spend waiting in the queue', ['event']
+)
+WEBHOOK_FAILURES = _metrics.counter(
+    'kurono_webhook_failures_total', 'Webhook events that raised while being processed', ['event']
+)
+
+# (event_type, delivery_id, payload, 受信時刻（monotonic）)
+WebhookEvent = Tuple[str, str, Dict[str, Any], float]
+EventHandler = Callable[[str, str, Dict[str, Any]], Awaitable[None]]
+
+
+class WebhookQueue:
+    """受信したWebHookイベントをワーカープールで順次処理する上限付きキュー"""
+
+    def __init__(self, handler: EventHandler, max_size: int = 1000, workers: int = 4):
+        self.handler = handler
+        self.max_size = max_size
+        self.worker_count = max(1, workers)
+        self.queue: Optional[asyncio.Queue] = None
+        self.workers: List[asyncio.Task] = []
+        self.stats = {'accepted': 0, 'rejected': 0, 'processed': 0, 'failed': 0}
+
+    @property
+    def depth(self) -> int:
+        """キューに溜まっているイベント数"""
+        return self.queue.qsize() if self.queue else 0
+
+    @property
+    def running(self) -> bool:
+        return bool(self.workers)
+
+    def start(self):
+        """ワーカーを起動"""
+        if self.running:
+            return
+        self.queue = asyncio.Queue(maxsize=self.max_size)
+        self.workers = [
+            asyncio.create_task(self._worker(i), name=f"webhook-worker-{i}")
+            for i in range(self.worker_count)
+        ]
+        logger.info(f"Webhook queue started (size={self.max_size}, workers={self.worker_count})")
+
+    def submit(self, event_type: str, delivery_id: str, payload: Dict[str, Any]) -> bool:
+        """イベントをキューに追加する。キューが満杯の場合はFalseを返す"""
+        if not self.running:
+            self.start()
+        try:
+            self.queue.put_nowait((event_type, delivery_id, payload, time.monotonic()))
+        except asyncio.QueueFull:
+            self.stats['rejected'] += 1
+            logger.warning(f"Webhook queue is full, rejecting delivery={delivery_id} (depth={self.depth})")
+            return False
+        self.stats['accepted'] += 1
+        return True
+
+    async def _worker(self, index: int):
+        while True:
+            event_type, delivery_id, payload, received_at = await self.queue.get()
+            WEBHOOK_QUEUE_WAIT.observe(time.monotonic() - received_at, event=event_type)
+            try:
+                await self.handler(event_type, delivery_id, payload)
+                self.stats['processed'] += 1
+            except Exception as e:
+                self.stats['failed'] += 1
+                WEBHOOK_FAILURES.inc(event=event_type)
+                logger.error(f"Error processing webhook (delivery={delivery_id}): {e}", exc_info=True)
+            finally:
+                WEBHOOK_LATENCY.observe(time.monotonic() - received_at, event=event_type)
+                self.queue.task_done()
+
+    async def stop(self, timeout: float = 10.0):
+        """残りのイベントを処理してからワーカーを停止"""
+        if not self.running:
+            return
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Webhook queue did not drain within {timeout}s, {self.depth} events dropped")
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+        logger.info("Webhook queue stopped")
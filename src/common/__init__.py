@@ -0,0 +1,6 @@
+"""
+common - 各モジュールで共有するユーティリティ
+
+GitHub APIクライアントなど、sync_channel と comment_connecter の両方から
+利用する機能を提供します。
+"""
@@ -0,0 +1,90 @@
+"""
+スラッシュコマンドの定義が変わった場合のみ CommandTree を同期する
+
+tree.sync() はスコープ（グローバル・ギルドごと）ごとにレート制限のあるREST呼び出しになるため、
+コマンド定義のハッシュをスコープごとにファイルに保存し、前回の同期から変わったスコープだけを同期する。
+"""
+
+import hashlib
+import json
+import logging
+import os
+from typing import Dict, Iterable, List, Optional
+
+import discord
+
+from .files import atomic_write_json
+
+logger = logging.getLogger(__name__)
+
+
+def command_hash(tree: discord.app_commands.CommandTree, guild: Optional[discord.abc.Snowflake] = None) -> str:
+    """スコープのコマンド定義（tree.sync() で送信される内容）のハッシュ"""
+    payload = sorted(
+        (command.to_dict(tree) for command in tree.get_commands(guild=guild)),
+        key=lambda command: (command.get('type', 1), command['name'])
+    )
+    data = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(',', ':'), default=str)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+def scope_key(application_id: Optional[int], guild: Optional[discord.abc.Snowflake] = None) -> str:
+    """ハッシュを保存するキー（別のBotのトークンで起動した場合は同期し直す）"""
+    return f"{application_id}:{'global' if guild is None else guild.id}"
+
+
+class CommandSyncState:
+    """スコープごとに最後に同期したコマンド定義のハッシュを保持"""
+
+    def __init__(self, storage_file: str = "command_sync_state.json"):
+        self.storage_file = storage_file
+        self.hashes: Dict[str, str] = {}
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.storage_file):
+            return
+        try:
+            with open(self.storage_file, 'r', encoding='utf-8') as f:
+                self.hashes = json.load(f)
+        except Exception as e:
+            logger.error(f"Error loading command sync state from {self.storage_file}: {e}")
+
+    def save(self):
+        try:
+            atomic_write_json(self.storage_file, self.hashes, indent=2)
+        except Exception as e:
+            logger.error(f"Error saving command sync state to {self.storage_file}: {e}")
+
+
+async def sync_commands(tree: discord.app_commands.CommandTree, application_id: Optional[int],
+                        guilds: Iterable[discord.abc.Snowflake], state: CommandSyncState,
+                        force: bool = False) -> List[str]:
+    """
+    コマンド定義が前回の同期から変わったスコープのみ tree.sync() を呼び出す
+
+    Args:
+        tree: 同期するCommandTree
+        application_id: BotのアプリケーションID
+        guilds: ギルドごとのコマンドを同期するギルド
+        state: 前回同期したハッシュ
+        force: Trueの場合はハッシュに関係なくすべてのスコープを同期
+
+    Returns:
+        list: 同期したスコープ（global またはギルドID）
+    """
+    synced = []
+    for guild in [None, *guilds]:
+        key = scope_key(application_id, guild)
+        digest = command_hash(tree, guild)
+        scope = 'global' if guild is None else str(guild.id)
+        if not force and state.hashes.get(key) == digest:
+            logger.debug(f"Command tree unchanged for {scope}, skipping sync")
+            continue
+        await tree.sync(guild=guild)
+        # 同期に成功したスコープから保存し、途中で失敗しても次回は残りのスコープだけを同期する
+        state.hashes[key] = digest
+        state.save()
+        synced.append(scope)
+        logger.info(f"Synced command tree for {scope}")
+    return synced
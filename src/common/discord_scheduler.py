@@ -0,0 +1,278 @@
+"""
+Discord REST APIへの送信を優先度順に調整するスケジューラ
+
+スラッシュコマンドの応答（INTERACTIVE）、WebHookの通知（NOTIFICATION）、
+リポジトリ同期などの一括処理（BACKGROUND）が同じレート制限を奪い合わないよう、
+すべてのモジュールはこのスケジューラ経由でDiscordにリクエストを送信する。
+
+レート制限はレスポンスヘッダー（X-RateLimit-*）から学習する。ヘッダーは
+discord.Client の http_trace に trace_config() を渡すことで取得する。
+"""
+
+import asyncio
+import logging
+import re
+import time
+from collections import deque
+from enum import IntEnum
+from typing import Any, Awaitable, Callable, Deque, Dict, Mapping, Optional, Tuple
+
+import aiohttp
+import discord
+
+import config
+from common.metrics import get_registry
+
+logger = logging.getLogger(__name__)
+
+_metrics = get_registry()
+DISCORD_LATENCY = _metrics.histogram(
+    'kurono_discord_request_seconds', 'Duration of Discord API calls made through the scheduler', ['priority']
+)
+DISCORD_QUEUE_WAIT = _metrics.histogram(
+    'kurono_discord_queue_wait_seconds', 'Time Discord API calls wait in the scheduler', ['priority']
+)
+DISCORD_ERRORS = _metrics.counter(
+    'kurono_discord_request_errors_total', 'Discord API calls that failed', ['priority', 'status']
+)
+
+
+class Priority(IntEnum):
+    """送信の優先度（値が小さいほど優先）"""
+    INTERACTIVE = 0   # スラッシュコマンドの応答など
+    NOTIFICATION = 1  # WebHookの通知
+    BACKGROUND = 2    # リポジトリ同期などの一括処理
+
+
+# リクエストURLのAPIのパス（/api/v10/ 以降）
+_API_PATH = re.compile(r'/api/v\d+/([^?]*)')
+# レート制限のバケットを決めるメジャーパラメータ
+_MAJOR_PARAMETER = re.compile(r'(channels|guilds|webhooks)/(\d+)(.*)')
+# メジャーパラメータ以外のID・絵文字（値が異なっても同じバケットを使う）
+_MINOR_PARAMETER = re.compile(r'/(?:\d+|(?<=/reactions/)[^/]+)(?=/|$)')
+
+# 保持するバケット数の上限（超えた場合はリセット済みのものを削除）
+_MAX_BUCKETS = 1000
+
+
+def route_key(method: str, resource: str, resource_id: Any, path: str = '') -> str:
+    """
+    ルート（レート制限のバケット）のキーを作成
+
+    Discordのレート制限は同じチャンネルでもメソッド・エンドポイントごとに別のバケットのため、
+    メソッド・エンドポイントのテンプレート・メジャーパラメータの組をキーにする。
+
+    Args:
+        method: HTTPメソッド
+        resource: メジャーパラメータの種類（channels / guilds / webhooks）
+        resource_id: メジャーパラメータのID
+        path: メジャーパラメータ以降のパス（メッセージIDなどは {id} にする）
+
+    Returns:
+        str: ルートのキー（例: POST channels/123/messages/{id}/threads）
+    """
+    return f"{method.upper()} {resource}/{resource_id}{path}"
+
+
+def route_from_url(method: str, url: Any) -> Optional[str]:
+    """リクエストのメソッドとURLからルートのキーを取得（メジャーパラメータを含まない場合はNone）"""
+    match = _API_PATH.search(str(url))
+    major = _MAJOR_PARAMETER.fullmatch(match.group(1)) if match else None
+    if major is None:
+        return None
+    return route_key(method, major.group(1), major.group(2), _MINOR_PARAMETER.sub('/{id}', major.group(3)))
+
+
+class DiscordScheduler:
+    """優先度とルートごとのレート制限に基づいてDiscordへのリクエストを順番に実行"""
+
+    def __init__(self, max_concurrency: int = 4):
+        self.max_concurrency = max(1, max_concurrency)
+        # route -> {'remaining': 残りリクエスト数, 'reset_at': リセット時刻（monotonic）}
+        self.buckets: Dict[str, Dict[str, float]] = {}
+        self.global_reset_at = 0.0
+        self.stats = {'submitted': 0, 'completed': 0, 'failed': 0, 'rate_limited': 0}
+        self._reset(None)
+
+    def _reset(self, loop: Optional[asyncio.AbstractEventLoop]):
+        self._loop = loop
+        self.queues: Dict[Priority, Deque[Tuple[Optional[str], asyncio.Future]]] = {
+            priority: deque() for priority in Priority
+        }
+        self.running = {priority: 0 for priority in Priority}
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    @property
+    def depth(self) -> Dict[str, int]:
+        """優先度ごとの待機中のリクエスト数"""
+        return {priority.name.lower(): len(queue) for priority, queue in self.queues.items()}
+
+    async def submit(self, priority: Priority, func: Callable[..., Awaitable[Any]], *args,
+                     route: Optional[str] = None, **kwargs) -> Any:
+        """
+        リクエストを優先度順に実行し、結果を返す
+
+        Args:
+            priority: 優先度
+            func: Discord APIを呼び出すコルーチン関数（thread.send など）
+            *args: funcに渡す引数
+            route: レート制限のバケット（route_key() で作成）。Noneの場合はバケットを考慮しない
+            **kwargs: funcに渡すキーワード引数
+
+        Returns:
+            funcの戻り値
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._reset(loop)
+
+        label = priority.name.lower()
+        submitted_at = time.monotonic()
+        grant = loop.create_future()
+        self.queues[priority].append((route, grant))
+        self.stats['submitted'] += 1
+        self._pump()
+        try:
+            await grant
+        except asyncio.CancelledError:
+            if grant.done() and not grant.cancelled():
+                self._release(priority)
+            else:
+                grant.cancel()
+            raise
+
+        started_at = time.monotonic()
+        DISCORD_QUEUE_WAIT.observe(started_at - submitted_at, priority=label)
+        try:
+            result = await func(*args, **kwargs)
+        except discord.HTTPException as e:
+            self.stats['failed'] += 1
+            DISCORD_ERRORS.inc(priority=label, status=e.status)
+            response = getattr(e, 'response', None)
+            if e.status == 429 and response is not None:
+                self.observe(route, e.status, response.headers)
+            raise
+        except Exception:
+            self.stats['failed'] += 1
+            DISCORD_ERRORS.inc(priority=label, status='error')
+            raise
+        finally:
+            DISCORD_LATENCY.observe(time.monotonic() - started_at, priority=label)
+            self._release(priority)
+        self.stats['completed'] += 1
+        return result
+
+    def _limit(self, priority: Priority) -> Optional[int]:
+        """優先度ごとの同時実行数の上限（INTERACTIVEは無制限）"""
+        if priority == Priority.INTERACTIVE:
+            return None
+        if priority == Priority.BACKGROUND:
+            # 通知用に1枠を残す
+            return max(1, self.max_concurrency - 1)
+        return self.max_concurrency
+
+    def _release(self, priority: Priority):
+        self.running[priority] -= 1
+        self._pump()
+
+    def _blocked_until(self, route: Optional[str], now: float) -> float:
+        """ルートがレート制限中であれば解除される時刻を返す（制限中でなければ0）"""
+        if route is None:
+            return 0.0
+        until = self.global_reset_at
+        bucket = self.buckets.get(route)
+        if bucket and bucket['remaining'] <= 0:
+            until = max(until, bucket['reset_at'])
+        return until if until > now else 0.0
+
+    def _pump(self):
+        """実行可能なリクエストを優先度順に開始"""
+        if self._loop is None:
+            return
+        now = time.monotonic()
+        earliest = None
+        for priority in Priority:
+            queue = self.queues[priority]
+            limit = self._limit(priority)
+            busy = sum(self.running[p] for p in Priority if p != Priority.INTERACTIVE)
+            for job in list(queue):
+                route, grant = job
+                if grant.done():
+                    queue.remove(job)
+                    continue
+                if limit is not None and (busy >= self.max_concurrency or self.running[priority] >= limit):
+                    break
+                blocked_until = self._blocked_until(route, now)
+                if blocked_until:
+                    earliest = blocked_until if earliest is None else min(earliest, blocked_until)
+                    continue
+                queue.remove(job)
+                self.running[priority] += 1
+                if priority != Priority.INTERACTIVE:
+                    busy += 1
+                bucket = self.buckets.get(route) if route else None
+                if bucket and bucket['reset_at'] > now:
+                    # レスポンスヘッダーで更新されるまでの見込み値
+                    bucket['remaining'] -= 1
+                grant.set_result(None)
+
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if earliest is not None:
+            self._timer = self._loop.call_later(earliest - now, self._pump)
+
+    def observe(self, route: Optional[str], status: int, headers: Mapping[str, str]):
+        """レスポンスヘッダーからレート制限の状態を更新"""
+        now = time.monotonic()
+        reset_after = headers.get('X-RateLimit-Reset-After') or headers.get('Retry-After')
+        if status == 429:
+            self.stats['rate_limited'] += 1
+            delay = float(reset_after or 1)
+            if headers.get('X-RateLimit-Global') == 'true' or headers.get('X-RateLimit-Scope') == 'global':
+                self.global_reset_at = now + delay
+                logger.warning(f"Discord global rate limit hit, pausing for {delay:.2f}s")
+                self._pump()
+                return
+            if headers.get('X-RateLimit-Scope') == 'shared':
+                # リソースごとの共有の制限で、このルートのバケットは使い切っていない（discord.pyが再送する）
+                logger.info(f"Discord shared rate limit hit on {route}, retrying after {delay:.2f}s")
+            elif route:
+                self.buckets[route] = {'remaining': 0, 'reset_at': now + delay}
+                logger.warning(f"Discord rate limit hit on {route}, pausing for {delay:.2f}s")
+        elif route and reset_after is not None and headers.get('X-RateLimit-Remaining') is not None:
+            self.buckets[route] = {
+                'remaining': int(headers['X-RateLimit-Remaining']),
+                'reset_at': now + float(reset_after)
+            }
+
+        if len(self.buckets) > _MAX_BUCKETS:
+            self.buckets = {key: bucket for key, bucket in self.buckets.items() if bucket['reset_at'] > now}
+        self._pump()
+
+    def trace_config(self) -> aiohttp.TraceConfig:
+        """discord.Client(http_trace=...) に渡すTraceConfig（レスポンスヘッダーを学習する）"""
+        trace = aiohttp.TraceConfig()
+
+        async def on_request_end(session, context, params):
+            self.observe(route_from_url(params.method, params.url), params.response.status, params.response.headers)
+
+        trace.on_request_end.append(on_request_end)
+        return trace
+
+
+# プロセス全体で共有するスケジューラ
+_scheduler: Optional[DiscordScheduler] = None
+
+
+def get_scheduler() -> DiscordScheduler:
+    """共有のスケジューラを取得"""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = DiscordScheduler(config.DISCORD_SCHEDULER_CONCURRENCY)
+    return _scheduler
+
+
+async def interactive(func: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+    """スラッシュコマンドの応答など、ユーザー操作への応答を最優先で送信"""
+    return await get_scheduler().submit(Priority.INTERACTIVE, func, *args, **kwargs)
@@ -0,0 +1,30 @@
+"""
+ファイル操作のヘルパー関数
+"""
+
+import json
+import os
+import tempfile
+from typing import Any
+
+def atomic_write_json(path: str, data: Any, indent: int = None):
+    """
+    一時ファイルに書き込んでからrenameすることで、JSONファイルをアトミックに書き込み
+    
+    Args:
+        path: 書き込み先のパス
+        data: JSONに変換するデータ
+        indent: インデント（Noneの場合は改行なし）
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + '.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=indent)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
@@ -0,0 +1,216 @@
+"""
+aiohttpベースの非同期GitHub RESTクライアント
+
+プロセス内で1つのコネクションプール（aiohttp.ClientSession）を共有し、
+イベントループをブロックせずにGitHub APIを呼び出す。
+"""
+
+import logging
+import time
+from typing import Any, AsyncIterator, Dict, List, Mapping, NamedTuple, Optional
+
+import aiohttp
+from yarl import URL
+
+import config
+from common.http_cache import ETagCache
+from common.metrics import get_registry
+from common.rate_limit import RateLimitBudget, get_budget, is_rate_limit_error
+
+logger = logging.getLogger(__name__)
+
+_metrics = get_registry()
+GITHUB_LATENCY = _metrics.histogram(
+    'kurono_github_request_seconds', 'Duration of GitHub API calls (excluding rate limit waits)', ['method']
+)
+GITHUB_ERRORS = _metrics.counter(
+    'kurono_github_request_errors_total', 'GitHub API calls that failed', ['method', 'status']
+)
+
+# プロセス全体で共有するセッション
+_session: Optional[aiohttp.ClientSession] = None
+
+
+def get_session() -> aiohttp.ClientSession:
+    """共有のClientSessionを取得（未作成・クローズ済みの場合は作成）"""
+    global _session
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(limit=config.GITHUB_HTTP_POOL_SIZE, keepalive_timeout=60)
+        _session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=config.GITHUB_HTTP_TIMEOUT)
+        )
+    return _session
+
+
+async def close_session():
+    """共有のClientSessionを閉じる"""
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+
+class GitHubHTTPError(Exception):
+    """GitHub APIがエラーを返した場合の例外"""
+
+    def __init__(self, status: int, message: str, headers: Optional[Mapping[str, str]] = None):
+        super().__init__(f"GitHub API error {status}: {message}")
+        self.status = status
+        self.message = message
+        self.headers = headers or {}
+
+
+class GitHubResponse(NamedTuple):
+    status: int
+    data: Any
+    headers: Mapping[str, str]
+    next_url: Optional[str]
+
+
+def parse_next_link(link_header: Optional[str]) -> Optional[str]:
+    """Linkヘッダーから次ページのURLを取得"""
+    if not link_header:
+        return None
+    for part in link_header.split(','):
+        section = part.split(';')
+        if len(section) < 2:
+            continue
+        url = section[0].strip().strip('<>')
+        if any(s.strip() == 'rel="next"' for s in section[1:]):
+            return url
+    return None
+
+
+class GitHubClient:
+    """このBotで利用するGitHub REST APIの非同期クライアント"""
+
+    def __init__(self, token: Optional[str], base_url: str = None,
+                 session: Optional[aiohttp.ClientSession] = None, cache: Optional[ETagCache] = None,
+                 budget: Optional[RateLimitBudget] = None):
+        self.token = token
+        self.base_url = (base_url or config.GITHUB_API_URL).rstrip('/')
+        self._session = session
+        # GETリクエストのETagキャッシュ（Noneの場合は無効）
+        self.cache = cache
+        # 同じトークンを使うすべてのクライアントで共有するレート制限の予算
+        self.budget = budget or get_budget()
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        return self._session or get_session()
+
+    def _headers(self) -> Dict[str, str]:
+        headers = {
+            'Accept': 'application/vnd.github+json',
+            'X-GitHub-Api-Version': '2022-11-28',
+            'User-Agent': 'kurono-bot'
+        }
+        if self.token:
+            headers['Authorization'] = f"Bearer {self.token}"
+        return headers
+
+    def _url(self, path: str) -> str:
+        if path.startswith(('https://', 'http://')):
+            return path
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    async def request(self, method: str, path: str, params: Optional[Dict[str, Any]] = None,
+                      json: Any = None, interactive: bool = False) -> GitHubResponse:
+        """
+        APIリクエストを送信し、エラーの場合はGitHubHTTPErrorを送出
+        
+        レート制限（セカンダリレート制限を含む）に達した場合は、待機してから1回だけ再送する。
+        interactive=True のリクエストはレート制限の確保分を使用できる。
+        """
+        try:
+            return await self._request(method, path, params, json, interactive)
+        except GitHubHTTPError as e:
+            if not is_rate_limit_error(e.status, e.message, e.headers):
+                raise
+            self.budget.record_rate_limited(e.headers)
+            return await self._request(method, path, params, json, interactive)
+
+    async def _request(self, method: str, path: str, params: Optional[Dict[str, Any]],
+                       json: Any, interactive: bool) -> GitHubResponse:
+        await self.budget.acquire(interactive)
+        url = URL(self._url(path), encoded=True)
+        if params:
+            url = url.update_query({key: str(value) for key, value in params.items()})
+        cache_key = str(url)
+
+        headers = self._headers()
+        cached = self.cache.get(cache_key) if self.cache is not None and method == 'GET' else None
+        if cached:
+            headers['If-None-Match'] = cached['etag']
+
+        started_at = time.monotonic()
+        try:
+            return await self._send(method, url, headers, json, cached, cache_key)
+        except GitHubHTTPError as e:
+            GITHUB_ERRORS.inc(method=method, status=e.status)
+            raise
+        except Exception:
+            GITHUB_ERRORS.inc(method=method, status='error')
+            raise
+        finally:
+            GITHUB_LATENCY.observe(time.monotonic() - started_at, method=method)
+
+    async def _send(self, method: str, url: URL, headers: Dict[str, str], json: Any,
+                    cached: Optional[Dict], cache_key: str) -> GitHubResponse:
+        async with self.session.request(method, url, json=json, headers=headers) as response:
+            # 大文字小文字を区別しないヘッダー（CIMultiDictProxy）のまま扱う
+            headers = response.headers
+            self.budget.update(headers)
+            if response.status == 304 and cached:
+                # 変更なし（プライマリのレート制限にカウントされない）
+                self.cache.record(hit=True)
+                return GitHubResponse(200, cached['data'], headers, cached['next_url'])
+
+            if response.status >= 400:
+                try:
+                    body = await response.json(content_type=None)
+                    message = body.get('message', '') if isinstance(body, dict) else str(body)
+                except Exception:
+                    message = await response.text()
+                raise GitHubHTTPError(response.status, message, headers)
+
+            data = await response.json(content_type=None) if response.status != 204 else None
+            next_url = parse_next_link(headers.get('Link'))
+            if self.cache is not None and method == 'GET':
+                self.cache.record(hit=False)
+                if headers.get('ETag'):
+                    self.cache.put(cache_key, headers['ETag'], data, next_url)
+            return GitHubResponse(response.status, data, headers, next_url)
+
+    async def iter_pages(self, path: str, params: Optional[Dict[str, Any]] = None) -> AsyncIterator[List[Dict]]:
+        """ページネーションされた一覧をページ単位で取得"""
+        params = {'per_page': 100, **(params or {})}
+        response = await self.request('GET', path, params=params)
+        yield response.data
+        while response.next_url:
+            # 次ページのURLにはクエリパラメータが含まれている
+            response = await self.request('GET', response.next_url)
+            yield response.data
+
+    async def paginate(self, path: str, params: Optional[Dict[str, Any]] = None) -> AsyncIterator[Dict]:
+        """ページネーションされた一覧を1件ずつ取得"""
+        async for page in self.iter_pages(path, params):
+            for item in page:
+                yield item
+
+    def iter_org_repos(self, organization: str, **params) -> AsyncIterator[Dict]:
+        """organizationのリポジトリ一覧を取得"""
+        return self.paginate(f"/orgs/{organization}/repos", params)
+
+    async def get_repo(self, owner: str, repo: str) -> Dict:
+        """リポジトリ情報を取得"""
+        response = await self.request('GET', f"/repos/{owner}/{repo}")
+        return response.data
+
+    async def create_issue_comment(self, owner: str, repo: str, issue_number: int, body: str) -> Dict:
+        """issue/PRにコメントを投稿（Discordからの操作のため確保分を使用する）"""
+        response = await self.request(
+            'POST', f"/repos/{owner}/{repo}/issues/{issue_number}/comments", json={'body': body}, interactive=True
+        )
+        return response.data
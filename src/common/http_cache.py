@@ -0,0 +1,83 @@
+"""
+ETagを使った条件付きリクエスト用のHTTPレスポンスキャッシュ
+
+GitHub APIは `If-None-Match` に一致するETagを送ると304を返し、
+このレスポンスはプライマリのレート制限にカウントされない。
+"""
+
+import asyncio
+import json
+import logging
+import os
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from common.files import atomic_write_json
+
+logger = logging.getLogger(__name__)
+
+
+class ETagCache:
+    """URL（ページ番号などのクエリを含む）ごとにETagとレスポンスを保持するLRUキャッシュ"""
+
+    def __init__(self, storage_file: Optional[str] = "github_http_cache.json", max_entries: int = 500):
+        self.storage_file = storage_file
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.dirty = False
+        self.stats = {'hits': 0, 'misses': 0}
+        self.load()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, url: str) -> Optional[Dict[str, Any]]:
+        """キャッシュされたエントリ（etag, data, next_url）を取得"""
+        entry = self.entries.get(url)
+        if entry is not None:
+            self.entries.move_to_end(url)
+        return entry
+
+    def put(self, url: str, etag: str, data: Any, next_url: Optional[str]):
+        """レスポンスをキャッシュ"""
+        self.entries[url] = {'etag': etag, 'data': data, 'next_url': next_url}
+        self.entries.move_to_end(url)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        self.dirty = True
+
+    def record(self, hit: bool):
+        self.stats['hits' if hit else 'misses'] += 1
+
+    def load(self):
+        """ファイルからキャッシュを読み込み"""
+        if not self.storage_file or not os.path.exists(self.storage_file):
+            return
+        try:
+            with open(self.storage_file, 'r', encoding='utf-8') as f:
+                self.entries = OrderedDict(json.load(f))
+            logger.info(f"Loaded {len(self.entries)} cached GitHub responses from {self.storage_file}")
+        except Exception as e:
+            logger.error(f"Error loading HTTP cache from {self.storage_file}: {e}")
+
+    def save(self):
+        """キャッシュをファイルに保存"""
+        if not self.storage_file or not self.dirty:
+            return
+        try:
+            atomic_write_json(self.storage_file, self.entries)
+            self.dirty = False
+        except Exception as e:
+            logger.error(f"Error saving HTTP cache to {self.storage_file}: {e}")
+
+    async def save_async(self):
+        """キャッシュをイベントループ外でファイルに保存"""
+        if not self.storage_file or not self.dirty:
+            return
+        snapshot = OrderedDict(self.entries)
+        self.dirty = False
+        try:
+            await asyncio.to_thread(atomic_write_json, self.storage_file, snapshot)
+        except Exception as e:
+            self.dirty = True
+            logger.error(f"Error saving HTTP cache to {self.storage_file}: {e}")
@@ -0,0 +1,185 @@
+"""
+重いモジュールの遅延インポートとインポート時間の計測
+
+lazy_import() は最初に属性を参照した時点でモジュールをインポートするプロキシを返すため、
+設定の検証だけで終了するスクリプトや、使わない機能のモジュールを起動時に読み込まずに済む。
+measure_imports() は別プロセスで `python -X importtime` を実行し、コールドスタート時の
+インポート時間をモジュールごとに集計する（scripts/import_report.py とテストで使用）。
+"""
+
+import importlib
+import os
+import subprocess
+import sys
+import threading
+from types import ModuleType
+from typing import Any, Callable, Dict, List, Mapping, NamedTuple, Optional, Sequence
+
+
+class LazyModule(ModuleType):
+    """最初に属性を参照した時点でインポートするモジュールのプロキシ"""
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.__dict__['_lazy_module'] = None
+        self.__dict__['_lazy_lock'] = threading.Lock()
+
+    def _load(self) -> ModuleType:
+        module = self.__dict__['_lazy_module']
+        if module is None:
+            with self.__dict__['_lazy_lock']:
+                module = self.__dict__['_lazy_module']
+                if module is None:
+                    module = importlib.import_module(self.__name__)
+                    self.__dict__['_lazy_module'] = module
+        return module
+
+    @property
+    def is_loaded(self) -> bool:
+        return self.__dict__['_lazy_module'] is not None
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._load(), name)
+
+    def __dir__(self) -> List[str]:
+        return dir(self._load())
+
+    def __repr__(self) -> str:
+        state = 'loaded' if self.is_loaded else 'not loaded'
+        return f"<lazy module '{self.__name__}' ({state})>"
+
+
+def lazy_import(name: str) -> ModuleType:
+    """
+    モジュールを遅延インポートする
+
+    インポート済みの場合はそのモジュールを返す。
+
+    Args:
+        name: モジュール名（例: 'discord', 'logging.handlers'）
+
+    Returns:
+        ModuleType: 最初の属性の参照でインポートするプロキシ
+    """
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    return LazyModule(name)
+
+
+def lazy_exports(package: str, exports: Mapping[str, str]) -> Callable[[str], Any]:
+    """
+    パッケージの __init__ で公開する名前を参照時にインポートする __getattr__ を作成する
+
+    Args:
+        package: パッケージ名（__name__）
+        exports: 公開する名前と定義されているサブモジュール（'.sync_channel' など）
+
+    Returns:
+        Callable: パッケージの __getattr__
+    """
+    def __getattr__(name: str) -> Any:
+        if name not in exports:
+            raise AttributeError(f"module '{package}' has no attribute '{name}'")
+        value = getattr(importlib.import_module(exports[name], package), name)
+        # 2回目以降はパッケージの属性として直接参照される
+        setattr(sys.modules[package], name, value)
+        return value
+    return __getattr__
+
+
+class ImportTime(NamedTuple):
+    """`-X importtime` の1行（時間はマイクロ秒）"""
+    name: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+def parse_importtime(output: str) -> List[ImportTime]:
+    """`python -X importtime` の標準エラー出力を解析する（インポートされた順）"""
+    entries = []
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            # 見出しの行
+            continue
+        name = fields[2].rstrip()
+        stripped = name.lstrip()
+        entries.append(ImportTime(
+            name=stripped,
+            self_us=int(fields[0]),
+            cumulative_us=int(fields[1]),
+            depth=(len(name) - len(stripped) - 1) // 2
+        ))
+    return entries
+
+
+class ImportReport(NamedTuple):
+    """コールドインポートの計測結果"""
+    module: str
+    entries: List[ImportTime]
+
+    @property
+    def total_ms(self) -> float:
+        """最上位のインポート（site などの起動処理を含む）の合計"""
+        return sum(entry.cumulative_us for entry in self.entries if entry.depth == 0) / 1000
+
+    @property
+    def module_ms(self) -> float:
+        """対象のモジュールのインポートにかかった時間"""
+        for entry in self.entries:
+            if entry.depth == 0 and entry.name == self.module:
+                return entry.cumulative_us / 1000
+        return 0.0
+
+    def slowest(self, count: int = 20, cumulative: bool = True) -> List[ImportTime]:
+        key = (lambda entry: entry.cumulative_us) if cumulative else (lambda entry: entry.self_us)
+        return sorted(self.entries, key=key, reverse=True)[:count]
+
+
+def measure_imports(module: str, python: str = sys.executable, cwd: Optional[str] = None,
+                    path: Sequence[str] = (), env: Optional[Dict[str, str]] = None) -> ImportReport:
+    """
+    新しいプロセスでモジュールをインポートし、インポート時間を計測する
+
+    Args:
+        module: インポートするモジュール名（例: 'src.main'）
+        python: Pythonの実行ファイル
+        cwd: 実行するディレクトリ
+        path: PYTHONPATHの先頭に追加するディレクトリ
+        env: 追加する環境変数
+
+    Returns:
+        ImportReport: モジュールごとのインポート時間
+    """
+    process_env = {**os.environ, **(env or {})}
+    if path:
+        process_env['PYTHONPATH'] = os.pathsep.join(
+            [*path, *filter(None, [process_env.get('PYTHONPATH')])]
+        )
+    # バイトコードのキャッシュは使い、インポート処理そのものの時間を計測する
+    process_env.pop('PYTHONDONTWRITEBYTECODE', None)
+    result = subprocess.run(
+        [python, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=cwd, env=process_env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        errors = [line for line in result.stderr.splitlines() if not line.startswith('import time:')]
+        raise RuntimeError(f"Failed to import {module}: {' '.join(errors[-3:])}")
+    return ImportReport(module, parse_importtime(result.stderr))
+
+
+def format_report(report: ImportReport, top: int = 20, budget_ms: Optional[float] = None) -> str:
+    """インポート時間の多いモジュールの一覧を表示用に整形する"""
+    lines = [f"{report.module}: {report.module_ms:.1f}ms（起動処理を含む合計 {report.total_ms:.1f}ms）"]
+    if budget_ms is not None:
+        status = 'OK' if report.module_ms <= budget_ms else 'OVER'
+        lines.append(f"budget: {budget_ms:.0f}ms [{status}]")
+    lines.append(f"{'cumulative':>12} {'self':>10}  module")
+    for entry in report.slowest(top):
+        lines.append(f"{entry.cumulative_us / 1000:>10.1f}ms {entry.self_us / 1000:>8.1f}ms  "
+                     f"{'  ' * entry.depth}{entry.name}")
+    return '\n'.join(lines)
@@ -0,0 +1,160 @@
+"""
+イベントループの遅延監視とサンプリングプロファイラ
+
+LoopMonitor はイベントループ上で一定間隔のハートビートを動かし、別スレッドの
+ウォッチドッグがハートビートの途絶（ループをブロックしている同期処理）を検出すると、
+その時点のループスレッドのスタックを記録する。
+
+sample_stacks() は指定時間すべてのスレッドのスタックを定期的に取得し、
+flamegraph.pl や speedscope で読み込める collapsed stack 形式で集計する。
+"""
+
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import Counter, deque
+from typing import Any, Deque, Dict, List, Optional
+
+import config
+from common.metrics import get_registry
+
+logger = logging.getLogger(__name__)
+
+_metrics = get_registry()
+LOOP_LAG = _metrics.histogram(
+    'kurono_event_loop_lag_seconds', 'Delay of the event loop heartbeat beyond its schedule',
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+)
+LOOP_STALLS = _metrics.counter('kurono_event_loop_stalls_total', 'Event loop stalls longer than the threshold')
+
+# プロファイラの最大実行時間（秒）
+MAX_PROFILE_SECONDS = 60
+
+
+def _frame_names(frame) -> List[str]:
+    """フレームから呼び出し元→呼び出し先の順に関数名（ファイル名:関数名）を取得"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        filename = code.co_filename.rsplit('/', 1)[-1]
+        names.append(f"{filename}:{code.co_name}")
+        frame = frame.f_back
+    names.reverse()
+    return names
+
+
+def sample_stacks(seconds: float, interval: float = 0.005) -> Dict[str, int]:
+    """
+    すべてのスレッドのスタックを一定間隔で取得し、collapsed stack ごとの件数を返す
+
+    呼び出したスレッド自身は対象外。イベントループをブロックしないよう
+    asyncio.to_thread() などで別スレッドから呼び出す。
+
+    Args:
+        seconds: サンプリングする時間（秒）
+        interval: サンプリング間隔（秒）
+
+    Returns:
+        dict: "スレッド名;呼び出し元;...;呼び出し先" -> サンプル数
+    """
+    own_id = threading.get_ident()
+    counts: Counter = Counter()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id:
+                continue
+            stack = [names.get(thread_id, str(thread_id))] + _frame_names(frame)
+            counts[";".join(stack)] += 1
+        time.sleep(interval)
+    return dict(counts)
+
+
+def render_collapsed(counts: Dict[str, int]) -> str:
+    """collapsed stack 形式（1行に "stack count"）で出力"""
+    return "".join(f"{stack} {count}\n" for stack, count in sorted(counts.items()))
+
+
+class LoopMonitor:
+    """イベントループのハートビートを監視し、閾値を超えるブロックをスタック付きで記録"""
+
+    def __init__(self, threshold_ms: float = 250, interval: float = 0.1, history: int = 50):
+        self.threshold = threshold_ms / 1000
+        self.interval = interval
+        # 検出したブロック（新しいものが後ろ）
+        self.stalls: Deque[Dict[str, Any]] = deque(maxlen=history)
+        self.last_beat = 0.0
+        self._loop_thread_id: Optional[int] = None
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._heartbeat_task is not None
+
+    def start(self):
+        """実行中のイベントループの監視を開始（開始済みの場合は何もしない）"""
+        if self.running:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self.last_beat = time.monotonic()
+        self._stopped.clear()
+        self._heartbeat_task = asyncio.get_running_loop().create_task(self._heartbeat())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+        logger.info(f"Event loop monitor started (threshold={self.threshold * 1000:.0f}ms)")
+
+    async def stop(self):
+        """監視を停止"""
+        if not self.running:
+            return
+        self._stopped.set()
+        self._heartbeat_task.cancel()
+        await asyncio.gather(self._heartbeat_task, return_exceptions=True)
+        self._heartbeat_task = None
+        await asyncio.to_thread(self._watchdog.join)
+        self._watchdog = None
+
+    async def _heartbeat(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            LOOP_LAG.observe(max(0.0, now - expected))
+            self.last_beat = now
+
+    def _watch(self):
+        reported_beat = None
+        while not self._stopped.wait(self.interval / 2):
+            beat = self.last_beat
+            blocked_for = time.monotonic() - beat - self.interval
+            if blocked_for < self.threshold or beat == reported_beat:
+                continue
+            # 同じブロックは1回だけ記録する
+            reported_beat = beat
+            self.record_stall(blocked_for)
+
+    def record_stall(self, blocked_for: float):
+        """ループスレッドの現在のスタックを記録"""
+        frame = sys._current_frames().get(self._loop_thread_id)
+        stack = "".join(traceback.format_stack(frame)) if frame is not None else ""
+        self.stalls.append({'at': time.time(), 'blocked_ms': round(blocked_for * 1000), 'stack': stack})
+        LOOP_STALLS.inc()
+        logger.warning(f"Event loop blocked for at least {blocked_for * 1000:.0f}ms:\n{stack}")
+
+
+# プロセス全体で共有するモニター
+_monitor: Optional[LoopMonitor] = None
+
+
+def get_loop_monitor() -> LoopMonitor:
+    """共有のLoopMonitorを取得"""
+    global _monitor
+    if _monitor is None:
+        _monitor = LoopMonitor(config.LOOP_LAG_THRESHOLD_MS)
+    return _monitor
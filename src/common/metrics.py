@@ -0,0 +1,201 @@
+"""
+Prometheusのテキスト形式で出力するメトリクス
+
+外部ライブラリを使わない最小限の実装（Counter / Gauge / Histogram）。
+メトリクスはモジュールの読み込み時に get_registry() から取得して定義し、
+WebHookサーバーの `/metrics` で registry.render() の結果を返す。
+ストレージの書き込みスレッドからも記録されるため、各メトリクスはロックで保護する。
+"""
+
+import math
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# 秒単位のレイテンシ用のデフォルトのバケット
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric:
+    """メトリクスの基底クラス"""
+
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    """単調増加するカウンター"""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        return self.values.get(self._key(labels), 0)
+
+    def samples(self) -> Iterable[str]:
+        with self.lock:
+            items = list(self.values.items())
+        for key, value in items:
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Gauge(Metric):
+    """現在の値を表すゲージ（出力時に関数で値を取得することもできる）"""
+
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.values: Dict[LabelValues, float] = {}
+        self.functions: Dict[LabelValues, Callable[[], float]] = {}
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = value
+
+    def set_function(self, function: Callable[[], float], **labels):
+        """出力時に呼び出して値を取得する関数を登録"""
+        key = self._key(labels)
+        with self.lock:
+            self.functions[key] = function
+
+    def samples(self) -> Iterable[str]:
+        with self.lock:
+            items = dict(self.values)
+            functions = list(self.functions.items())
+        for key, function in functions:
+            try:
+                items[key] = function()
+            except Exception:
+                continue
+        for key, value in items.items():
+            if value is None:
+                continue
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Histogram(Metric):
+    """値の分布を累積バケットで表すヒストグラム"""
+
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # label values -> (バケットごとの件数, 合計, 件数)
+        self.values: Dict[LabelValues, Tuple[List[int], float, int]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self.lock:
+            counts, total, count = self.values.get(key) or ([0] * len(self.buckets), 0.0, 0)
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            self.values[key] = (counts, total + value, count + 1)
+
+    def get_count(self, **labels) -> int:
+        entry = self.values.get(self._key(labels))
+        return entry[2] if entry else 0
+
+    def samples(self) -> Iterable[str]:
+        with self.lock:
+            items = [(key, list(counts), total, count) for key, (counts, total, count) in self.values.items()]
+        for key, counts, total, count in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, ('le', _format_value(bound)))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {_format_value(total)}"
+            yield f"{self.name}_count{labels} {count}"
+
+
+class MetricsRegistry:
+    """メトリクスを名前で管理し、まとめて出力するレジストリ"""
+
+    def __init__(self):
+        self.metrics: Dict[str, Metric] = {}
+        self.lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, *args, **kwargs):
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} is already registered as {metric.type_name}")
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets)
+
+    def render(self) -> str:
+        """Prometheusのテキスト形式（version 0.0.4）で出力"""
+        with self.lock:
+            metrics = list(self.metrics.values())
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+# プロセス全体で共有するレジストリ
+_registry = MetricsRegistry()
+
+
+def get_registry() -> MetricsRegistry:
+    """共有のレジストリを取得"""
+    return _registry
@@ -0,0 +1,147 @@
+"""
+GitHub APIのレート制限の残量管理
+
+同じトークンを使うすべてのGitHub APIリクエストはこの予算を経由する。
+Discordからのコメント投稿（interactive）のために残量の一部を確保し、
+リポジトリ同期などのバックグラウンド処理は残量が少なくなると間隔を空け、
+確保分に達するとリセットまで待機する。
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Mapping, Optional
+
+import config
+from common.metrics import get_registry
+
+logger = logging.getLogger(__name__)
+
+# セカンダリレート制限でRetry-Afterがない場合の待機時間（秒）
+SECONDARY_LIMIT_DEFAULT_WAIT = 60
+
+
+def is_rate_limit_error(status: int, message: str, headers: Mapping[str, str]) -> bool:
+    """エラーレスポンスがレート制限（プライマリ・セカンダリ）によるものかどうか"""
+    if status == 429:
+        return True
+    if status != 403:
+        return False
+    return (
+        headers.get('Retry-After') is not None
+        or headers.get('X-RateLimit-Remaining') == '0'
+        or 'rate limit' in (message or '').lower()
+    )
+
+
+class RateLimitBudget:
+    """レスポンスヘッダーから残量を追跡し、リクエストの前に必要なだけ待機する"""
+
+    def __init__(self, reserve: int = 100, slowdown_threshold: int = 1000):
+        # interactiveなリクエストのために確保する残量
+        self.reserve = reserve
+        # 残量がこれを下回るとバックグラウンドのリクエストの間隔を空ける
+        self.slowdown_threshold = slowdown_threshold
+        self.limit: Optional[int] = None
+        self.remaining: Optional[int] = None
+        self.reset: Optional[float] = None  # UNIX時刻
+        # セカンダリレート制限などで全リクエストを止める期限（UNIX時刻）
+        self.blocked_until = 0.0
+        self.stats = {'requests': 0, 'throttled': 0, 'rate_limited': 0}
+
+    def update(self, headers: Mapping[str, str]):
+        """レスポンスヘッダー（X-RateLimit-*）から残量を更新"""
+        for attr, header in (('limit', 'X-RateLimit-Limit'), ('remaining', 'X-RateLimit-Remaining'),
+                             ('reset', 'X-RateLimit-Reset')):
+            value = headers.get(header)
+            if value is not None:
+                setattr(self, attr, int(value))
+
+    def record_rate_limited(self, headers: Mapping[str, str]):
+        """レート制限のエラーを受けた場合に、Retry-Afterまたはリセット時刻まで全リクエストを止める"""
+        now = time.time()
+        self.update(headers)
+        retry_after = headers.get('Retry-After')
+        if retry_after is not None:
+            delay = float(retry_after)
+        elif self.remaining == 0 and self.reset:
+            delay = self.reset - now
+        else:
+            delay = SECONDARY_LIMIT_DEFAULT_WAIT
+        self.blocked_until = max(self.blocked_until, now + max(delay, 0))
+        self.stats['rate_limited'] += 1
+        logger.warning(f"GitHub rate limit hit, pausing requests for {delay:.0f}s")
+
+    def wait_time(self, interactive: bool = False, now: Optional[float] = None) -> float:
+        """リクエストを送信できるまでの待機時間（秒）"""
+        now = time.time() if now is None else now
+        if self.blocked_until > now:
+            return self.blocked_until - now
+        if self.remaining is None or self.reset is None or self.reset <= now:
+            return 0.0
+        if self.remaining <= 0:
+            return self.reset - now
+        if not interactive and self.remaining <= self.reserve:
+            # 確保分はinteractiveなリクエストのために残す
+            return self.reset - now
+        return 0.0
+
+    def pacing_delay(self, now: Optional[float] = None) -> float:
+        """残量が少ない場合に、リセットまでの残り時間に均等に分散させるための間隔（秒）"""
+        now = time.time() if now is None else now
+        if self.remaining is None or self.reset is None or self.reset <= now:
+            return 0.0
+        if self.remaining >= self.slowdown_threshold:
+            return 0.0
+        return (self.reset - now) / max(1, self.remaining - self.reserve)
+
+    async def acquire(self, interactive: bool = False):
+        """リクエストの前に呼び出し、必要なだけ待機する"""
+        while True:
+            delay = self.wait_time(interactive)
+            if delay <= 0:
+                break
+            self.stats['throttled'] += 1
+            logger.warning(
+                f"GitHub rate limit budget low (remaining={self.remaining}, interactive={interactive}), "
+                f"waiting {delay:.0f}s"
+            )
+            await asyncio.sleep(delay)
+
+        if not interactive:
+            delay = self.pacing_delay()
+            if delay > 0:
+                self.stats['throttled'] += 1
+                await asyncio.sleep(delay)
+
+        if self.remaining is not None:
+            # レスポンスヘッダーで更新されるまでの見込み値
+            self.remaining -= 1
+        self.stats['requests'] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """残量のメトリクス"""
+        now = time.time()
+        return {
+            'limit': self.limit,
+            'remaining': self.remaining,
+            'reserve': self.reserve,
+            'reset_in': max(0, int(self.reset - now)) if self.reset else None,
+            'blocked_for': max(0, int(self.blocked_until - now)),
+            **self.stats
+        }
+
+
+# プロセス全体で共有する予算（同じトークンを使うため）
+_budget: Optional[RateLimitBudget] = None
+
+
+def get_budget() -> RateLimitBudget:
+    """共有のRateLimitBudgetを取得"""
+    global _budget
+    if _budget is None:
+        _budget = RateLimitBudget(config.GITHUB_RATE_LIMIT_RESERVE, config.GITHUB_RATE_LIMIT_SLOWDOWN)
+        get_registry().gauge(
+            'kurono_github_rate_limit_remaining', 'Remaining GitHub API requests in the current window'
+        ).set_function(lambda: _budget.remaining)
+    return _budget
@@ -0,0 +1,502 @@
+"""
+common モジュールのテスト
+"""
+
+import asyncio
+import json
+import os
+import sys
+import pytest
+import pytest_asyncio
+import threading
+import time
+from unittest.mock import AsyncMock, patch
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from common.github_client import GitHubClient, GitHubHTTPError, parse_next_link, close_session
+from common.http_cache import ETagCache
+from common.rate_limit import RateLimitBudget, is_rate_limit_error
+from common.discord_scheduler import DiscordScheduler, Priority, route_key, route_from_url
+from common.metrics import MetricsRegistry
+from common.loop_monitor import LoopMonitor, render_collapsed, sample_stacks
+from common.tracing import Tracer, span
+from common.command_sync import CommandSyncState, command_hash, sync_commands
+from common.lazy import format_report, lazy_import, measure_imports, parse_importtime
+import config
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+
+@pytest_asyncio.fixture
+async def github_server():
+    """GitHub APIのスタブサーバー"""
+    requests = []
+
+    async def list_repos(request):
+        requests.append(request)
+        page = int(request.query.get('page', '1'))
+        etag = f'"etag-{page}"'
+        if request.headers.get('If-None-Match') == etag:
+            return web.Response(status=304)
+        headers = {'ETag': etag}
+        if page < 3:
+            headers['Link'] = f'<{request.url.with_query(page=page + 1)}>; rel="next"'
+        return web.json_response([{'name': f"repo-{page}"}], headers=headers)
+
+    async def create_comment(request):
+        requests.append(request)
+        body = await request.json()
+        number = request.match_info['number']
+        if number == '404':
+            return web.json_response({'message': 'Not Found'}, status=404)
+        if number == '403' and not any(r.match_info.get('number') == '403' for r in requests[:-1]):
+            return web.json_response(
+                {'message': 'You have exceeded a secondary rate limit'}, status=403, headers={'Retry-After': '0'}
+            )
+        headers = {'X-RateLimit-Limit': '5000', 'X-RateLimit-Remaining': '4999',
+                   'X-RateLimit-Reset': str(int(time.time()) + 3600)}
+        return web.json_response({'body': body['body']}, status=201, headers=headers)
+
+    app = web.Application()
+    app.router.add_get('/orgs/{org}/repos', list_repos)
+    app.router.add_post('/repos/{owner}/{repo}/issues/{number}/comments', create_comment)
+    server = TestServer(app)
+    await server.start_server()
+    server.requests = requests
+    yield server
+    await close_session()
+    await server.close()
+
+
+class TestGitHubClient:
+
+    def test_parse_next_link(self):
+        """Linkヘッダーの解析テスト"""
+        header = '<https://api.github.com/x?page=2>; rel="next", <https://api.github.com/x?page=5>; rel="last"'
+        assert parse_next_link(header) == "https://api.github.com/x?page=2"
+        assert parse_next_link('<https://api.github.com/x?page=5>; rel="last"') is None
+        assert parse_next_link(None) is None
+
+    @pytest.mark.asyncio
+    async def test_pagination(self, github_server):
+        """ページネーションを非同期イテレータで辿れることのテスト"""
+        client = GitHubClient('token', base_url=str(github_server.make_url('')))
+
+        repos = [repo['name'] async for repo in client.iter_org_repos('test-org')]
+
+        assert repos == ['repo-1', 'repo-2', 'repo-3']
+        assert github_server.requests[0].headers['Authorization'] == 'Bearer token'
+
+    @pytest.mark.asyncio
+    async def test_create_issue_comment(self, github_server):
+        """コメント投稿とエラー処理のテスト"""
+        client = GitHubClient('token', base_url=str(github_server.make_url('')))
+
+        result = await client.create_issue_comment('test-org', 'repo', 1, 'hello')
+        assert result == {'body': 'hello'}
+
+        with pytest.raises(GitHubHTTPError) as error:
+            await client.create_issue_comment('test-org', 'repo', 404, 'hello')
+        assert error.value.status == 404
+
+    @pytest.mark.asyncio
+    async def test_etag_cache(self, github_server, tmp_path):
+        """変更のないページが304とキャッシュから返されることのテスト"""
+        cache_file = str(tmp_path / "cache.json")
+        client = GitHubClient('token', base_url=str(github_server.make_url('')), cache=ETagCache(cache_file))
+
+        first = [repo['name'] async for repo in client.iter_org_repos('test-org')]
+        client.cache.save()
+
+        # 再起動後もキャッシュが使われる
+        client = GitHubClient('token', base_url=str(github_server.make_url('')), cache=ETagCache(cache_file))
+        second = [repo['name'] async for repo in client.iter_org_repos('test-org')]
+
+        assert first == second == ['repo-1', 'repo-2', 'repo-3']
+        assert client.cache.stats == {'hits': 3, 'misses': 0}
+        assert github_server.requests[-1].headers['If-None-Match'] == '"etag-3"'
+
+    @pytest.mark.asyncio
+    async def test_secondary_rate_limit_retried(self, github_server):
+        """セカンダリレート制限の403を受けた場合に、Retry-Afterだけ待機して再送することのテスト"""
+        budget = RateLimitBudget()
+        client = GitHubClient('token', base_url=str(github_server.make_url('')), budget=budget)
+
+        result = await client.create_issue_comment('test-org', 'repo', 403, 'hello')
+
+        assert result == {'body': 'hello'}
+        assert budget.stats['rate_limited'] == 1
+        assert budget.snapshot()['remaining'] == 4999
+
+
+class TestRateLimitBudget:
+
+    @pytest.mark.asyncio
+    async def test_reserve_for_interactive(self):
+        """残量が確保分以下の場合、バックグラウンドのリクエストだけがリセットまで待機することのテスト"""
+        budget = RateLimitBudget(reserve=100)
+        budget.update({'X-RateLimit-Remaining': '50', 'X-RateLimit-Reset': str(int(time.time()) + 30)})
+
+        with patch('common.rate_limit.asyncio.sleep', new_callable=AsyncMock) as sleep:
+            await budget.acquire(interactive=True)
+            sleep.assert_not_awaited()
+
+            sleep.side_effect = lambda delay: setattr(budget, 'reset', time.time() - 1)
+            await budget.acquire()
+            assert 0 < sleep.await_args_list[0].args[0] <= 30
+
+    @pytest.mark.asyncio
+    async def test_slowdown_when_low(self):
+        """残量が少なくなるとバックグラウンドのリクエストの間隔を空けることのテスト"""
+        budget = RateLimitBudget(reserve=100, slowdown_threshold=1000)
+        budget.update({'X-RateLimit-Remaining': '500', 'X-RateLimit-Reset': str(int(time.time()) + 400)})
+
+        with patch('common.rate_limit.asyncio.sleep', new_callable=AsyncMock) as sleep:
+            await budget.acquire()
+            assert 0.9 < sleep.await_args.args[0] <= 1.0
+
+            sleep.reset_mock()
+            budget.remaining = 4000
+            await budget.acquire()
+            sleep.assert_not_awaited()
+
+    def test_secondary_limit_blocks_all(self):
+        """セカンダリレート制限ではinteractiveなリクエストも待機することのテスト"""
+        budget = RateLimitBudget()
+        budget.record_rate_limited({'Retry-After': '60'})
+
+        assert 59 <= budget.wait_time(interactive=True) <= 60
+        assert is_rate_limit_error(403, "You have exceeded a secondary rate limit", {})
+        assert not is_rate_limit_error(403, "Resource not accessible by integration", {})
+
+class TestDiscordScheduler:
+
+    def test_route_from_url(self):
+        """メソッド・エンドポイント・メジャーパラメータからルートが決まることのテスト"""
+        api = "https://discord.com/api/v10"
+        assert route_from_url('POST', f"{api}/channels/123/messages") == route_key('POST', 'channels', 123, '/messages')
+        assert route_from_url('PATCH', f"{api}/channels/123") == route_key('PATCH', 'channels', 123)
+        assert route_from_url('POST', f"{api}/channels/123/messages/456/threads") == \
+            route_key('POST', 'channels', 123, '/messages/{id}/threads')
+        assert route_from_url('PUT', f"{api}/channels/1/messages/2/reactions/%E2%9C%85/@me") == \
+            "PUT channels/1/messages/{id}/reactions/{id}/@me"
+        assert route_from_url('POST', f"{api}/guilds/9/channels") == "POST guilds/9/channels"
+        assert route_from_url('POST', f"{api}/interactions/1/token/callback") is None
+
+    @pytest.mark.asyncio
+    async def test_priority_order(self):
+        """空きができた時に優先度の高いリクエストから実行されることのテスト"""
+        scheduler = DiscordScheduler(max_concurrency=1)
+        order = []
+        release = asyncio.Event()
+
+        async def call(name, wait=False):
+            order.append(name)
+            if wait:
+                await release.wait()
+
+        blocker = asyncio.create_task(scheduler.submit(Priority.NOTIFICATION, call, "first", True))
+        await asyncio.sleep(0)
+        tasks = [
+            asyncio.create_task(scheduler.submit(Priority.BACKGROUND, call, "background")),
+            asyncio.create_task(scheduler.submit(Priority.NOTIFICATION, call, "notification")),
+        ]
+        await asyncio.sleep(0)
+        # スラッシュコマンドの応答は同時実行数の制限を受けない
+        await scheduler.submit(Priority.INTERACTIVE, call, "interactive")
+        assert scheduler.depth == {'interactive': 0, 'notification': 1, 'background': 1}
+
+        release.set()
+        await asyncio.gather(blocker, *tasks)
+        assert order == ["first", "interactive", "notification", "background"]
+
+    @pytest.mark.asyncio
+    async def test_rate_limited_route_waits(self):
+        """レート制限中のルートは待機し、他のルートは先に実行されることのテスト"""
+        scheduler = DiscordScheduler()
+        scheduler.observe("channels/1", 429, {'Retry-After': '0.05'})
+        order = []
+
+        async def call(name):
+            order.append(name)
+
+        await asyncio.gather(
+            scheduler.submit(Priority.NOTIFICATION, call, "limited", route="channels/1"),
+            scheduler.submit(Priority.BACKGROUND, call, "other", route="channels/2"),
+        )
+
+        assert order == ["other", "limited"]
+        assert scheduler.stats['rate_limited'] == 1
+
+    @pytest.mark.asyncio
+    async def test_learns_bucket_from_headers(self):
+        """レスポンスヘッダーの残りリクエスト数が0のルートは待機することのテスト"""
+        scheduler = DiscordScheduler()
+        scheduler.observe("channels/1", 200, {'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset-After': '30'})
+        call = AsyncMock()
+
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(scheduler.submit(Priority.NOTIFICATION, call, route="channels/1"), 0.05)
+        call.assert_not_awaited()
+        await scheduler.submit(Priority.NOTIFICATION, call, route="channels/2")
+        call.assert_awaited_once()
+
+
+    @pytest.mark.asyncio
+    async def test_channel_edit_limit_does_not_block_messages(self):
+        """チャンネルの編集のレート制限で、同じチャンネルへのメッセージの送信が待機しないことのテスト"""
+        scheduler = DiscordScheduler()
+        edit = route_key('PATCH', 'channels', 1)
+        scheduler.observe(edit, 429, {'Retry-After': '600', 'X-RateLimit-Scope': 'user'})
+        call = AsyncMock()
+
+        await asyncio.wait_for(
+            scheduler.submit(Priority.NOTIFICATION, call, route=route_key('POST', 'channels', 1, '/messages')), 1
+        )
+        call.assert_awaited_once()
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(scheduler.submit(Priority.BACKGROUND, call, route=edit), 0.05)
+
+    @pytest.mark.asyncio
+    async def test_shared_scope_does_not_exhaust_bucket(self):
+        """共有のレート制限（X-RateLimit-Scope: shared）の429ではルートを待機させないことのテスト"""
+        scheduler = DiscordScheduler()
+        route = route_key('POST', 'channels', 1, '/messages')
+        scheduler.observe(route, 429, {'Retry-After': '60', 'X-RateLimit-Scope': 'shared'})
+        call = AsyncMock()
+
+        await asyncio.wait_for(scheduler.submit(Priority.NOTIFICATION, call, route=route), 1)
+        call.assert_awaited_once()
+        assert scheduler.stats['rate_limited'] == 1
+
+class TestMetrics:
+
+    def test_render_prometheus_text(self):
+        """カウンター・ゲージ・ヒストグラムがPrometheusのテキスト形式で出力されることのテスト"""
+        registry = MetricsRegistry()
+        requests = registry.counter('requests_total', 'Requests', ['event'])
+        requests.inc(event='issues')
+        requests.inc(2, event='pull_request "x"')
+        registry.gauge('queue_depth', 'Depth').set_function(lambda: 3)
+        latency = registry.histogram('latency_seconds', 'Latency', ['event'], buckets=(0.1, 1))
+        for value in (0.05, 0.5, 5):
+            latency.observe(value, event='issues')
+
+        text = registry.render()
+
+        assert '# TYPE requests_total counter' in text
+        assert 'requests_total{event="issues"} 1' in text
+        assert 'requests_total{event="pull_request \\"x\\""} 2' in text
+        assert 'queue_depth 3' in text
+        assert 'latency_seconds_bucket{event="issues",le="0.1"} 1' in text
+        assert 'latency_seconds_bucket{event="issues",le="1"} 2' in text
+        assert 'latency_seconds_bucket{event="issues",le="+Inf"} 3' in text
+        assert 'latency_seconds_sum{event="issues"} 5.55' in text
+        assert 'latency_seconds_count{event="issues"} 3' in text
+
+    def test_registry_returns_existing_metric(self):
+        """同じ名前のメトリクスは共有され、種類が異なる場合はエラーになることのテスト"""
+        registry = MetricsRegistry()
+        assert registry.counter('events_total', 'Events') is registry.counter('events_total', 'Events')
+        with pytest.raises(ValueError):
+            registry.gauge('events_total', 'Events')
+        with pytest.raises(ValueError):
+            registry.counter('events_total', 'Events').inc(event='issues')
+
+
+class TestLoopMonitor:
+
+    @pytest.mark.asyncio
+    async def test_records_blocking_call_with_stack(self):
+        """イベントループをブロックした処理がスタック付きで記録されることのテスト"""
+        monitor = LoopMonitor(threshold_ms=50, interval=0.01)
+        monitor.start()
+        await asyncio.sleep(0.03)
+
+        time.sleep(0.3)  # イベントループをブロックする同期処理
+        await asyncio.sleep(0.03)
+        await monitor.stop()
+
+        assert len(monitor.stalls) == 1
+        assert monitor.stalls[0]['blocked_ms'] >= 50
+        assert 'test_records_blocking_call_with_stack' in monitor.stalls[0]['stack']
+
+    def test_sample_stacks(self):
+        """他のスレッドのスタックがcollapsed stack形式で集計されることのテスト"""
+        stop = threading.Event()
+
+        def busy_worker():
+            while not stop.is_set():
+                sum(range(1000))
+
+        worker = threading.Thread(target=busy_worker, name="busy")
+        worker.start()
+        try:
+            counts = sample_stacks(0.1, interval=0.001)
+        finally:
+            stop.set()
+            worker.join()
+
+        stacks = [stack for stack in counts if stack.startswith("busy;")]
+        # サンプルのタイミングによっては stop.is_set() の中のスタックになる
+        assert stacks and all("test_common.py:busy_worker" in stack.split(';') for stack in stacks)
+        assert render_collapsed({'a;b': 3}) == "a;b 3\n"
+
+
+class TestTracer:
+
+    @pytest.mark.asyncio
+    async def test_disabled_tracer_is_noop(self, tmp_path):
+        """無効な場合はトレースを開始せず、ファイルも作成しないことのテスト"""
+        tracer = Tracer(str(tmp_path / "traces.jsonl"), sample_rate=0)
+
+        assert tracer.start('d1') is None
+        with span('webhook.parse') as noop:
+            noop.set(size=1)
+        tracer.finish('d1')
+
+        assert span('a') is span('b')
+        assert not (tmp_path / "traces.jsonl").exists()
+
+    @pytest.mark.asyncio
+    async def test_writes_spans_per_delivery(self, tmp_path):
+        """配信ごとの処理区間が1行のJSONとして出力されることのテスト"""
+        trace_file = tmp_path / "traces.jsonl"
+        tracer = Tracer(str(trace_file), sample_rate=1)
+
+        trace = tracer.start('d1', event='issues')
+        with span('webhook.parse'):
+            pass
+        with pytest.raises(RuntimeError):
+            with span('discord.channel_send', channel=1):
+                raise RuntimeError("boom")
+        tracer.finish('d1', status=202)
+        trace.add_span('discord.thread_send', trace.start, trace.start + 0.01, {})
+        tracer.close()
+
+        records = [json.loads(line) for line in trace_file.read_text().splitlines()]
+        assert records[0]['delivery_id'] == 'd1'
+        assert records[0]['event'] == 'issues' and records[0]['status'] == 202
+        assert [s['name'] for s in records[0]['spans']] == ['webhook.parse', 'discord.channel_send']
+        assert records[0]['spans'][1]['error'] == "RuntimeError: boom"
+        assert records[0]['spans'][1]['attrs'] == {'channel': 1}
+        assert records[1] == {
+            'delivery_id': 'd1', 'continuation': True,
+            'spans': [{'name': 'discord.thread_send', 'start_ms': 0.0, 'duration_ms': 10.0}]
+        }
+
+    def test_redelivery_keeps_active_trace(self, tmp_path):
+        """処理中の配信の再送で、処理中のトレースが置き換えられないことのテスト"""
+        tracer = Tracer(str(tmp_path / "traces.jsonl"), sample_rate=1)
+
+        trace = tracer.start('d1', event='issues')
+        assert tracer.start('d1', event='issues') is None
+        assert tracer.active['d1'] is trace
+        tracer.close()
+
+    def test_sampling_is_stable_per_delivery(self):
+        """同じ配信は常に同じサンプリング結果になることのテスト"""
+        tracer = Tracer(sample_rate=0.25)
+        deliveries = [f"delivery-{i}" for i in range(2000)]
+
+        sampled = [d for d in deliveries if tracer.sampled(d)]
+
+        assert sampled == [d for d in deliveries if tracer.sampled(d)]
+        assert 350 < len(sampled) < 650
+
+
+class TestCommandSync:
+
+    def make_tree(self):
+        import discord
+        tree = discord.app_commands.CommandTree(discord.Client(intents=discord.Intents.none()))
+
+        @tree.command(name="ping", description="応答を返す")
+        async def ping(interaction: discord.Interaction):
+            pass
+
+        tree.sync = AsyncMock()
+        return tree
+
+    @pytest.mark.asyncio
+    async def test_syncs_only_changed_scopes(self, tmp_path):
+        """コマンド定義のハッシュが変わったスコープだけが同期されることのテスト"""
+        import discord
+        path = str(tmp_path / "command_sync.json")
+        guild = discord.Object(id=42)
+        tree = self.make_tree()
+
+        assert await sync_commands(tree, 1, [guild], CommandSyncState(path)) == ['global', '42']
+        assert tree.sync.await_count == 2
+
+        # 再起動・再接続では定義が同じなので同期しない
+        tree.sync.reset_mock()
+        assert await sync_commands(tree, 1, [guild], CommandSyncState(path)) == []
+        tree.sync.assert_not_awaited()
+
+        @tree.command(name="pong", description="もう1つのコマンド")
+        async def pong(interaction: discord.Interaction):
+            pass
+
+        assert await sync_commands(tree, 1, [guild], CommandSyncState(path)) == ['global']
+        tree.sync.assert_awaited_once_with(guild=None)
+        # 別のアプリケーションでは同期し直す
+        assert await sync_commands(tree, 2, [], CommandSyncState(path)) == ['global']
+        assert await sync_commands(tree, 1, [guild], CommandSyncState(path), force=True) == ['global', '42']
+
+    def test_hash_is_stable(self):
+        """同じ定義から同じハッシュが得られることのテスト"""
+        assert command_hash(self.make_tree()) == command_hash(self.make_tree())
+
+
+class TestLazyImport:
+    """遅延インポートとインポート時間の上限のテスト"""
+
+    def test_imports_on_first_attribute_access(self):
+        """最初の属性の参照でインポートされることのテスト"""
+        sys.modules.pop('colorsys', None)
+        colorsys = lazy_import('colorsys')
+        assert 'colorsys' not in sys.modules
+        assert not colorsys.is_loaded
+
+        assert colorsys.rgb_to_hsv(1.0, 0.0, 0.0) == (0.0, 1.0, 1.0)
+        assert colorsys.is_loaded
+        assert 'colorsys' in sys.modules
+        # インポート済みのモジュールはそのまま返す
+        assert lazy_import('colorsys') is sys.modules['colorsys']
+
+    def test_parse_importtime(self):
+        """`-X importtime` の出力の解析のテスト"""
+        output = (
+            "import time: self [us] | cumulative | imported package\n"
+            "import time:       120 |        120 |   _io\n"
+            "import time:        50 |        300 |     json.decoder\n"
+            "import time:       200 |        700 |   json\n"
+            "import time:       100 |       1000 | app\n"
+        )
+        entries = parse_importtime(output)
+        assert [(entry.name, entry.depth) for entry in entries] == [
+            ('_io', 1), ('json.decoder', 2), ('json', 1), ('app', 0)
+        ]
+        assert entries[-1].cumulative_us == 1000
+
+    def test_package_exports_are_lazy(self):
+        """設定の検証だけを使う場合にdiscord・aiohttpがインポートされないことのテスト"""
+        report = measure_imports('sync_channel.utils', cwd=ROOT, path=[ROOT, os.path.join(ROOT, 'src')])
+        names = {entry.name for entry in report.entries}
+        assert 'sync_channel.utils' in names
+        assert 'discord' not in names
+        assert 'aiohttp' not in names
+
+    def test_cold_import_of_main_within_budget(self, tmp_path):
+        """src.main のコールドインポートが上限（IMPORT_BUDGET_MS）以内であることのテスト"""
+        # 1回目はバイトコードのキャッシュの作成を含むため、3回の計測の最小値で比較する
+        reports = [measure_imports('src.main', cwd=str(tmp_path), path=[ROOT, os.path.join(ROOT, 'src')])
+                   for _ in range(3)]
+        report = min(reports, key=lambda report: report.module_ms)
+        names = {entry.name for entry in report.entries}
+        # 使用しない重い依存関係を読み込まない
+        assert 'github' not in names
+        assert 'google.genai' not in names
+        assert 'discord.ext.commands' not in names
+        assert report.module_ms <= config.IMPORT_BUDGET_MS, format_report(report, budget_ms=config.IMPORT_BUDGET_MS)
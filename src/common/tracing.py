@@ -0,0 +1,230 @@
+"""
+WebHookの配信（X-GitHub-Delivery）ごとの処理区間のトレース
+
+受信からDiscordへの送信までの各処理（JSONの解析、キュー待ち、ハンドラ、
+channel.send、create_thread、ストレージへの書き込みなど）を span() で囲むと、
+配信ごとに1行のJSONとしてローテーションするファイルに出力される。
+
+トレースはサンプリングされた配信のみ記録し、無効な場合や対象外の配信では
+span() は何もしないオブジェクトを返すため、処理への影響はほとんどない。
+ファイルへの書き込みはイベントループをブロックしないよう別スレッドで行う。
+"""
+
+import json
+import logging
+import logging.handlers
+import queue
+import time
+import zlib
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+import config
+
+logger = logging.getLogger(__name__)
+
+
+class Trace:
+    """1つの配信の処理区間を記録するトレース"""
+
+    __slots__ = ('tracer', 'delivery_id', 'attrs', 'started_at', 'start', 'spans', 'finished')
+
+    def __init__(self, tracer: "Tracer", delivery_id: str, attrs: Dict[str, Any]):
+        self.tracer = tracer
+        self.delivery_id = delivery_id
+        self.attrs = attrs
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.spans: List[Dict[str, Any]] = []
+        self.finished = False
+
+    def add_span(self, name: str, start: float, end: float, attrs: Dict[str, Any], error: Optional[str] = None):
+        """
+        処理区間を追加
+
+        トレースの終了後に追加された区間（まとめて送信された通知など）は、
+        同じdelivery_idの続きの行として出力する。
+        """
+        span = {
+            'name': name,
+            'start_ms': round((start - self.start) * 1000, 3),
+            'duration_ms': round((end - start) * 1000, 3),
+        }
+        if attrs:
+            span['attrs'] = attrs
+        if error:
+            span['error'] = error
+        if self.finished:
+            self.tracer.write({'delivery_id': self.delivery_id, 'continuation': True, 'spans': [span]})
+        else:
+            self.spans.append(span)
+
+
+class _Span:
+    """with文で囲んだ区間を現在のトレースに記録する"""
+
+    __slots__ = ('trace', 'name', 'attrs', 'start')
+
+    def __init__(self, trace: Trace, name: str, attrs: Dict[str, Any]):
+        self.trace = trace
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        error = f"{exc_type.__name__}: {exc}" if exc_type is not None else None
+        self.trace.add_span(self.name, self.start, time.perf_counter(), self.attrs, error)
+        return False
+
+    def set(self, **attrs):
+        """区間の属性を追加"""
+        self.attrs.update(attrs)
+
+
+class _NoopSpan:
+    """トレース対象外の場合に返す何もしない区間"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+# 現在処理中の配信のトレース（サンプリング対象外の場合はNone）
+_current: ContextVar[Optional[Trace]] = ContextVar('trace', default=None)
+
+
+def current_trace() -> Optional[Trace]:
+    """現在のトレースを取得"""
+    return _current.get()
+
+
+def span(name: str, **attrs):
+    """
+    現在のトレースに処理区間を記録するコンテキストマネージャ
+
+    Args:
+        name: 区間の名前（例: discord.channel_send）
+        **attrs: 区間の属性
+
+    Returns:
+        with文で使用する区間（トレース対象外の場合は何もしない）
+    """
+    trace = _current.get()
+    if trace is None:
+        return _NOOP_SPAN
+    return _Span(trace, name, attrs)
+
+
+class Tracer:
+    """配信ごとのトレースを開始・終了し、JSONLファイルに出力する"""
+
+    def __init__(self, trace_file: str = "webhook_traces.jsonl", sample_rate: float = 0.0,
+                 max_bytes: int = 10 * 1024 * 1024, backup_count: int = 3):
+        self.trace_file = trace_file
+        self.sample_rate = sample_rate
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        # delivery_id -> 受信からキューでの処理完了までのトレース
+        self.active: Dict[str, Trace] = {}
+        self._queue: Optional[queue.SimpleQueue] = None
+        self._listener: Optional[logging.handlers.QueueListener] = None
+        self._writer: Optional[logging.Logger] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate > 0
+
+    def sampled(self, delivery_id: str) -> bool:
+        """配信をトレースするかどうか（同じ配信の再送では同じ結果になる）"""
+        if self.sample_rate >= 1:
+            return True
+        return zlib.crc32(delivery_id.encode()) % 10000 < self.sample_rate * 10000
+
+    def start(self, delivery_id: str, **attrs) -> Optional[Trace]:
+        """
+        配信のトレースを開始し、現在のトレースに設定
+
+        同じ配信のトレースが処理中の場合（処理中に届いた再送）は、既存のトレースを
+        置き換えずにNoneを返す。
+        """
+        trace = None
+        if self.enabled and delivery_id and delivery_id not in self.active and self.sampled(delivery_id):
+            trace = self.active[delivery_id] = Trace(self, delivery_id, attrs)
+        _current.set(trace)
+        return trace
+
+    def resume(self, delivery_id: str) -> Optional[Trace]:
+        """キューから取り出した配信のトレースを現在のトレースに設定（対象外の場合はNone）"""
+        trace = self.active.get(delivery_id) if self.active else None
+        _current.set(trace)
+        return trace
+
+    def finish(self, delivery_id: str, **attrs):
+        """配信のトレースを終了してファイルに出力"""
+        trace = self.active.pop(delivery_id, None) if self.active else None
+        if trace is None:
+            return
+        trace.finished = True
+        trace.attrs.update(attrs)
+        self.write({
+            'delivery_id': trace.delivery_id,
+            'started_at': trace.started_at,
+            'duration_ms': round((time.perf_counter() - trace.start) * 1000, 3),
+            **trace.attrs,
+            'spans': trace.spans
+        })
+
+    def write(self, record: Dict[str, Any]):
+        """1行のJSONをファイルに出力（書き込みは別スレッドで行う）"""
+        if self._writer is None:
+            self._open()
+        self._writer.info(json.dumps(record, ensure_ascii=False, default=str))
+
+    def _open(self):
+        handler = logging.handlers.RotatingFileHandler(
+            self.trace_file, maxBytes=self.max_bytes, backupCount=self.backup_count, encoding='utf-8'
+        )
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        self._queue = queue.SimpleQueue()
+        self._listener = logging.handlers.QueueListener(self._queue, handler)
+        self._listener.start()
+        self._writer = logging.getLogger(f"{__name__}.writer.{id(self)}")
+        self._writer.propagate = False
+        self._writer.setLevel(logging.INFO)
+        self._writer.addHandler(logging.handlers.QueueHandler(self._queue))
+
+    def close(self):
+        """未出力のトレースを書き込んでファイルを閉じる"""
+        if self._listener is None:
+            return
+        self._listener.stop()
+        for handler in self._listener.handlers:
+            handler.close()
+        for handler in list(self._writer.handlers):
+            self._writer.removeHandler(handler)
+        self._listener = None
+        self._writer = None
+
+
+# プロセス全体で共有するトレーサー
+_tracer: Optional[Tracer] = None
+
+
+def get_tracer() -> Tracer:
+    """共有のTracerを取得"""
+    global _tracer
+    if _tracer is None:
+        _tracer = Tracer(config.TRACE_FILE, config.TRACE_SAMPLE_RATE, config.TRACE_MAX_BYTES, config.TRACE_BACKUP_COUNT)
+    return _tracer
@@ -16,4 +16,80 @@ GITHUB_ORGANIZATION = os.getenv('GITHUB_ORGANIZATION', 'kurono-soshiki')
 DISCORD_GUILD_ID = int(os.getenv('DISCORD_GUILD_ID', '0'))
 DISCORD_CATEGORY_ID = int(os.getenv('DISCORD_CATEGORY_ID', '0'))
 WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8000'))
-WEBHOOK_HOST = os.getenv('WEBHOOK_HOST', '0.0.0.0')
\ No newline at end of file
+WEBHOOK_HOST = os.getenv('WEBHOOK_HOST', '0.0.0.0')
+AUTO_LINK_ENABLED = os.getenv('AUTO_LINK_ENABLED', 'true').lower() == 'true'
+# Comment Connector WebHookキュー設定
+WEBHOOK_QUEUE_SIZE = int(os.getenv('WEBHOOK_QUEUE_SIZE', '1000'))
+WEBHOOK_WORKERS = int(os.getenv('WEBHOOK_WORKERS', '4'))
+
+# Discordへの同時リクエスト数（スラッシュコマンドの応答は含まない）
+DISCORD_SCHEDULER_CONCURRENCY = int(os.getenv('DISCORD_SCHEDULER_CONCURRENCY', '4'))
+
+# スレッド通知をまとめる時間（ミリ秒、0で無効）
+NOTIFY_COALESCE_MS = float(os.getenv('NOTIFY_COALESCE_MS', '1000'))
+
+# WebHook再送の重複排除キャッシュ設定
+DELIVERY_CACHE_FILE = os.getenv('DELIVERY_CACHE_FILE', 'webhook_deliveries.json')
+DELIVERY_CACHE_SIZE = int(os.getenv('DELIVERY_CACHE_SIZE', '10000'))
+DELIVERY_CACHE_TTL = int(os.getenv('DELIVERY_CACHE_TTL', '259200'))
+# 処理中として重複を破棄する時間の上限（秒、処理が完了しなかった配信を再送で受け付けられるようにする）
+DELIVERY_IN_FLIGHT_TTL = int(os.getenv('DELIVERY_IN_FLIGHT_TTL', '3600'))
+
+# Comment Connectorのストレージ設定（json / sqlite）
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'json')
+STORAGE_FILE = os.getenv('STORAGE_FILE', 'comment_connector_data.json')
+SQLITE_STORAGE_FILE = os.getenv('SQLITE_STORAGE_FILE', 'comment_connector_data.db')
+STORAGE_FLUSH_INTERVAL = float(os.getenv('STORAGE_FLUSH_INTERVAL', '1.0'))
+
+# スレッド紐づけのライフサイクル設定
+COLD_THREAD_STORE_FILE = os.getenv('COLD_THREAD_STORE_FILE', 'comment_connector_cold.db')
+THREAD_IDLE_DAYS = float(os.getenv('THREAD_IDLE_DAYS', '30'))
+THREAD_EVICTION_INTERVAL = float(os.getenv('THREAD_EVICTION_INTERVAL', '3600'))
+# 1回の書き込みでcoldに移動する最大件数（イベントループを長くブロックしないよう分割する）
+THREAD_EVICTION_BATCH = int(os.getenv('THREAD_EVICTION_BATCH', '200'))
+
+# 受信したWebHookイベントのログ（scripts/replay_events.py で再送できる）
+EVENT_LOG_ENABLED = os.getenv('EVENT_LOG_ENABLED', 'true').lower() == 'true'
+EVENT_LOG_DIR = os.getenv('EVENT_LOG_DIR', 'webhook_events')
+EVENT_LOG_SEGMENT_BYTES = int(os.getenv('EVENT_LOG_SEGMENT_BYTES', str(16 * 1024 * 1024)))
+EVENT_LOG_MAX_BYTES = int(os.getenv('EVENT_LOG_MAX_BYTES', str(512 * 1024 * 1024)))
+EVENT_LOG_MAX_AGE_DAYS = float(os.getenv('EVENT_LOG_MAX_AGE_DAYS', '14'))
+
+# 処理・送信に失敗した通知のデッドレターキュー（再試行の間隔は指数バックオフ、秒）
+DEAD_LETTER_FILE = os.getenv('DEAD_LETTER_FILE', 'comment_connector_dlq.db')
+DEAD_LETTER_BASE_DELAY = float(os.getenv('DEAD_LETTER_BASE_DELAY', '5'))
+DEAD_LETTER_MAX_DELAY = float(os.getenv('DEAD_LETTER_MAX_DELAY', '900'))
+DEAD_LETTER_MAX_ATTEMPTS = int(os.getenv('DEAD_LETTER_MAX_ATTEMPTS', '8'))
+
+# GitHub APIクライアント設定
+GITHUB_API_URL = os.getenv('GITHUB_API_URL', 'https://api.github.com')
+GITHUB_HTTP_POOL_SIZE = int(os.getenv('GITHUB_HTTP_POOL_SIZE', '20'))
+GITHUB_HTTP_TIMEOUT = float(os.getenv('GITHUB_HTTP_TIMEOUT', '30'))
+GITHUB_CACHE_FILE = os.getenv('GITHUB_CACHE_FILE', 'github_http_cache.json')
+GITHUB_CACHE_MAX_ENTRIES = int(os.getenv('GITHUB_CACHE_MAX_ENTRIES', '500'))
+
+# リポジトリ同期の設定
+SYNC_CONCURRENCY = int(os.getenv('SYNC_CONCURRENCY', '4'))
+GITHUB_RATE_LIMIT_RESERVE = int(os.getenv('GITHUB_RATE_LIMIT_RESERVE', '100'))
+GITHUB_RATE_LIMIT_SLOWDOWN = int(os.getenv('GITHUB_RATE_LIMIT_SLOWDOWN', '1000'))
+SYNC_STATE_FILE = os.getenv('SYNC_STATE_FILE', 'sync_state.json')
+SYNC_FULL_INTERVAL = float(os.getenv('SYNC_FULL_INTERVAL', '86400'))
+
+# スラッシュコマンドの定義のハッシュ（定義が変わった場合のみ同期する。FORCEで毎回同期）
+COMMAND_SYNC_STATE_FILE = os.getenv('COMMAND_SYNC_STATE_FILE', 'command_sync_state.json')
+COMMAND_SYNC_FORCE = os.getenv('COMMAND_SYNC_FORCE', 'false').lower() == 'true'
+
+# src.main のコールドインポートの時間の上限（ミリ秒、テストとscripts/import_report.pyで確認する）
+# 計測値（5回の最小値で約450ms、ほぼdiscord・aiohttp）に約3割の余裕を持たせた値
+IMPORT_BUDGET_MS = float(os.getenv('IMPORT_BUDGET_MS', '600'))
+
+# イベントループの遅延監視（この時間以上ブロックされた場合にスタックを記録する。0以下で無効）
+LOOP_LAG_THRESHOLD_MS = float(os.getenv('LOOP_LAG_THRESHOLD_MS', '250'))
+# /debug/* エンドポイントのBearerトークン（未設定の場合はエンドポイントを無効にする）
+DEBUG_TOKEN = os.getenv('DEBUG_TOKEN')
+
+# WebHookの処理区間のトレース（0でトレースしない、1ですべての配信をトレース）
+TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', '0'))
+TRACE_FILE = os.getenv('TRACE_FILE', 'webhook_traces.jsonl')
+TRACE_MAX_BYTES = int(os.getenv('TRACE_MAX_BYTES', str(10 * 1024 * 1024)))
+TRACE_BACKUP_COUNT = int(os.getenv('TRACE_BACKUP_COUNT', '3'))
@@ -1,35 +1,71 @@
 import discord
 import config
-
-intents = discord.Intents.default()
-intents.message_content = True
-
-client = discord.Client(intents=intents)
-tree = discord.app_commands.CommandTree(client)
+from common.github_client import close_session
+from common.discord_scheduler import get_scheduler
+from common.loop_monitor import get_loop_monitor
+from common.tracing import get_tracer
+from common.command_sync import CommandSyncState, sync_commands
 
 # Future module imports would go here:
 # from yomiage import yomiage as yomiage_bot
 # from umigame import umigame as umigame_bot
 from src.sync_channel import sync_channel
 from src.comment_connecter import comment_connecter
+
+class KuronoClient(discord.Client):
+    async def setup_hook(self):
+        # ゲートウェイへの接続前に1回だけ呼ばれる（再接続のたびに呼ばれるon_readyではセットアップしない）
+        await setup_modules(self)
+        
+    async def close(self):
+        # モジュールの終了処理（キューの処理待ちなど）
+        await comment_connecter.teardown()
+        await get_loop_monitor().stop()
+        get_tracer().close()
+        await close_session()
+        await super().close()
+
+intents = discord.Intents.default()
+intents.message_content = True
+
+# レスポンスヘッダーからDiscordのレート制限を学習する
+client = KuronoClient(intents=intents, http_trace=get_scheduler().trace_config())
+tree = discord.app_commands.CommandTree(client)
+
 # yomiage_bot.setup(tree, client)
 # umigame_bot.setup(tree, client)
 
+# コマンドツリーを同期済みかどうか（再接続時は同期しない）
+commands_synced = False
+
+async def setup_modules(client: discord.Client):
+    """モジュールのセットアップ（スラッシュコマンドの登録・WebHookサーバーの起動）"""
+    # イベントループをブロックする同期処理を検出する
+    if config.LOOP_LAG_THRESHOLD_MS > 0:
+        get_loop_monitor().start()
+    
+    syncer = await sync_channel.setup(tree, client)
+    # repository WebHookで該当チャンネルのみを同期する
+    await comment_connecter.setup(tree, client, repository_handler=syncer.handle_repository_event)
+
 @client.event
 async def on_ready():
+    global commands_synced
     print(f'We have logged in as {client.user}')
+    if commands_synced:
+        return
     
-    # モジュールのセットアップ
-    await sync_channel.setup(tree, client)
-    await comment_connecter.setup(tree, client)
-    
-    # グローバルコマンドの同期
-    await tree.sync()
-    print("グローバルスラッシュコマンドを同期しました")
-    # ギルドごとのコマンドの同期
-    for guild in client.guilds:
-        await tree.sync(guild=discord.Object(id=guild.id))
-        print(f"スラッシュコマンドをギルド {guild.id} に同期しました")
+    # グローバルとギルドごとのコマンドを、定義が前回の同期から変わった場合のみ同期する
+    guilds = [discord.Object(id=guild.id) for guild in client.guilds]
+    synced = await sync_commands(
+        tree, client.application_id, guilds, CommandSyncState(config.COMMAND_SYNC_STATE_FILE),
+        force=config.COMMAND_SYNC_FORCE
+    )
+    commands_synced = True
+    if synced:
+        print(f"スラッシュコマンドを同期しました: {', '.join(synced)}")
+    else:
+        print("スラッシュコマンドに変更はありません")
 
 if __name__ == "__main__":
     if config.DISCORD_TOKEN:
@@ -10,6 +10,9 @@ Discordのチャンネルと同期させる機能を提供します。
 3. `/list-repos` コマンドでリポジトリ一覧表示
 """
 
-from .sync_channel import SyncChannel, setup
+from common.lazy import lazy_exports
+
+# discordを読み込まずに utils（設定の検証）だけを使えるよう、参照時にインポートする
+__getattr__ = lazy_exports(__name__, {'SyncChannel': '.sync_channel', 'setup': '.sync_channel'})
 
 __all__ = ['SyncChannel', 'setup']
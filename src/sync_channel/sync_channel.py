@@ -1,11 +1,16 @@
 import discord
-from discord.ext import commands
 import asyncio
-from typing import List, Dict, Optional
-from github import Github
+import time
+from datetime import datetime
+from typing import Any, AsyncIterator, List, Dict, Optional
 import logging
 import config
-from .utils import validate_config, get_channel_name_from_repo, format_repo_description
+from common.github_client import GitHubClient
+from common.http_cache import ETagCache
+from common.discord_scheduler import Priority, get_scheduler, interactive, route_key
+from .utils import (validate_config, get_channel_name_from_repo, format_repo_description, repo_to_info,
+                    repo_last_modified, render_topic, SyncAction)
+from .sync_state import SyncState
 
 logger = logging.getLogger(__name__)
 
@@ -14,10 +19,18 @@ class SyncChannel:
     
     def __init__(self, client: discord.Client):
         self.client = client
-        self.github = Github(config.GITHUB_TOKEN) if config.GITHUB_TOKEN else None
+        # リポジトリ一覧はETagキャッシュで条件付きリクエストにする
+        self.github = GitHubClient(
+            config.GITHUB_TOKEN,
+            cache=ETagCache(config.GITHUB_CACHE_FILE, config.GITHUB_CACHE_MAX_ENTRIES)
+        ) if config.GITHUB_TOKEN else None
         self.organization_name = config.GITHUB_ORGANIZATION
         self.guild_id = config.DISCORD_GUILD_ID
         self.category_id = config.DISCORD_CATEGORY_ID
+        # Discordへの送信はスケジューラ経由で行う（全件同期はBACKGROUND）
+        self.scheduler = get_scheduler()
+        # 差分同期用のウォーターマーク
+        self.state = SyncState(config.SYNC_STATE_FILE)
         
         # 設定の検証
         if not validate_config():
@@ -33,24 +46,14 @@ class SyncChannel:
             return []
         
         try:
-            org = self.github.get_organization(self.organization_name)
             repos = []
             
-            for repo in org.get_repos():
-                if not repo.archived:  # アーカイブされていないリポジトリのみ
-                    repos.append({
-                        'name': repo.name,
-                        'description': repo.description or "説明なし",
-                        'url': repo.html_url,
-                        'created_at': repo.created_at,
-                        'updated_at': repo.updated_at,
-                        'language': repo.language,
-                        'stars': repo.stargazers_count,
-                        'forks': repo.forks_count,
-                        'private': repo.private
-                    })
+            async for repo in self.github.iter_org_repos(self.organization_name):
+                if not repo.get('archived'):  # アーカイブされていないリポジトリのみ
+                    repos.append(repo_to_info(repo))
             
-            logger.info(f"取得したリポジトリ数: {len(repos)}")
+            await self.github.cache.save_async()
+            logger.info(f"取得したリポジトリ数: {len(repos)} (キャッシュ: {self.github.cache.stats})")
             return repos
             
         except Exception as e:
@@ -71,20 +74,19 @@ class SyncChannel:
         
         return [ch for ch in category.channels if isinstance(ch, discord.TextChannel)]
     
-    async def create_channel(self, repo_info: Dict, category: discord.CategoryChannel) -> Optional[discord.TextChannel]:
+    async def create_channel(self, repo_info: Dict, category: discord.CategoryChannel,
+                             priority: Priority = Priority.BACKGROUND) -> Optional[discord.TextChannel]:
         """リポジトリに対応するDiscordチャンネルを作成"""
         try:
             # チャンネル名はリポジトリ名をDiscord用に変換
             channel_name = get_channel_name_from_repo(repo_info['name'])
             
-            # チャンネルのトピックを設定
-            topic = f"🔗 {repo_info['url']}\n📝 {format_repo_description(repo_info['description'], 200)}"
-            if repo_info['language']:
-                topic += f"\n💻 {repo_info['language']}"
-            
-            channel = await category.create_text_channel(
+            channel = await self.scheduler.submit(
+                priority,
+                category.create_text_channel,
+                route=route_key('POST', 'guilds', category.guild.id, '/channels'),
                 name=channel_name,
-                topic=topic[:1024],  # Discordのトピック文字数制限
+                topic=render_topic(repo_info),
                 reason=f"GitHub repository sync: {repo_info['name']}"
             )
             
@@ -95,32 +97,204 @@ class SyncChannel:
             logger.error(f"チャンネル作成に失敗 ({repo_info['name']}): {e}")
             return None
     
-    async def update_channel(self, channel: discord.TextChannel, repo_info: Dict):
+    async def update_channel(self, channel: discord.TextChannel, repo_info: Dict,
+                             priority: Priority = Priority.BACKGROUND) -> bool:
         """既存のチャンネル情報を更新"""
         try:
-            # トピックを更新
-            topic = f"🔗 {repo_info['url']}\n📝 {repo_info['description']}"
-            if repo_info['language']:
-                topic += f"\n💻 {repo_info['language']}"
-            
-            await channel.edit(
-                topic=topic[:1024],
+            await self.scheduler.submit(
+                priority,
+                channel.edit,
+                route=route_key('PATCH', 'channels', channel.id),
+                topic=render_topic(repo_info),
                 reason=f"GitHub repository sync update: {repo_info['name']}"
             )
             
             logger.info(f"チャンネル更新: {channel.name}")
+            return True
             
         except Exception as e:
             logger.error(f"チャンネル更新に失敗 ({channel.name}): {e}")
+            return False
+    
+    def plan_repository(self, repo: Dict, existing_channels: Dict[str, discord.TextChannel]) -> SyncAction:
+        """1リポジトリ分の同期計画を作成（現在のトピックと比較して変更がなければno-op）"""
+        topic = render_topic(repo)
+        channel = existing_channels.get(get_channel_name_from_repo(repo['name']))
+        
+        if channel is None:
+            return SyncAction('create', repo, topic)
+        if (channel.topic or '') == topic:
+            return SyncAction('noop', repo, topic, channel)
+        return SyncAction('update', repo, topic, channel)
+    
+    def plan_sync(self, repos: List[Dict], existing_channels: Dict[str, discord.TextChannel]) -> List[SyncAction]:
+        """リポジトリ一覧（desired state）と既存チャンネル（actual state）の差分から同期計画を作成"""
+        return [self.plan_repository(repo, existing_channels) for repo in repos]
+    
+    async def apply_action(self, action: SyncAction, category: discord.CategoryChannel, stats: Dict[str, Any],
+                           priority: Priority = Priority.BACKGROUND) -> Optional[discord.TextChannel]:
+        """同期計画の1件を適用し、対象のチャンネルを返す"""
+        repo = action.repo
+        
+        if action.action == 'noop':
+            return action.channel
+        if action.action == 'update':
+            if await self.update_channel(action.channel, repo, priority):
+                stats['updated'] += 1
+            else:
+                stats['errors'] += 1
+            return action.channel
+        else:
+            # 新しいチャンネルを作成
+            created_channel = await self.create_channel(repo, category, priority)
+            if not created_channel:
+                stats['errors'] += 1
+                return None
+            stats['created'] += 1
+            
+            # 作成メッセージを送信
+            embed = discord.Embed(
+                title=f"📁 {repo['name']}",
+                description=repo['description'],
+                color=0x00ff00,
+                url=repo['url']
+            )
+            embed.add_field(name="言語", value=repo['language'] or "不明", inline=True)
+            embed.add_field(name="⭐ スター", value=repo['stars'], inline=True)
+            embed.add_field(name="🍴 フォーク", value=repo['forks'], inline=True)
+            embed.add_field(name="作成日", value=repo['created_at'].strftime('%Y-%m-%d'), inline=True)
+            embed.add_field(name="更新日", value=repo['updated_at'].strftime('%Y-%m-%d'), inline=True)
+            embed.add_field(name="プライベート", value="Yes" if repo['private'] else "No", inline=True)
+            
+            await self.scheduler.submit(
+                priority, created_channel.send, embed=embed, route=route_key('POST', 'channels', created_channel.id, '/messages')
+            )
+            return created_channel
     
-    async def sync_repositories(self) -> Dict[str, int]:
-        """リポジトリとチャンネルの同期を実行"""
+    async def handle_repository_event(self, action: str, repository: Dict, changes: Dict) -> Optional[discord.TextChannel]:
+        """
+        GitHubの repository WebHookイベントを該当チャンネルのみに反映
+        
+        Args:
+            action: イベントのアクション（created, renamed, edited, archived, deleted など）
+            repository: WebHookペイロードのリポジトリ情報
+            changes: WebHookペイロードの変更内容（renamed の場合は変更前の名前を含む）
+        
+        Returns:
+            discord.TextChannel: 対応するチャンネル（deleted の場合や見つからない場合はNone）
+        """
+        repo = repo_to_info(repository)
+        channel_name = get_channel_name_from_repo(repo['name'])
+        
+        if action == 'deleted':
+            # チャンネルは削除しない（紐づけのみ解除される）
+            logger.info(f"リポジトリ削除: {repo['name']}（チャンネルは削除しません）")
+            return None
+        
+        category = self.get_category()
+        if not category:
+            return None
+        existing_channel_names = {ch.name: ch for ch in category.channels if isinstance(ch, discord.TextChannel)}
         stats = {'created': 0, 'updated': 0, 'skipped': 0, 'errors': 0}
         
-        # GitHubリポジトリを取得
-        repos = await self.get_github_repositories()
-        if not repos:
-            logger.warning("同期対象のリポジトリが見つかりません")
+        if action == 'renamed':
+            old_name = changes.get('repository', {}).get('name', {}).get('from')
+            old_channel = existing_channel_names.get(get_channel_name_from_repo(old_name)) if old_name else None
+            if old_channel and channel_name not in existing_channel_names:
+                try:
+                    await self.scheduler.submit(
+                        Priority.NOTIFICATION,
+                        old_channel.edit,
+                        route=route_key('PATCH', 'channels', old_channel.id),
+                        name=channel_name,
+                        topic=render_topic(repo),
+                        reason=f"GitHub repository renamed: {old_name} -> {repo['name']}"
+                    )
+                    logger.info(f"チャンネル名変更: {old_channel.name} -> {channel_name}")
+                except Exception as e:
+                    logger.error(f"チャンネル名の変更に失敗 ({old_name} -> {repo['name']}): {e}")
+                return old_channel
+        
+        plan = self.plan_repository(repo, existing_channel_names)
+        if action == 'archived' and plan.action == 'create':
+            # アーカイブされたリポジトリのチャンネルは新規作成しない
+            return None
+        
+        # WebHookによる同期は全件同期より優先して送信する
+        channel = await self.apply_action(plan, category, stats, Priority.NOTIFICATION)
+        logger.info(f"リポジトリイベントを反映: {action} {repo['name']} ({plan.action})")
+        return channel
+    
+    def get_category(self) -> Optional[discord.CategoryChannel]:
+        """同期先のカテゴリを取得"""
+        guild = self.client.get_guild(self.guild_id)
+        if not guild:
+            logger.error(f"Guild {self.guild_id} not found")
+            return None
+        
+        category = guild.get_channel(self.category_id)
+        if not category or not isinstance(category, discord.CategoryChannel):
+            logger.error(f"Category {self.category_id} not found or not a category")
+            return None
+        return category
+    
+    async def iter_repository_pages(self, since: Optional[datetime] = None) -> AsyncIterator[List[Dict]]:
+        """
+        GitHubのリポジトリ一覧をページ単位で取得
+        
+        Args:
+            since: 指定した場合はこの日時以降に更新（updated_at または pushed_at）されたリポジトリのみを返す。
+                   updated_at と pushed_at のそれぞれの新しい順に取得し、並べ替えに使った日時が
+                   sinceより前のリポジトリに到達した時点でそれぞれのページの取得を打ち切る
+        """
+        path = f"/orgs/{self.organization_name}/repos"
+        if since is None:
+            async for page in self.github.iter_pages(path):
+                yield [repo_to_info(repo) for repo in page]
+            return
+        
+        # pushed_at だけが新しいリポジトリは updated_at の順では後ろのページにあるため、両方の順で取得する
+        seen = set()
+        for sort, field in (('updated', 'updated_at'), ('pushed', 'pushed_at')):
+            async for page in self.github.iter_pages(path, {'sort': sort, 'direction': 'desc'}):
+                repos = [repo_to_info(repo) for repo in page]
+                changed = [repo for repo in repos
+                           if repo['name'] not in seen and (repo_last_modified(repo) or since) >= since]
+                seen.update(repo['name'] for repo in changed)
+                yield changed
+                if any(repo[field] and repo[field] < since for repo in repos):
+                    break
+    
+    async def sync_repositories(self, dry_run: bool = False, full: Optional[bool] = None) -> Dict[str, Any]:
+        """
+        リポジトリとチャンネルの同期を実行
+        
+        GitHubのページを取得するたびに同期計画を作成し、変更のある操作を
+        並列のDiscordワーカーに渡す（取得と適用をパイプラインで実行する）。
+        通常は前回の同期以降に更新されたリポジトリのみを取得する差分同期を行い、
+        SYNC_FULL_INTERVAL ごとに全件同期で削除されたリポジトリのチャンネルを検出する。
+        
+        Args:
+            dry_run: Trueの場合は同期計画を作成するだけでDiscordには反映しない
+            full: Trueの場合は全件同期、Falseの場合は差分同期（Noneの場合は前回の全件同期からの経過時間で判断）
+        
+        Returns:
+            dict: 作成・更新・変更なし（skipped）・エラーの件数、同期計画（plan）、フェーズごとの所要時間（timings）、
+                  同期モード（mode）、リポジトリが見つからないチャンネル名（orphaned、全件同期のみ）
+        """
+        if full is None:
+            full = self.state.needs_full_sync(config.SYNC_FULL_INTERVAL)
+        if self.state.watermark is None:
+            full = True
+        since = None if full else self.state.watermark
+        stats = {
+            'created': 0, 'updated': 0, 'skipped': 0, 'errors': 0, 'plan': [], 'timings': {},
+            'mode': 'full' if full else 'incremental', 'orphaned': []
+        }
+        started_at = time.perf_counter()
+        
+        if not self.github:
+            logger.error("GitHub client not initialized")
             return stats
         
         # Discordのギルドとカテゴリを取得
@@ -137,96 +311,165 @@ class SyncChannel:
         # 既存のチャンネル一覧を取得
         existing_channels = await self.get_discord_channels()
         existing_channel_names = {ch.name: ch for ch in existing_channels}
+        stats['timings']['discord_channels'] = time.perf_counter() - started_at
         
-        # リポジトリごとに処理
-        for repo in repos:
-            try:
-                channel_name = repo['name'].lower().replace('_', '-').replace(' ', '-')
-                
-                if channel_name in existing_channel_names:
-                    # 既存チャンネルを更新
-                    await self.update_channel(existing_channel_names[channel_name], repo)
-                    stats['updated'] += 1
-                else:
-                    # 新しいチャンネルを作成
-                    created_channel = await self.create_channel(repo, category)
-                    if created_channel:
-                        stats['created'] += 1
-                        
-                        # 作成メッセージを送信
-                        embed = discord.Embed(
-                            title=f"📁 {repo['name']}",
-                            description=repo['description'],
-                            color=0x00ff00,
-                            url=repo['url']
-                        )
-                        embed.add_field(name="言語", value=repo['language'] or "不明", inline=True)
-                        embed.add_field(name="⭐ スター", value=repo['stars'], inline=True)
-                        embed.add_field(name="🍴 フォーク", value=repo['forks'], inline=True)
-                        embed.add_field(name="作成日", value=repo['created_at'].strftime('%Y-%m-%d'), inline=True)
-                        embed.add_field(name="更新日", value=repo['updated_at'].strftime('%Y-%m-%d'), inline=True)
-                        embed.add_field(name="プライベート", value="Yes" if repo['private'] else "No", inline=True)
-                        
-                        await created_channel.send(embed=embed)
-                    else:
-                        stats['errors'] += 1
-                
-                # レート制限対策で少し待機
-                await asyncio.sleep(0.5)
+        queue: asyncio.Queue = asyncio.Queue(maxsize=config.SYNC_CONCURRENCY * 2)
+        apply_time = 0.0
+        
+        async def worker():
+            nonlocal apply_time
+            while True:
+                action = await queue.get()
+                if action is None:
+                    return
+                action_started = time.perf_counter()
+                try:
+                    await self.apply_action(action, category, stats)
+                except Exception as e:
+                    logger.error(f"リポジトリ処理中にエラー ({action.repo['name']}): {e}")
+                    stats['errors'] += 1
+                apply_time += time.perf_counter() - action_started
+        
+        workers = [] if dry_run else [asyncio.create_task(worker()) for _ in range(config.SYNC_CONCURRENCY)]
+        
+        # GitHubのページを取得しながら差分を計画し、変更のある操作をワーカーに渡す
+        fetch_time = 0.0
+        seen_channel_names = set()
+        watermark = None
+        fetch_completed = False
+        try:
+            pages = self.iter_repository_pages(since)
+            while True:
+                fetch_started = time.perf_counter()
+                try:
+                    repos = await pages.__anext__()
+                except StopAsyncIteration:
+                    break
+                finally:
+                    fetch_time += time.perf_counter() - fetch_started
                 
-            except Exception as e:
-                logger.error(f"リポジトリ処理中にエラー ({repo['name']}): {e}")
-                stats['errors'] += 1
+                for repo in repos:
+                    seen_channel_names.add(get_channel_name_from_repo(repo['name']))
+                    last_modified = repo_last_modified(repo)
+                    if last_modified and (watermark is None or last_modified > watermark):
+                        watermark = last_modified
+                    if repo.get('archived'):  # アーカイブされたリポジトリは同期しない
+                        continue
+                    action = self.plan_repository(repo, existing_channel_names)
+                    stats['plan'].append(action)
+                    if action.action == 'noop':
+                        stats['skipped'] += 1
+                    elif not dry_run:
+                        await queue.put(action)
+            fetch_completed = True
+        except Exception as e:
+            logger.error(f"GitHubリポジトリの取得に失敗: {e}")
+            stats['errors'] += 1
+        finally:
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+            await self.github.cache.save_async()
+        
+        plan = stats['plan']
+        if not plan and full:
+            logger.warning("同期対象のリポジトリが見つかりません")
+        
+        if full and fetch_completed:
+            # 全件同期ではGitHubに存在しないリポジトリのチャンネルを報告（チャンネルは削除しない）
+            stats['orphaned'] = sorted(set(existing_channel_names) - seen_channel_names)
+            if stats['orphaned']:
+                logger.warning(f"リポジトリが見つからないチャンネル: {', '.join(stats['orphaned'])}")
+        
+        summary = {kind: sum(1 for action in plan if action.action == kind) for kind in ('create', 'update', 'noop')}
+        logger.info(f"同期計画 - 作成: {summary['create']}, 更新: {summary['update']}, 変更なし: {summary['noop']}")
+        
+        stats['timings'].update({
+            'github_fetch': fetch_time,
+            'discord_apply': apply_time,
+            'total': time.perf_counter() - started_at
+        })
+        
+        if dry_run:
+            logger.info("ドライランのため変更は適用しません")
+            return stats
         
-        logger.info(f"同期完了 - 作成: {stats['created']}, 更新: {stats['updated']}, エラー: {stats['errors']}")
+        # 取りこぼしがないよう、エラーなく完了した場合のみウォーターマークを進める
+        if fetch_completed and stats['errors'] == 0:
+            self.state.advance(watermark, full=full)
+        
+        timings = ", ".join(f"{phase}: {seconds:.2f}秒" for phase, seconds in stats['timings'].items())
+        logger.info(f"同期完了（{stats['mode']}） - 作成: {stats['created']}, 更新: {stats['updated']}, 変更なし: {stats['skipped']}, エラー: {stats['errors']} ({timings})")
         return stats
 
-
-async def setup(tree: discord.app_commands.CommandTree, client: discord.Client):
+async def setup(tree: discord.app_commands.CommandTree, client: discord.Client) -> SyncChannel:
     """モジュールのセットアップ（スラッシュコマンドの登録）"""
     sync_channel = SyncChannel(client)
     
     @tree.command(name="sync-repos", description="GitHubリポジトリとDiscordチャンネルを同期します")
-    async def sync_repos_command(interaction: discord.Interaction):
+    @discord.app_commands.describe(
+        dry_run="変更を適用せずに同期計画のみを表示します",
+        full="更新日時に関係なくすべてのリポジトリを照合します"
+    )
+    async def sync_repos_command(interaction: discord.Interaction, dry_run: bool = False, full: bool = False):
         # 権限チェック（管理者権限が必要）
         if not interaction.user.guild_permissions.administrator:
-            await interaction.response.send_message(
+            await interactive(
+                interaction.response.send_message,
                 "❌ このコマンドを実行するには管理者権限が必要です。",
                 ephemeral=True
             )
             return
         
-        await interaction.response.defer()
+        await interactive(interaction.response.defer)
         
         try:
-            stats = await sync_channel.sync_repositories()
+            stats = await sync_channel.sync_repositories(dry_run=dry_run, full=True if full else None)
             
-            embed = discord.Embed(
-                title="🔄 リポジトリ同期完了",
-                color=0x00ff00
-            )
-            embed.add_field(name="作成", value=f"{stats['created']} チャンネル", inline=True)
-            embed.add_field(name="更新", value=f"{stats['updated']} チャンネル", inline=True)
-            embed.add_field(name="エラー", value=f"{stats['errors']} 件", inline=True)
+            if dry_run:
+                embed = discord.Embed(
+                    title="📋 リポジトリ同期計画（ドライラン）",
+                    color=0x0099ff
+                )
+                for kind, label in (('create', "作成予定"), ('update', "更新予定")):
+                    names = [action.channel_name for action in stats['plan'] if action.action == kind]
+                    value = ", ".join(f"`{name}`" for name in names) or "なし"
+                    embed.add_field(name=f"{label} ({len(names)})", value=value[:1024], inline=False)
+                noop_count = sum(1 for action in stats['plan'] if action.action == 'noop')
+                embed.add_field(name="変更なし", value=f"{noop_count} チャンネル", inline=True)
+            else:
+                embed = discord.Embed(
+                    title="🔄 リポジトリ同期完了",
+                    color=0x00ff00
+                )
+                embed.add_field(name="作成", value=f"{stats['created']} チャンネル", inline=True)
+                embed.add_field(name="更新", value=f"{stats['updated']} チャンネル", inline=True)
+                embed.add_field(name="変更なし", value=f"{stats['skipped']} チャンネル", inline=True)
+                embed.add_field(name="エラー", value=f"{stats['errors']} 件", inline=True)
+                embed.add_field(name="モード", value="全件" if stats['mode'] == 'full' else "差分", inline=True)
+            if stats['orphaned']:
+                value = ", ".join(f"`{name}`" for name in stats['orphaned'])
+                embed.add_field(name="リポジトリが見つからないチャンネル", value=value[:1024], inline=False)
             
-            await interaction.followup.send(embed=embed)
+            await interactive(interaction.followup.send, embed=embed)
             
         except Exception as e:
             logger.error(f"同期コマンド実行中にエラー: {e}")
-            await interaction.followup.send(
+            await interactive(
+                interaction.followup.send,
                 f"❌ 同期中にエラーが発生しました: {str(e)}",
                 ephemeral=True
             )
     
     @tree.command(name="list-repos", description="GitHubリポジトリ一覧を表示します")
     async def list_repos_command(interaction: discord.Interaction):
-        await interaction.response.defer()
+        await interactive(interaction.response.defer)
         
         try:
             repos = await sync_channel.get_github_repositories()
             
             if not repos:
-                await interaction.followup.send("❌ リポジトリが見つかりませんでした。")
+                await interactive(interaction.followup.send, "❌ リポジトリが見つかりませんでした。")
                 return
             
             embed = discord.Embed(
@@ -249,11 +492,14 @@ async def setup(tree: discord.app_commands.CommandTree, client: discord.Client):
             if len(repos) > 20:
                 embed.set_footer(text=f"+ {len(repos) - 20} 個のリポジトリがあります")
             
-            await interaction.followup.send(embed=embed)
+            await interactive(interaction.followup.send, embed=embed)
             
         except Exception as e:
             logger.error(f"リポジトリ一覧取得中にエラー: {e}")
-            await interaction.followup.send(
+            await interactive(
+                interaction.followup.send,
                 f"❌ リポジトリ一覧の取得中にエラーが発生しました: {str(e)}",
                 ephemeral=True
-            )
\ No newline at end of file
+            )
+    
+    return sync_channel
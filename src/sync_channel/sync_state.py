@@ -0,0 +1,65 @@
+"""
+リポジトリ同期の進捗（ウォーターマーク）の永続化
+"""
+
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Optional
+
+from common.files import atomic_write_json
+from .utils import parse_github_datetime
+
+logger = logging.getLogger(__name__)
+
+
+class SyncState:
+    """前回の同期で確認したリポジトリの最終更新日時と、最後の全件同期の時刻を保持"""
+
+    def __init__(self, storage_file: Optional[str] = "sync_state.json"):
+        self.storage_file = storage_file
+        # 前回の同期で確認した updated_at / pushed_at の最大値
+        self.watermark: Optional[datetime] = None
+        # 最後に全件同期を完了したUNIX時刻
+        self.last_full_sync: Optional[float] = None
+        self.load()
+
+    def needs_full_sync(self, interval: float) -> bool:
+        """ウォーターマークがない場合や、前回の全件同期からinterval秒以上経過した場合はTrue"""
+        if self.watermark is None or self.last_full_sync is None:
+            return True
+        return time.time() - self.last_full_sync >= interval
+
+    def advance(self, watermark: Optional[datetime], full: bool = False):
+        """同期の完了を記録（ウォーターマークは後退させない）"""
+        if watermark is not None and (self.watermark is None or watermark > self.watermark):
+            self.watermark = watermark
+        if full:
+            self.last_full_sync = time.time()
+        self.save()
+
+    def load(self):
+        """ファイルから同期状態を読み込み"""
+        if not self.storage_file or not os.path.exists(self.storage_file):
+            return
+        try:
+            with open(self.storage_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.watermark = parse_github_datetime(data.get('watermark'))
+            self.last_full_sync = data.get('last_full_sync')
+        except Exception as e:
+            logger.error(f"Error loading sync state from {self.storage_file}: {e}")
+
+    def save(self):
+        """同期状態をファイルに保存"""
+        if not self.storage_file:
+            return
+        try:
+            atomic_write_json(self.storage_file, {
+                'watermark': self.watermark.isoformat() if self.watermark else None,
+                'last_full_sync': self.last_full_sync
+            }, indent=2)
+        except Exception as e:
+            logger.error(f"Error saving sync state to {self.storage_file}: {e}")
@@ -7,7 +7,15 @@ import asyncio
 from unittest.mock import Mock, AsyncMock, patch
 import discord
 from src.sync_channel.sync_channel import SyncChannel
-from sync_channel.utils import validate_config, get_channel_name_from_repo, format_repo_description
+from src.sync_channel.utils import (validate_config, get_channel_name_from_repo, format_repo_description, render_topic,
+                                    repo_to_info, parse_github_datetime)
+from src.sync_channel.sync_state import SyncState
+
+
+async def async_iter(items):
+    """リストを非同期イテレータに変換"""
+    for item in items:
+        yield item
 
 
 class TestSyncChannel:
@@ -19,41 +27,42 @@ class TestSyncChannel:
         return client
     
     @pytest.fixture
-    def sync_channel(self, mock_client):
+    def sync_channel(self, mock_client, tmp_path):
         """SyncChannelインスタンス"""
-        with patch('synk_channel.synk_channel.validate_config', return_value=True):
-            with patch('synk_channel.synk_channel.config.GITHUB_TOKEN', 'mock_token'):
-                with patch('synk_channel.synk_channel.config.GITHUB_ORGANIZATION', 'test-org'):
-                    with patch('synk_channel.synk_channel.config.DISCORD_GUILD_ID', 123456):
-                        with patch('synk_channel.synk_channel.config.DISCORD_CATEGORY_ID', 789012):
+        with patch('src.sync_channel.sync_channel.validate_config', return_value=True), \
+                patch('src.sync_channel.sync_channel.config.SYNC_STATE_FILE', str(tmp_path / "sync_state.json")):
+            with patch('src.sync_channel.sync_channel.config.GITHUB_TOKEN', 'mock_token'):
+                with patch('src.sync_channel.sync_channel.config.GITHUB_ORGANIZATION', 'test-org'):
+                    with patch('src.sync_channel.sync_channel.config.DISCORD_GUILD_ID', 123456):
+                        with patch('src.sync_channel.sync_channel.config.DISCORD_CATEGORY_ID', 789012):
                             return SyncChannel(mock_client)
     
     @pytest.mark.asyncio
     async def test_get_github_repositories(self, sync_channel):
         """GitHubリポジトリ取得のテスト"""
-        # GitHubクライアントのモック
-        mock_repo = Mock()
-        mock_repo.name = "test-repo"
-        mock_repo.description = "Test repository"
-        mock_repo.html_url = "https://github.com/test-org/test-repo"
-        mock_repo.created_at = "2023-01-01"
-        mock_repo.updated_at = "2023-12-31"
-        mock_repo.language = "Python"
-        mock_repo.stargazers_count = 10
-        mock_repo.forks_count = 5
-        mock_repo.private = False
-        mock_repo.archived = False
+        # GitHub APIレスポンスのモック
+        mock_repo = {
+            'name': "test-repo",
+            'description': "Test repository",
+            'html_url': "https://github.com/test-org/test-repo",
+            'created_at': "2023-01-01T00:00:00Z",
+            'updated_at': "2023-12-31T00:00:00Z",
+            'language': "Python",
+            'stargazers_count': 10,
+            'forks_count': 5,
+            'private': False,
+            'archived': False
+        }
+        archived_repo = dict(mock_repo, name="archived-repo", archived=True)
         
-        mock_org = Mock()
-        mock_org.get_repos.return_value = [mock_repo]
-        
-        with patch.object(sync_channel.github, 'get_organization', return_value=mock_org):
+        with patch.object(sync_channel.github, 'iter_org_repos', return_value=async_iter([mock_repo, archived_repo])):
             repos = await sync_channel.get_github_repositories()
             
             assert len(repos) == 1
             assert repos[0]['name'] == 'test-repo'
             assert repos[0]['description'] == 'Test repository'
             assert repos[0]['language'] == 'Python'
+            assert repos[0]['created_at'].year == 2023
     
     @pytest.mark.asyncio
     async def test_get_discord_channels(self, sync_channel, mock_client):
@@ -76,6 +85,252 @@ class TestSyncChannel:
         assert channels[0].name == "test-channel"
 
 
+    @pytest.fixture
+    def repo_info(self):
+        """同期用のリポジトリ情報"""
+        return {
+            'name': 'Test_Repo',
+            'description': 'Test repository',
+            'url': 'https://github.com/test-org/Test_Repo',
+            'language': 'Python'
+        }
+
+    def test_plan_sync(self, sync_channel, repo_info):
+        """既存チャンネルとの差分から同期計画が作成されることのテスト"""
+        unchanged = Mock(spec=discord.TextChannel)
+        unchanged.topic = render_topic(repo_info)
+        changed = Mock(spec=discord.TextChannel)
+        changed.topic = "古いトピック"
+        other_repo = dict(repo_info, name='other-repo')
+        new_repo = dict(repo_info, name='new-repo')
+
+        plan = sync_channel.plan_sync(
+            [repo_info, other_repo, new_repo],
+            {'test-repo': unchanged, 'other-repo': changed}
+        )
+
+        assert [action.action for action in plan] == ['noop', 'update', 'create']
+        assert plan[1].channel is changed
+
+    @pytest.mark.asyncio
+    async def test_sync_repositories_dry_run(self, sync_channel, mock_client, repo_info):
+        """ドライランではDiscordに変更が適用されないことのテスト"""
+        channel = Mock(spec=discord.TextChannel)
+        channel.name = 'test-repo'
+        channel.topic = "古いトピック"
+        channel.edit = AsyncMock()
+        category = Mock(spec=discord.CategoryChannel)
+        category.channels = [channel]
+        category.create_text_channel = AsyncMock()
+        mock_guild = Mock()
+        mock_guild.get_channel.return_value = category
+        mock_client.get_guild.return_value = mock_guild
+        sync_channel.iter_repository_pages = Mock(return_value=async_iter([[repo_info, dict(repo_info, name='new-repo')]]))
+
+        stats = await sync_channel.sync_repositories(dry_run=True)
+
+        assert [action.action for action in stats['plan']] == ['update', 'create']
+        channel.edit.assert_not_awaited()
+        category.create_text_channel.assert_not_awaited()
+
+    @pytest.mark.asyncio
+    async def test_sync_repositories_skips_unchanged(self, sync_channel, mock_client, repo_info):
+        """トピックに変更のないチャンネルは更新されないことのテスト"""
+        channel = Mock(spec=discord.TextChannel)
+        channel.name = 'test-repo'
+        channel.topic = render_topic(repo_info)
+        channel.edit = AsyncMock()
+        category = Mock(spec=discord.CategoryChannel)
+        category.channels = [channel]
+        mock_guild = Mock()
+        mock_guild.get_channel.return_value = category
+        mock_client.get_guild.return_value = mock_guild
+        sync_channel.iter_repository_pages = Mock(return_value=async_iter([[repo_info]]))
+
+        stats = await sync_channel.sync_repositories()
+
+        assert stats['skipped'] == 1
+        assert stats['updated'] == 0
+        channel.edit.assert_not_awaited()
+
+    @pytest.mark.asyncio
+    async def test_sync_repositories_pipeline(self, sync_channel, mock_client, repo_info):
+        """複数ページのリポジトリが並列に適用され、所要時間が記録されることのテスト"""
+        channels = []
+        for i in range(4):
+            channel = Mock(spec=discord.TextChannel)
+            channel.name = f'repo-{i}'
+            channel.topic = "古いトピック"
+            channel.edit = AsyncMock()
+            channels.append(channel)
+        category = Mock(spec=discord.CategoryChannel)
+        category.channels = channels
+        mock_guild = Mock()
+        mock_guild.get_channel.return_value = category
+        mock_client.get_guild.return_value = mock_guild
+        pages = [[dict(repo_info, name='repo-0'), dict(repo_info, name='repo-1')],
+                 [dict(repo_info, name='repo-2'), dict(repo_info, name='repo-3')]]
+        sync_channel.iter_repository_pages = Mock(return_value=async_iter(pages))
+
+        with patch('src.sync_channel.sync_channel.asyncio.sleep') as sleep:
+            stats = await sync_channel.sync_repositories()
+
+        assert stats['updated'] == 4
+        assert all(channel.edit.await_count == 1 for channel in channels)
+        sleep.assert_not_called()
+        assert set(stats['timings']) == {'discord_channels', 'github_fetch', 'discord_apply', 'total'}
+
+    @staticmethod
+    def make_repo(name, updated_at, pushed_at=None):
+        return {'name': name, 'html_url': f"https://github.com/test-org/{name}",
+                'updated_at': updated_at, 'pushed_at': pushed_at or updated_at}
+
+    @pytest.mark.asyncio
+    async def test_iter_repository_pages_stops_at_watermark(self, sync_channel):
+        """ウォーターマークより前に更新されたリポジトリに到達するとページ取得を打ち切ることのテスト"""
+        repo = self.make_repo
+        pages = {
+            'updated': [
+                [repo('new', "2024-03-01T00:00:00Z"), repo('pushed', "2024-01-01T00:00:00Z", "2024-03-01T00:00:00Z"),
+                 repo('old', "2024-01-01T00:00:00Z")],
+                [repo('older', "2023-01-01T00:00:00Z")]
+            ],
+            'pushed': [
+                [repo('new', "2024-03-01T00:00:00Z"), repo('pushed', "2024-01-01T00:00:00Z", "2024-03-01T00:00:00Z"),
+                 repo('old', "2024-01-01T00:00:00Z")],
+                [repo('older', "2023-01-01T00:00:00Z")]
+            ]
+        }
+        sync_channel.github.iter_pages = Mock(side_effect=lambda path, params: async_iter(pages[params['sort']]))
+
+        since = parse_github_datetime("2024-02-01T00:00:00Z")
+        result = [[r['name'] for r in page] async for page in sync_channel.iter_repository_pages(since)]
+
+        assert result == [['new', 'pushed'], []]
+        assert [call.args[1] for call in sync_channel.github.iter_pages.call_args_list] == [
+            {'sort': 'updated', 'direction': 'desc'}, {'sort': 'pushed', 'direction': 'desc'}
+        ]
+
+    @pytest.mark.asyncio
+    async def test_iter_repository_pages_finds_pushed_repo_on_later_page(self, sync_channel):
+        """updated_at が古く pushed_at だけが新しいリポジトリが後ろのページにあっても取得されることのテスト"""
+        repo = self.make_repo
+        pushed_only = repo('pushed', "2023-06-01T00:00:00Z", "2024-03-01T00:00:00Z")
+        pages = {
+            'updated': [
+                [repo('new', "2024-03-02T00:00:00Z"), repo('old', "2024-01-01T00:00:00Z")],
+                [pushed_only]
+            ],
+            'pushed': [
+                [repo('new', "2024-03-02T00:00:00Z"), pushed_only, repo('old', "2024-01-01T00:00:00Z")]
+            ]
+        }
+        fetched = []
+
+        async def iter_pages(path, params):
+            for page in pages[params['sort']]:
+                fetched.append(params['sort'])
+                yield page
+
+        sync_channel.github.iter_pages = iter_pages
+
+        since = parse_github_datetime("2024-02-01T00:00:00Z")
+        names = [r['name'] async for page in sync_channel.iter_repository_pages(since) for r in page]
+
+        assert names == ['new', 'pushed']
+        # updated_at の順の2ページ目は取得しない
+        assert fetched == ['updated', 'pushed']
+
+    @pytest.mark.asyncio
+    async def test_sync_repositories_watermark(self, sync_channel, mock_client, repo_info):
+        """全件同期でウォーターマークが記録され、次回は差分同期になることのテスト"""
+        channel = Mock(spec=discord.TextChannel)
+        channel.name = 'test-repo'
+        channel.topic = render_topic(repo_info)
+        orphaned = Mock(spec=discord.TextChannel)
+        orphaned.name = 'deleted-repo'
+        category = Mock(spec=discord.CategoryChannel)
+        category.channels = [channel, orphaned]
+        mock_guild = Mock()
+        mock_guild.get_channel.return_value = category
+        mock_client.get_guild.return_value = mock_guild
+        updated_at = parse_github_datetime("2024-03-01T00:00:00Z")
+        sync_channel.iter_repository_pages = Mock(return_value=async_iter([[dict(repo_info, updated_at=updated_at)]]))
+
+        stats = await sync_channel.sync_repositories()
+
+        assert stats['mode'] == 'full'
+        assert stats['orphaned'] == ['deleted-repo']
+        assert SyncState(sync_channel.state.storage_file).watermark == updated_at
+
+        sync_channel.iter_repository_pages = Mock(return_value=async_iter([]))
+        stats = await sync_channel.sync_repositories()
+
+        assert stats['mode'] == 'incremental'
+        assert stats['orphaned'] == []
+        sync_channel.iter_repository_pages.assert_called_once_with(updated_at)
+
+    @pytest.fixture
+    def webhook_repo(self):
+        """repository WebHookのペイロードに含まれるリポジトリ情報"""
+        return {
+            'name': 'new-name',
+            'description': 'Test repository',
+            'html_url': 'https://github.com/test-org/new-name',
+            'language': 'Python',
+            'archived': False
+        }
+
+    @pytest.fixture
+    def category(self, mock_client):
+        category = Mock(spec=discord.CategoryChannel)
+        category.channels = []
+        category.create_text_channel = AsyncMock()
+        mock_guild = Mock()
+        mock_guild.get_channel.return_value = category
+        mock_client.get_guild.return_value = mock_guild
+        return category
+
+    @pytest.mark.asyncio
+    async def test_handle_repository_renamed(self, sync_channel, category, webhook_repo):
+        """リポジトリ名の変更で既存チャンネルの名前が変更されることのテスト"""
+        old_channel = Mock(spec=discord.TextChannel)
+        old_channel.name = 'old-name'
+        old_channel.edit = AsyncMock()
+        category.channels = [old_channel]
+
+        channel = await sync_channel.handle_repository_event(
+            'renamed', webhook_repo, {'repository': {'name': {'from': 'old_name'}}}
+        )
+
+        assert channel is old_channel
+        assert old_channel.edit.await_args.kwargs['name'] == 'new-name'
+        category.create_text_channel.assert_not_awaited()
+
+    @pytest.mark.asyncio
+    async def test_handle_repository_archived(self, sync_channel, category, webhook_repo):
+        """アーカイブでトピックが更新され、未作成のチャンネルは作成されないことのテスト"""
+        channel = Mock(spec=discord.TextChannel)
+        channel.name = 'new-name'
+        channel.topic = render_topic(repo_to_info(webhook_repo))
+        channel.edit = AsyncMock()
+        category.channels = [channel]
+        archived = dict(webhook_repo, archived=True)
+
+        assert await sync_channel.handle_repository_event('archived', archived, {}) is channel
+        assert 'アーカイブ済み' in channel.edit.await_args.kwargs['topic']
+
+        category.channels = []
+        assert await sync_channel.handle_repository_event('archived', archived, {}) is None
+        category.create_text_channel.assert_not_awaited()
+
+    @pytest.mark.asyncio
+    async def test_handle_repository_deleted(self, sync_channel, category, webhook_repo):
+        """リポジトリ削除ではチャンネルが変更されないことのテスト"""
+        assert await sync_channel.handle_repository_event('deleted', webhook_repo, {}) is None
+        category.create_text_channel.assert_not_awaited()
+
+
 class TestUtils:
     
     def test_get_channel_name_from_repo(self):
@@ -95,16 +350,16 @@ class TestUtils:
         assert len(formatted) <= 50
         assert formatted.endswith("...")
     
-    @patch('synk_channel.utils.config.DISCORD_TOKEN', 'token')
-    @patch('synk_channel.utils.config.GITHUB_TOKEN', 'token')
-    @patch('synk_channel.utils.config.GITHUB_ORGANIZATION', 'org')
-    @patch('synk_channel.utils.config.DISCORD_GUILD_ID', 123)
-    @patch('synk_channel.utils.config.DISCORD_CATEGORY_ID', 456)
+    @patch('src.sync_channel.utils.config.DISCORD_TOKEN', 'token')
+    @patch('src.sync_channel.utils.config.GITHUB_TOKEN', 'token')
+    @patch('src.sync_channel.utils.config.GITHUB_ORGANIZATION', 'org')
+    @patch('src.sync_channel.utils.config.DISCORD_GUILD_ID', 123)
+    @patch('src.sync_channel.utils.config.DISCORD_CATEGORY_ID', 456)
     def test_validate_config_success(self):
         """設定検証の成功テスト"""
         assert validate_config() == True
     
-    @patch('synk_channel.utils.config.DISCORD_TOKEN', '')
+    @patch('src.sync_channel.utils.config.DISCORD_TOKEN', '')
     def test_validate_config_failure(self):
         """設定検証の失敗テスト"""
         assert validate_config() == False
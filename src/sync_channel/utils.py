@@ -3,6 +3,9 @@
 """
 
 import logging
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, Optional
 import config
 
 logger = logging.getLogger(__name__)
@@ -45,3 +48,51 @@ def format_repo_description(description: str, max_length: int = 100) -> str:
         return description
     
     return description[:max_length - 3] + "..."
+
+def parse_github_datetime(value: Optional[str]) -> Optional[datetime]:
+    """GitHub APIの日時文字列（ISO 8601）をdatetimeに変換"""
+    if not value:
+        return None
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+def repo_to_info(repo: Dict) -> Dict:
+    """GitHub APIのリポジトリ情報を同期用の辞書に変換"""
+    return {
+        'name': repo['name'],
+        'description': repo.get('description') or "説明なし",
+        'url': repo['html_url'],
+        'created_at': parse_github_datetime(repo.get('created_at')),
+        'updated_at': parse_github_datetime(repo.get('updated_at')),
+        'pushed_at': parse_github_datetime(repo.get('pushed_at')),
+        'language': repo.get('language'),
+        'stars': repo.get('stargazers_count', 0),
+        'forks': repo.get('forks_count', 0),
+        'private': repo.get('private', False),
+        'archived': repo.get('archived', False)
+    }
+
+def repo_last_modified(repo_info: Dict) -> Optional[datetime]:
+    """リポジトリ情報の updated_at と pushed_at のうち新しい方を返す"""
+    timestamps = [value for value in (repo_info.get('updated_at'), repo_info.get('pushed_at')) if value]
+    return max(timestamps) if timestamps else None
+
+def render_topic(repo_info: Dict) -> str:
+    """リポジトリ情報からDiscordチャンネルのトピックを生成"""
+    topic = f"🔗 {repo_info['url']}\n📝 {format_repo_description(repo_info['description'], 200)}"
+    if repo_info['language']:
+        topic += f"\n💻 {repo_info['language']}"
+    if repo_info.get('archived'):
+        topic += "\n📦 アーカイブ済み"
+    return topic[:1024]  # Discordのトピック文字数制限
+
+@dataclass
+class SyncAction:
+    """同期計画の1件分の操作"""
+    action: str  # 'create', 'update' または 'noop'
+    repo: Dict
+    topic: str
+    channel: Optional[Any] = None  # 既存のdiscord.TextChannel
+    
+    @property
+    def channel_name(self) -> str:
+        return get_channel_name_from_repo(self.repo['name'])